@@ -0,0 +1,52 @@
+"""
+Processamento dos arquivos da Câmara de Compensação Uniodonto.
+
+    from camara import NeodontoCsvProcessor, RunConfig
+
+    processor = NeodontoCsvProcessor(RunConfig.default())
+    result = processor.process_file("camaras/arquivo.csv")
+    result.processed.to_csv(...)
+
+A importação do pacote é leve: cada módulo (e o pandas) só é carregado no primeiro
+acesso a um de seus nomes. O núcleo não importa Streamlit, ReportLab nem matplotlib;
+o ReportLab é carregado apenas ao gerar relatórios (camara.reports). A interface
+Streamlit (app.py) e a linha de comando (python -m camara) usam este pacote.
+"""
+import importlib
+
+# Nome exportado -> módulo do pacote que o define
+_EXPORTS = {
+    "RunConfig": "processor",
+    "ProcessingResult": "processor",
+    "NeodontoCsvProcessor": "processor",
+    "EntryValidationError": "processor",
+    "capture_messages": "processor",
+    "apply_processed_schema": "processor",
+    "format_cents_series": "processor",
+    "HeaderLayoutRegistry": "layouts",
+    "default_layout_registry": "layouts",
+    "header_signature": "layouts",
+    "StreamingZipWriter": "storage",
+    "ArtifactCache": "storage",
+    "JournalLedger": "storage",
+    "SessionDataManager": "sessions",
+    "ReportJobRunner": "jobs",
+    "WorkerPool": "jobs",
+    "ProcessingService": "service",
+    "FolderWatcher": "watcher",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
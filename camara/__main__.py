@@ -0,0 +1,170 @@
+"""
+Linha de comando do pacote.
+
+    python -m camara processar arquivos.csv ... [-o DIR] [--data AAAA-MM-DD] [--limite-violacoes N]
+    python -m camara benchmark [arquivos.csv ...] [--repeticoes N]
+    python -m camara servico [--host 127.0.0.1] [--porta 8503]
+    python -m camara observar PASTA [-o DIR] [--intervalo S] [--uma-vez] [--relatorios tipo,...]
+    python -m camara pregerar [CAMINHOS ...] [--desde AAAA-MM-DD] [--relatorios tipo,...]
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+
+from .config import VALIDATION_ERROR_BUDGET
+
+
+def processar(args):
+    from .processor import NeodontoCsvProcessor, RunConfig
+    
+    config = RunConfig.default(error_budget=args.limite_violacoes)
+    if args.data:
+        config = RunConfig(reference_date=datetime.strptime(args.data, "%Y-%m-%d"),
+                           error_budget=args.limite_violacoes)
+    processor = NeodontoCsvProcessor(config)
+    os.makedirs(args.saida, exist_ok=True)
+    
+    failures = 0
+    for path in args.arquivos:
+        result = processor.process_file(path)
+        processor.show_messages(result.messages)
+        if not result.ok:
+            failures += 1
+            continue
+        output_path = processor.write_csv(result.processed, os.path.join(args.saida, f"contabil_{result.source}"))
+        print(f"{result.source}: {len(result.processed)} lançamentos -> {output_path} "
+              f"({result.timings['total']:.2f} s)")
+    return 1 if failures else 0
+
+
+def benchmark(args):
+    from . import benchmark as bench
+    
+    imports, processing, ok = bench.run(args.arquivos, args.repeticoes)
+    print("Importação (menor tempo em interpretador novo):")
+    for row in imports:
+        budget = f" / limite {row['limite_ms']} ms" if row["limite_ms"] else ""
+        heavy = f"  [carrega {', '.join(row['modulos_pesados'])}]" if row["modulos_pesados"] else ""
+        print(f"  {'ok   ' if row['ok'] else 'FALHA'} {row['caso']}: {row['ms']} ms{budget}{heavy}")
+    if processing:
+        print("Processamento (melhor de 3):")
+        for row in processing:
+            etapas = ", ".join(f"{stage} {ms}" for stage, ms in row["etapas_ms"].items())
+            print(f"  {row['arquivo']}: {row['linhas']} linhas -> {row['lancamentos']} lançamentos "
+                  f"em {row['ms']} ms ({etapas})")
+    return 0 if ok else 1
+
+
+def servico(args):
+    from .service import serve
+    
+    serve(args.host, args.porta)
+    return 0
+
+
+def observar(args):
+    from .watcher import FolderWatcher
+    
+    reports = [kind for kind in args.relatorios.split(",") if kind]
+    reference_date = datetime.strptime(args.data, "%Y-%m-%d") if args.data else None
+    watcher = FolderWatcher(args.pasta, args.saida or os.path.join(args.pasta, "processados"), reports=reports,
+                            error_budget=args.limite_violacoes, reference_date=reference_date,
+                            settle_seconds=args.espera)
+    if args.repetir_rejeitados:
+        print(f"{watcher.retry_rejected()} arquivo(s) rejeitado(s) voltam a ser considerados")
+    if not args.uma_vez:
+        try:
+            watcher.watch(args.intervalo)
+        except KeyboardInterrupt:
+            return 0
+    manifest = watcher.run_once()
+    if manifest is None:
+        print("Nenhum arquivo novo")
+        return 0
+    print(f"Lote {manifest['lote']}: {os.path.dirname(watcher.state_path)}/{manifest['lote']}")
+    if manifest["erro"]:
+        print(f"Relatórios não gerados: {manifest['erro']}")
+    return 1 if manifest["erro"] or any(not item["ok"] for item in manifest["arquivos"]) else 0
+
+
+def pregerar(args):
+    from .pregenerate import pregenerate, select_files
+    
+    since = datetime.strptime(args.desde, "%Y-%m-%d") if args.desde else None
+    paths = select_files(args.caminhos, since)
+    if not paths:
+        print("Nenhum arquivo novo para pré-gerar")
+        return 0
+    summary = pregenerate(paths, reports=[kind for kind in args.relatorios.split(",") if kind])
+    for item in summary["arquivos"]:
+        if item["ok"]:
+            status = f"{item['lancamentos']} lançamentos"
+        else:
+            status = "ignorado: " + next((line.strip() for line in item["erro"].splitlines() if line.strip()), "")
+        print(f"  {item['arquivo']}: {status}")
+    if summary["erro"]:
+        print(f"Relatórios não gerados: {summary['erro']}")
+    for kind, report in summary["relatorios"].items():
+        status = ("já no cache" if report["cache"] else f"gerado em {report['segundos']} s") if report["ok"] else report["erro"]
+        print(f"  relatório {kind}: {status}")
+    print(f"Competência {summary['data']}: {summary['segundos']} s")
+    return 0 if summary["ok"] else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m camara",
+                                     description="Processamento dos arquivos da Câmara de Compensação")
+    commands = parser.add_subparsers(dest="comando", required=True)
+    
+    command = commands.add_parser("processar", help="gera os arquivos contábeis (contabil_<arquivo>)")
+    command.add_argument("arquivos", nargs="+")
+    command.add_argument("-o", "--saida", default=".", help="diretório de saída (padrão: atual)")
+    command.add_argument("--data", help="data dos lançamentos, AAAA-MM-DD (padrão: último dia do mês anterior)")
+    command.add_argument("--limite-violacoes", type=int, default=VALIDATION_ERROR_BUDGET,
+                         help="máximo de violações de partidas dobradas por arquivo (padrão: CAMARA_ERROR_BUDGET)")
+    command.set_defaults(func=processar)
+    
+    command = commands.add_parser("benchmark", help="mede o tempo de importação e do processamento")
+    command.add_argument("arquivos", nargs="*")
+    command.add_argument("--repeticoes", type=int, default=5)
+    command.set_defaults(func=benchmark)
+    
+    command = commands.add_parser("servico", help="serviço HTTP local para envio de arquivos por outros sistemas")
+    command.add_argument("--host", help="endereço (padrão: CAMARA_SERVICE_HOST ou 127.0.0.1)")
+    command.add_argument("--porta", type=int, help="porta (padrão: CAMARA_SERVICE_PORT ou 8503)")
+    command.set_defaults(func=servico)
+    
+    command = commands.add_parser("observar", help="processa os CSVs novos ou alterados de uma pasta")
+    command.add_argument("pasta")
+    command.add_argument("-o", "--saida", help="diretório de saída (padrão: PASTA/processados)")
+    command.add_argument("--intervalo", type=float, default=30.0, help="segundos entre as varreduras (padrão: 30)")
+    command.add_argument("--uma-vez", action="store_true", help="processa um lote e encerra (uso com cron)")
+    command.add_argument("--relatorios", default="unificado,irrf,contabeis",
+                         help="relatórios do pacote de cada lote, separados por vírgula (vazio = nenhum)")
+    command.add_argument("--data", help="data dos lançamentos, AAAA-MM-DD (padrão: último dia do mês anterior)")
+    command.add_argument("--limite-violacoes", type=int, default=VALIDATION_ERROR_BUDGET,
+                         help="máximo de violações de partidas dobradas por arquivo (padrão: CAMARA_ERROR_BUDGET)")
+    command.add_argument("--espera", type=float, default=5.0,
+                         help="segundos sem alteração antes de considerar um arquivo pronto (padrão: 5)")
+    command.add_argument("--repetir-rejeitados", action="store_true",
+                         help="volta a considerar arquivos rejeitados (ex.: após registrar o layout)")
+    command.set_defaults(func=observar)
+    
+    command = commands.add_parser("pregerar", help="gera antecipadamente os relatórios da competência no cache")
+    command.add_argument("caminhos", nargs="*", default=["camaras"],
+                         help="arquivos ou pastas (padrão: camaras); das pastas, só os arquivos recentes")
+    command.add_argument("--desde", help="considera os arquivos das pastas modificados a partir de AAAA-MM-DD "
+                                         "(padrão: dia seguinte ao fim da competência)")
+    command.add_argument("--relatorios", default="unificado,irrf,contabeis",
+                         help="relatórios a pré-gerar, separados por vírgula")
+    command.set_defaults(func=pregerar)
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
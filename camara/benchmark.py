@@ -0,0 +1,97 @@
+"""
+Medições de desempenho do pacote: tempo de importação (em um interpretador novo)
+e vazão do processamento de arquivos.
+
+    python -m camara benchmark [arquivos.csv ...]
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Limite do tempo de importação do núcleo (ms) e módulos que ele não pode carregar
+IMPORT_BUDGET_MS = 100
+HEAVY_MODULES = ("streamlit", "reportlab", "matplotlib", "seaborn")
+
+# (descrição, preparação fora da medição, importação medida, limite em ms ou None,
+#  se pode carregar HEAVY_MODULES)
+IMPORT_CASES = [
+    ("import camara", "", "import camara", IMPORT_BUDGET_MS, False),
+    ("import camara.config", "", "import camara.config", IMPORT_BUDGET_MS, False),
+    # O pandas (~200 ms) é dependência do motor; mede-se o custo do pacote sobre ele
+    ("camara.processor (pandas já importado)", "import numpy, pandas", "import camara.processor", IMPORT_BUDGET_MS, False),
+    ("camara.processor (inclui pandas)", "", "import camara.processor", None, False),
+    ("camara.reports (ReportLab)", "import numpy, pandas", "import camara.reports", None, True),
+]
+
+_PROBE = """
+import sys, time, json
+{setup}
+started = time.perf_counter()
+{statement}
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps({{"ms": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(statement, setup="", repeat=5):
+    """Menor tempo (ms) de `statement` em interpretadores novos e os módulos pesados carregados."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    code = _PROBE.format(setup=setup, statement=statement, heavy=HEAVY_MODULES)
+    best, heavy = None, []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], env=env, check=True,
+                                capture_output=True, text=True).stdout
+        sample = json.loads(output.strip().splitlines()[-1])
+        if best is None or sample["ms"] < best:
+            best, heavy = sample["ms"], sample["heavy"]
+    return best, heavy
+
+
+def import_benchmarks(repeat=5):
+    """Linhas com o tempo de importação de cada caso de IMPORT_CASES."""
+    rows = []
+    for name, setup, statement, budget, heavy_allowed in IMPORT_CASES:
+        elapsed, heavy = measure_import(statement, setup, repeat)
+        rows.append({
+            "caso": name,
+            "ms": round(elapsed, 1),
+            "limite_ms": budget,
+            "modulos_pesados": heavy,
+            "ok": (budget is None or elapsed <= budget) and (heavy_allowed or not heavy),
+        })
+    return rows
+
+
+def processing_benchmarks(paths, repeat=3):
+    """Vazão de NeodontoCsvProcessor.process_file para cada arquivo (melhor de `repeat`)."""
+    from .processor import NeodontoCsvProcessor
+    
+    processor = NeodontoCsvProcessor()
+    processor.quiet = True
+    rows = []
+    for path in paths:
+        best, result = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = processor.process_file(path)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        rows.append({
+            "arquivo": os.path.basename(path),
+            "ok": result.ok,
+            "linhas": 0 if result.mapped is None else len(result.mapped),
+            "lancamentos": 0 if result.processed is None else len(result.processed),
+            "ms": round(best * 1000, 1),
+            "etapas_ms": {stage: round(seconds * 1000, 1) for stage, seconds in result.timings.items()},
+        })
+    return rows
+
+
+def run(paths=(), repeat=5):
+    """Executa as medições; retorna (importação, processamento, todas as importações no limite)."""
+    imports = import_benchmarks(repeat)
+    processing = processing_benchmarks(paths) if paths else []
+    return imports, processing, all(row["ok"] for row in imports)
@@ -0,0 +1,139 @@
+"""
+Configuração do processamento: variáveis de ambiente (CAMARA_*), versões das
+regras e dos relatórios e as tabelas de contas contábeis.
+
+Módulo sem dependências além da biblioteca padrão.
+"""
+import os
+import tempfile
+
+# Diretório base dos caches em disco (sessões, artefatos). Com PrivateTmp=true no
+# serviço systemd o diretório temporário é exclusivo da instância.
+CACHE_DIR = os.environ.get("CAMARA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "camara_cache"))
+
+# Orçamento de memória (MB) para os DataFrames mantidos por sessão
+SESSION_MEMORY_BUDGET_MB = int(os.environ.get("CAMARA_SESSION_MEMORY_MB", "256"))
+
+# Número de linhas lidas por bloco no processamento em streaming
+STREAM_CHUNK_ROWS = int(os.environ.get("CAMARA_STREAM_CHUNK_ROWS", "50000"))
+
+# Cache de artefatos (PDF/CSV/ZIP) endereçado pelo conteúdo: limites de tamanho e idade
+ARTIFACT_CACHE_MB = int(os.environ.get("CAMARA_ARTIFACT_CACHE_MB", "512"))
+ARTIFACT_MAX_AGE_HOURS = float(os.environ.get("CAMARA_ARTIFACT_MAX_AGE_HOURS", "24"))
+
+# Versões das regras contábeis e do layout dos relatórios. Incrementar ao alterar
+# as regras de processamento ou o visual dos PDFs/CSVs invalida o cache de artefatos.
+RULES_VERSION = "2025.07"
+REPORT_LAYOUT_VERSION = "3"
+
+# Limite de gerações de relatórios simultâneas na instância e por sessão
+REPORT_JOB_WORKERS = int(os.environ.get("CAMARA_REPORT_WORKERS", "2"))
+REPORT_JOBS_PER_SESSION = int(os.environ.get("CAMARA_REPORT_JOBS_PER_SESSION", "2"))
+
+# Processos de trabalho compartilhados para leitura/regras/renderização (0 = executar na
+# própria thread) e tempo limite de cada tarefa, em segundos
+WORKER_PROCESSES = int(os.environ.get("CAMARA_WORKER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+WORKER_TASK_TIMEOUT_S = float(os.environ.get("CAMARA_WORKER_TIMEOUT_S", "900"))
+
+# Nível padrão de compressão dos ZIPs (0 = sem compressão, 9 = máxima)
+ZIP_COMPRESSLEVEL = int(os.environ.get("CAMARA_ZIP_LEVEL", "6"))
+
+# Livro de lançamentos (SQLite) com todos os lançamentos contábeis gerados
+LEDGER_PATH = os.environ.get("CAMARA_LEDGER_PATH", os.path.join(CACHE_DIR, "lancamentos.sqlite3"))
+
+# Layouts de cabeçalho registrados pelos usuários (além dos conhecidos de fábrica)
+LAYOUTS_FILE = os.environ.get("CAMARA_LAYOUTS_FILE", os.path.join(CACHE_DIR, "layouts.json"))
+
+# Serviço HTTP local (python -m camara servico): endereço, tamanho máximo do arquivo
+# enviado e tarefas pendentes aceitas ao mesmo tempo
+SERVICE_HOST = os.environ.get("CAMARA_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.environ.get("CAMARA_SERVICE_PORT", "8503"))
+SERVICE_MAX_UPLOAD_MB = int(os.environ.get("CAMARA_SERVICE_MAX_UPLOAD_MB", "200"))
+SERVICE_MAX_PENDING = int(os.environ.get("CAMARA_SERVICE_MAX_PENDING", "32"))
+
+# Extensões já comprimidas, armazenadas no ZIP sem recompressão
+ZIP_STORED_EXTENSIONS = ('.pdf', '.zip', '.png', '.jpg', '.jpeg', '.gz')
+
+# Dicionário com descrições das contas contábeis
+NOMES_CONTAS_CONTABEIS = {
+    85433: "Contraprestação assumida em Pós-pagamento",
+    40507: "Despesas com Eventos/ Sinistros",
+    90919: "Intercâmbio a Pagar de Corresponsabilidade Cedida - Preço Pós-estabelecido",
+    15456: "IRRF - sobre Faturamento",
+    40140: "Ato Odontológico",
+    51202: "Despesas Diversas",
+    52631: "Taxa para Manutenção da Central",
+    52532: "Propaganda e Marketing - Matriz",
+    19958: "Contraprestação Corresponsabilidade Assumida Pré-pagamento",
+    52632: "Taxa para Manutenção da Federação",
+    19253: "Crédito com Singulares",
+    40413: "(-) Recup.Reemb. Contratante Assumida Pós-pagamento",
+    23476: "IRPJ - NF Serviços (cod. 3280)",
+    21898: "Contrap. Corresp. Assumida Pós",
+    92003: "Rede Contratada/Credenciada PJ - clínicas",
+    30203: "Corresponsabilidade Assumida Pré",
+    22036: "Federação Paulista",
+    1021: "VL. N/NFF. INTERC. RECEB.ODONT",
+    2005: "VL. S/NFF. INTERC. A PAGAR",
+    2341: "VL. IRRF S/NF INTERC. PAGAR",
+    22: "VL. IRRF N/NFF. SERVIÇOS",
+    361: "VL. TAXA MANUT. DA CENTRAL S/N",
+    365: "VL. FUNDO DE MARKTING S/NFF",
+    30: "VL. CONTRATO SERVIÇOS DIVERSOS",
+    33: "VL. CONTRAP. A RECEBER ODONT",
+    228: "VL. CONTRAP. A RECEBER CLINICA",
+    31426: "VL. CONTRATO OUTROS SERVIÇOS",
+    30069: "VL. CONTRAP. RECEBIDA",
+    30071: "VL. CONTRAP. RECEBIDA - CONSULTORIA",
+    30127: "VL. CONTRAP. SERVIÇOS ADMINISTRATIVOS",
+    368: "VL. TAXA MANUT. DA FEDERAÇÃO",
+    179: "VL. MULTAS/JUROS"
+}
+
+# Esquema dos DataFrames processados (lançamentos contábeis).
+# Contas ausentes ficam como <NA> nas colunas Int32; a DATA é uma data real
+# e só é formatada como dd/mm/yyyy na exportação. Valores monetários são
+# sempre mantidos em centavos (int64) e formatados apenas na saída.
+# Contas que as regras contábeis podem gerar no débito ou no crédito (inclusive IRRF)
+CONTAS_REGRAS = frozenset({
+    11021, 15456, 19253, 19265, 19958, 21898, 22036, 23476, 30069, 30071, 30088, 30127,
+    30173, 30203, 31426, 31731, 40140, 40413, 40507, 51202, 51818, 52129, 52451, 52532,
+    52631, 52632, 53742, 84679, 85433, 90918, 90919, 92003,
+})
+
+# Limite de violações de partidas dobradas aceitas antes de interromper o
+# processamento em lote (vazio = sem limite, apenas alerta)
+VALIDATION_ERROR_BUDGET = int(os.environ["CAMARA_ERROR_BUDGET"]) if os.environ.get("CAMARA_ERROR_BUDGET") else None
+
+# Detecção de valores atípicos pelo histórico de cada singular e tipo de recebimento:
+# escore robusto (mediana/MAD) acima do qual o lançamento vai para revisão e número
+# mínimo de lançamentos anteriores para formar a linha de base
+ANOMALY_THRESHOLD = float(os.environ.get("CAMARA_ANOMALY_THRESHOLD", "3.5"))
+ANOMALY_MIN_HISTORY = int(os.environ.get("CAMARA_ANOMALY_MIN_HISTORY", "3"))
+
+# Relatórios contábeis solicitados pelo contador (ordem de geração)
+ACCOUNTING_REPORTS = [
+    {"name": "taxas_manutencao", "title": "Relatório de Taxas de Manutenção (3)", 
+    "filters": {"CodigoTipoRecebimento": 3}},
+    
+    {"name": "taxas_marketing", "title": "Relatório de Taxas de Marketing (4)", 
+    "filters": {"CodigoTipoRecebimento": 4}},
+    
+    {"name": "multas_juros", "title": "Relatório de Multas e Juros (5)", 
+    "filters": {"CodigoTipoRecebimento": 5}},
+    
+    {"name": "outras", "title": "Relatório de Outras (6)", 
+    "filters": {"CodigoTipoRecebimento": 6}},
+    
+    {"name": "pre_pagamento_operadoras", "title": "Relatório de Pré-pagamento (1) - Operadoras", 
+    "filters": {"CodigoTipoRecebimento": 1, "TipoSingular": "Operadora"}},
+    
+    {"name": "custo_operacional_operadoras", "title": "Relatório de Custo Operacional (2) - Operadoras", 
+    "filters": {"CodigoTipoRecebimento": 2, "TipoSingular": "Operadora"}},
+    
+    {"name": "pre_pagamento_prestadoras", "title": "Relatório de Pré-pagamento (1) - Prestadoras", 
+    "filters": {"CodigoTipoRecebimento": 1, "TipoSingular": "Prestadora"}},
+    
+    {"name": "custo_operacional_prestadoras", "title": "Relatório de Custo Operacional (2) - Prestadoras", 
+    "filters": {"CodigoTipoRecebimento": 2, "TipoSingular": "Prestadora"}}
+]
@@ -0,0 +1,531 @@
+"""
+Execução em segundo plano: tarefas de geração de relatórios (threads) e o pool
+de processos compartilhado para regras, processamento de arquivos e renderização.
+"""
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from .config import (REPORT_JOB_WORKERS, REPORT_JOBS_PER_SESSION, WORKER_PROCESSES, WORKER_TASK_TIMEOUT_S,
+                     ZIP_COMPRESSLEVEL)
+from .processor import NeodontoCsvProcessor, capture_messages
+from .sessions import SessionDataManager
+
+
+class JobCancelled(Exception):
+    """Levantada dentro de uma tarefa quando o usuário pede o cancelamento."""
+
+
+class ReportJob:
+    """Estado de uma geração de relatórios executada em segundo plano."""
+
+    def __init__(self, session_id, kind, title):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.kind = kind
+        self.title = title
+        self.status = "na fila"
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.finished_at = None
+        self.future = None
+        self.cached = False
+        self._cancel = threading.Event()
+
+    @property
+    def active(self):
+        return self.status in ("na fila", "executando")
+
+    def report_progress(self, fraction, message=""):
+        """Atualiza o progresso; interrompe a tarefa se o cancelamento foi pedido."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.progress = max(0.0, min(float(fraction), 1.0))
+        self.message = message
+
+    def cancel(self):
+        """Cancela a tarefa (imediatamente se ainda estiver na fila)."""
+        self._cancel.set()
+        if self.future is not None and self.future.cancel():
+            self._finish("cancelado")
+
+    def _finish(self, status, result=None, error=None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = datetime.now()
+        if status == "concluído":
+            self.progress = 1.0
+
+
+class ReportJobRunner:
+    """
+    Executa gerações de relatórios fora do ciclo de reexecução do Streamlit.
+
+    Uma instância por processo (via st.cache_resource). O pool de threads limita
+    as gerações simultâneas da instância e cada sessão pode ter no máximo
+    REPORT_JOBS_PER_SESSION tarefas ativas, para que um usuário não ocupe a fila.
+    """
+
+    def __init__(self, max_workers=None, per_session=None):
+        self.max_workers = max_workers or REPORT_JOB_WORKERS
+        self.per_session = per_session or REPORT_JOBS_PER_SESSION
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="relatorios")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, session_id, kind, title, build, *args, **kwargs):
+        """
+        Agenda build(job, *args, **kwargs) e retorna o ReportJob.
+        build deve chamar job.report_progress periodicamente e retornar o resultado.
+        """
+        self.prune()
+        with self._lock:
+            active = [job for job in self._jobs.values() if job.session_id == session_id and job.active]
+            if len(active) >= self.per_session:
+                raise RuntimeError(f"Limite de {self.per_session} gerações simultâneas por sessão atingido")
+            job = ReportJob(session_id, kind, title)
+            self._jobs[job.job_id] = job
+        job.future = self._executor.submit(self._run, job, build, args, kwargs)
+        return job
+
+    def _run(self, job, build, args, kwargs):
+        if job._cancel.is_set():
+            job._finish("cancelado")
+            return
+        job.status = "executando"
+        try:
+            result = build(job, *args, **kwargs)
+            job._finish("concluído", result=result)
+        except JobCancelled:
+            job._finish("cancelado")
+        except Exception as e:
+            job._finish("erro", error=str(e))
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs_for(self, session_id):
+        """Tarefas da sessão, da mais recente para a mais antiga."""
+        with self._lock:
+            return [job for job in reversed(self._jobs.values()) if job.session_id == session_id]
+
+    def all_jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def discard(self, job_id):
+        """Remove uma tarefa encerrada (os artefatos continuam no cache de artefatos)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.active:
+                return False
+            del self._jobs[job_id]
+        return True
+
+    def prune(self, keep_per_session=10):
+        """Descarta tarefas encerradas de sessões finalizadas e as mais antigas de cada sessão."""
+        live_sessions = {session.session_id for session in SessionDataManager.all_sessions()}
+        finished = {}
+        for job in self.all_jobs():
+            if not job.active:
+                finished.setdefault(job.session_id, []).append(job)
+        for session_id, jobs in finished.items():
+            stale = jobs if session_id not in live_sessions else jobs[:-keep_per_session]
+            for job in stale:
+                self.discard(job.job_id)
+
+
+def run_rules_task(progress, df, config):
+    """Tarefa do pool: aplica as regras contábeis (RunConfig) e devolve (DataFrame, mensagens)."""
+    processor = NeodontoCsvProcessor(config)
+    with capture_messages() as messages:
+        processed_df = processor.process_dataframe(df)
+    return processed_df, messages
+
+
+def render_reports_task(progress, kind, df, options, output_dir):
+    """Tarefa do pool: gera os relatórios de um tipo em output_dir."""
+    processor = NeodontoCsvProcessor()
+    processor.quiet = True
+    if kind == "unificado":
+        return processor.generate_unified_report(df, output_dir)
+    if kind == "irrf":
+        return processor.generate_irrf_report(df, output_dir)
+    if kind == "compensacao":
+        return processor.generate_netting_report(df, output_dir)
+    if kind == "balancete":
+        return processor.generate_trial_balance_report(df, output_dir, **options)
+    return processor.generate_accounting_reports(df, output_dir, progress_callback=progress, **options)
+
+
+def process_file_task(progress, path, name, config, output_dir):
+    """
+    Tarefa do pool: processa um arquivo CSV em disco e grava em output_dir o
+    contabil_<nome> e os lançamentos (pickle, entrada dos relatórios). Devolve um
+    resumo serializável em JSON.
+    """
+    processor = NeodontoCsvProcessor(config)
+    result = processor.process_file(path, name=name)
+    summary = {
+        "arquivo": result.source,
+        "ok": result.ok,
+        "erro": result.error,
+        "mensagens": [[kind, " ".join(str(arg) for arg in args)] for kind, args, _ in result.messages],
+        "violacoes": 0 if result.violations is None else len(result.violations),
+        "atipicos": 0 if result.anomalies is None else len(result.anomalies),
+        "tempos": result.timings,
+    }
+    if result.ok:
+        summary["lancamentos"] = len(result.processed)
+        summary["contabil_file"] = processor.write_csv(
+            result.processed, os.path.join(output_dir, f"contabil_{result.source}"))
+        summary["dados_file"] = os.path.join(output_dir, f"lancamentos_{result.source}.pkl")
+        result.processed.to_pickle(summary["dados_file"])
+    return summary
+
+
+class ProcessingFailed(Exception):
+    """O arquivo não pôde ser processado; o resumo (não guardado no cache) acompanha o erro."""
+
+    def __init__(self, summary):
+        super().__init__(summary.get("erro") or "Falha no processamento")
+        self.summary = summary
+
+
+def process_file_cached(pool, cache, client, path, name, config, sha256=None, cancel_event=None):
+    """
+    Executa process_file_task no pool guardando o resultado no cache de artefatos,
+    endereçado pelo hash do conteúdo, pelo nome e pela configuração. Retorna
+    (resumo, veio_do_cache); arquivos recusados levantam ProcessingFailed e não
+    são guardados.
+    """
+    key = cache.digest_key(sha256 or cache.file_digest(path), "contabil", {
+        "arquivo": name,
+        "data": config.reference_date.strftime("%Y-%m-%d"),
+        "limite_violacoes": config.error_budget,
+    })
+
+    def build(output_dir):
+        summary = pool.run(client, "arquivo", path, name, config, output_dir, cancel_event=cancel_event)
+        if not summary["ok"]:
+            raise ProcessingFailed(summary)
+        return summary
+
+    return cache.get_or_put(key, build)
+
+
+# Tipos de relatório aceitos por render_reports_task
+REPORT_KINDS = ("unificado", "irrf", "compensacao", "balancete", "contabeis")
+
+
+def default_report_options(kind):
+    """Opções de cada tipo de relatório equivalentes aos padrões da aba Relatórios Contábeis."""
+    if kind == "balancete":
+        return {"by_month": False}
+    if kind == "contabeis":
+        return {"zip_compresslevel": ZIP_COMPRESSLEVEL, "report_names": None, "formats": ('csv', 'pdf')}
+    return {}
+
+
+def artifact_files(result):
+    """Caminhos dos arquivos (chaves *_file) contidos no resultado de um gerador de relatórios."""
+    files = []
+    if isinstance(result, dict):
+        for key, value in result.items():
+            if key.endswith("_file") and isinstance(value, str):
+                files.append(value)
+            else:
+                files.extend(artifact_files(value))
+    elif isinstance(result, (list, tuple)):
+        for value in result:
+            files.extend(artifact_files(value))
+    return [path for path in dict.fromkeys(files) if os.path.isfile(path)]
+
+
+# Tarefas aceitas pelo WorkerPool, enviadas pelo nome
+WORKER_TASKS = {
+    "regras": run_rules_task,
+    "relatorios": render_reports_task,
+    "arquivo": process_file_task,
+}
+
+
+class WorkerTaskError(Exception):
+    """Erro levantado dentro de um processo de trabalho."""
+
+
+def _worker_main(conn):
+    """Laço de um processo de trabalho: recebe (tarefa, args, kwargs) e devolve o resultado."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    def progress(fraction, message=""):
+        conn.send(("progresso", fraction, message))
+    
+    # Se o processo principal terminar sem fechar o Pipe, encerra ao perceber que o pai mudou
+    parent_pid = os.getppid()
+    while True:
+        try:
+            while not conn.poll(1.0):
+                if os.getppid() != parent_pid:
+                    return
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+        if request is None:
+            return
+        name, args, kwargs = request
+        try:
+            conn.send(("ok", WORKER_TASKS[name](progress, *args, **kwargs)))
+        except Exception as e:
+            conn.send(("erro", f"{type(e).__name__}: {e}"))
+
+
+class WorkerTask:
+    """Tarefa enviada ao WorkerPool."""
+
+    def __init__(self, session_id, name, args, kwargs, timeout):
+        self.task_id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self.timeout = timeout
+        self.status = "na fila"
+        self.progress = None  # (fração, mensagem) mais recente enviada pelo processo
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def active(self):
+        return self.status in ("na fila", "executando")
+
+    def cancel(self):
+        """Pede o cancelamento; uma tarefa em execução tem o processo encerrado."""
+        self._cancel.set()
+
+    def _finish(self, status, result=None, error=None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.args = self.kwargs = None
+        self.finished_at = datetime.now()
+        self._done.set()
+
+
+class WorkerPool:
+    """
+    Pool de processos compartilhado pelas sessões do Streamlit (uma instância por processo).
+
+    Leitura, regras e renderização de relatórios disputam o GIL quando executadas
+    nas threads dos scripts; aqui elas rodam em processos separados. Cada sessão
+    tem sua fila e os processos livres atendem as sessões em rodízio, de modo que
+    uma geração longa não atrasa as demais. Cada tarefa tem tempo limite, e as
+    tarefas de sessões encerradas são canceladas (o processo é substituído).
+    Com processes=0 as tarefas rodam na thread de quem chama.
+    """
+
+    def __init__(self, processes=None, timeout=None, is_session_alive=None):
+        processes = WORKER_PROCESSES if processes is None else processes
+        self.processes = processes
+        self.timeout = timeout or WORKER_TASK_TIMEOUT_S
+        self._is_session_alive = is_session_alive or self._session_alive
+        # Sem fork: os processos são criados a partir das threads do pool, dentro de um processo
+        # com várias threads (Streamlit, serviço), e herdariam travas seguradas por outras threads
+        # (logging, imports, BLAS). O forkserver, com camara.jobs pré-carregado, cria os processos
+        # a partir de um servidor de uma única thread; sem ele, spawn
+        self._context = None
+        if processes:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                self._context = multiprocessing.get_context("forkserver")
+                self._context.set_forkserver_preload([__name__])
+            else:
+                self._context = multiprocessing.get_context("spawn")
+        self._queues = OrderedDict()  # sessão -> deque de tarefas, em ordem de rodízio
+        self._running = {}            # task_id -> tarefa em execução
+        self._cond = threading.Condition()
+        self._last_reap = 0.0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.timed_out = 0
+        self._slots = [threading.Thread(target=self._slot, name=f"worker-pool-{i}", daemon=True)
+                       for i in range(processes)]
+        for slot in self._slots:
+            slot.start()
+
+    @staticmethod
+    def _session_alive(session_id):
+        if session_id is None:
+            return True
+        return any(session.session_id == session_id for session in SessionDataManager.all_sessions())
+
+    def submit(self, session_id, name, *args, timeout=None, **kwargs):
+        """Coloca a tarefa na fila da sessão e retorna o WorkerTask."""
+        if name not in WORKER_TASKS:
+            raise ValueError(f"Tarefa desconhecida: {name}")
+        task = WorkerTask(session_id, name, args, kwargs, timeout or self.timeout)
+        with self._cond:
+            if session_id not in self._queues:
+                # Sessão sem tarefas na fila: é atendida antes das que já vêm sendo atendidas
+                self._queues[session_id] = deque()
+                self._queues.move_to_end(session_id, last=False)
+            self._queues[session_id].append(task)
+            self._cond.notify()
+        return task
+
+    def run(self, session_id, name, *args, timeout=None, on_progress=None, cancel_event=None, **kwargs):
+        """
+        Executa a tarefa e aguarda o resultado (sem segurar o GIL durante a espera).
+        on_progress(fração, mensagem) recebe o progresso na thread de quem chama; uma
+        exceção levantada por ele (ex.: JobCancelled) cancela a tarefa e é propagada.
+        """
+        if not self.processes:
+            return WORKER_TASKS[name](on_progress or (lambda fraction, message="": None), *args, **kwargs)
+        
+        task = self.submit(session_id, name, *args, timeout=timeout, **kwargs)
+        reported = None
+        try:
+            while not task._done.wait(0.2):
+                if cancel_event is not None and cancel_event.is_set():
+                    task.cancel()
+                if on_progress is not None and task.progress is not None and task.progress is not reported:
+                    reported = task.progress
+                    on_progress(*reported)
+        except BaseException:
+            task.cancel()
+            raise
+        
+        if task.status == "concluído":
+            return task.result
+        if task.status == "tempo esgotado":
+            raise TimeoutError(f"Tempo limite de {task.timeout:g} s excedido ({name})")
+        if task.status == "cancelado":
+            raise JobCancelled()
+        raise WorkerTaskError(task.error)
+
+    def _spawn(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        return process, parent_conn
+
+    def _reap(self):
+        """Cancela as tarefas (na fila e em execução) de sessões encerradas. Chamar com o lock."""
+        now = time.monotonic()
+        if now - self._last_reap < 1.0:
+            return
+        self._last_reap = now
+        for session_id in list(self._queues):
+            if not self._is_session_alive(session_id):
+                for task in self._queues.pop(session_id):
+                    self.cancelled += 1
+                    task._finish("cancelado")
+        for task in self._running.values():
+            if not self._is_session_alive(task.session_id):
+                task.cancel()
+
+    def _take(self):
+        """Próxima tarefa, em rodízio entre as sessões; None se não houver após 1 s."""
+        with self._cond:
+            self._reap()
+            while not self._queues:
+                if not self._cond.wait(1.0):
+                    self._reap()
+                    return None
+            session_id, queue = next(iter(self._queues.items()))
+            task = queue.popleft()
+            if queue:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+            if task._cancel.is_set():
+                self.cancelled += 1
+                task._finish("cancelado")
+                return None
+            task.status = "executando"
+            task.started_at = datetime.now()
+            self._running[task.task_id] = task
+            return task
+
+    def _slot(self):
+        process, conn = self._spawn()
+        while True:
+            task = self._take()
+            if task is None:
+                continue
+            deadline = time.monotonic() + task.timeout
+            outcome = None
+            try:
+                conn.send((task.name, task.args, task.kwargs))
+                while outcome is None:
+                    if conn.poll(0.2):
+                        message = conn.recv()
+                        if message[0] == "progresso":
+                            task.progress = message[1:]
+                        else:
+                            outcome = message
+                    elif task._cancel.is_set():
+                        outcome = ("cancelado", None)
+                    elif time.monotonic() > deadline:
+                        outcome = ("tempo esgotado", None)
+                    elif not process.is_alive():
+                        outcome = ("falha", f"Processo de trabalho encerrado (código {process.exitcode})")
+            except (EOFError, OSError) as e:
+                outcome = ("falha", f"Falha na comunicação com o processo de trabalho: {e}")
+            
+            status, payload = outcome
+            if status not in ("ok", "erro"):
+                # Processo interrompido ou em estado desconhecido: substituir (uma exceção da
+                # tarefa, status "erro", deixa o processo pronto para a próxima)
+                process.kill()
+                process.join()
+                conn.close()
+                process, conn = self._spawn()
+            with self._cond:
+                self._running.pop(task.task_id, None)
+                if status == "ok":
+                    self.completed += 1
+                    task._finish("concluído", result=payload)
+                elif status == "cancelado":
+                    self.cancelled += 1
+                    task._finish("cancelado")
+                elif status == "tempo esgotado":
+                    self.timed_out += 1
+                    task._finish("tempo esgotado")
+                else:
+                    self.failed += 1
+                    task._finish("erro", error=payload)
+
+    def stats(self):
+        """Situação do pool para a página de diagnóstico."""
+        with self._cond:
+            queued = {session_id: len(queue) for session_id, queue in self._queues.items()}
+            running = list(self._running.values())
+        return {
+            "processos": self.processes,
+            "tempo_limite_s": self.timeout,
+            "em_execucao": len(running),
+            "na_fila": sum(queued.values()),
+            "concluidas": self.completed,
+            "erros": self.failed,
+            "canceladas": self.cancelled,
+            "tempo_esgotado": self.timed_out,
+            "filas": queued,
+            "tarefas": running,
+        }
@@ -0,0 +1,120 @@
+"""Reconhecimento de layouts de cabeçalho dos arquivos da Câmara (assinatura das colunas)."""
+import functools
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+
+from .config import LAYOUTS_FILE
+
+
+def normalize_header(column):
+    """Nome de coluna comparável: sem BOM, acentos, caixa, espaços e pontuação."""
+    text = unicodedata.normalize('NFKD', str(column).replace('\ufeff', ''))
+    text = text.encode('ascii', errors='ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]', '', text.lower())
+
+
+def header_signature(columns):
+    """Assinatura (hash) de um cabeçalho, independente da ordem das colunas."""
+    normalized = sorted({normalize_header(column) for column in columns})
+    return hashlib.sha1('|'.join(normalized).encode('utf-8')).hexdigest()[:16]
+
+
+class HeaderLayoutRegistry:
+    """
+    Tabela de layouts de cabeçalho conhecidos, indexada pela assinatura do cabeçalho.
+    
+    Cada layout tem nome, tipo ('padrao', 'simplificado' ou 'mapeamento') e o
+    mapeamento coluna normalizada -> coluna esperada. Os layouts de fábrica ficam
+    em BUILTIN_LAYOUTS; os registrados pelo usuário ou aprendidos pelo mapeamento
+    automático são gravados em LAYOUTS_FILE e valem para todas as sessões.
+    """
+    
+    CAMARA_COLUMNS = [
+        'Tipo', 'CodigoSingular', 'NomeSingular', 'TipoSingular', 'RegistroANS',
+        'CodigoTipoRecebimento', 'DescricaoTipoRecebimento', 'NumeroDocumento', 'Descricao',
+        'ValorBruto', 'TaxaAdministrativa', 'Subtotal', 'IRRF', 'OutrosTributos', 'ValorLiquido',
+    ]
+    BUILTIN_LAYOUTS = [
+        {"name": "Câmara de Compensação (padrão, inclusive exportação com BOM)", "kind": "padrao",
+         "columns": CAMARA_COLUMNS},
+        {"name": "Câmara de Compensação (colunas mínimas)", "kind": "padrao",
+         "columns": ['Tipo', 'CodigoSingular', 'NomeSingular', 'TipoSingular', 'CodigoTipoRecebimento',
+                     'DescricaoTipoRecebimento', 'ValorBruto', 'IRRF', 'Descricao']},
+        {"name": "Federação (simplificado)", "kind": "simplificado",
+         "columns": ['Código', 'Nome', 'Tipo', 'Valor a Receber', 'Valor a Pagar', 'Saldo',
+                     'Vencimento', 'Conta a Receber', 'Conta a Pagar']},
+    ]
+    
+    def __init__(self, path=None):
+        self.path = path or LAYOUTS_FILE
+        self._lock = threading.Lock()
+        self._layouts = {}
+        for layout in self.BUILTIN_LAYOUTS:
+            self._add(dict(layout, origem="fábrica"))
+        for layout in self._read():
+            self._add(layout)
+    
+    def _add(self, layout):
+        if layout["kind"] == "padrao":
+            layout.setdefault("mapping", {normalize_header(column): column for column in layout["columns"]})
+        self._layouts[header_signature(layout["columns"])] = layout
+    
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+    
+    def _write(self):
+        learned = [layout for layout in self._layouts.values() if layout.get("origem") != "fábrica"]
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.', suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(learned, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+    
+    def lookup(self, columns):
+        """Layout registrado para o cabeçalho, ou None."""
+        return self._layouts.get(header_signature(columns))
+    
+    def register(self, name, columns, mapping, origem="usuário"):
+        """
+        Registra (ou substitui) o layout de um cabeçalho. mapping: coluna do arquivo
+        -> coluna esperada. Devolve o layout gravado.
+        """
+        layout = {
+            "name": name,
+            "kind": "mapeamento",
+            "columns": [str(column) for column in columns],
+            "mapping": {normalize_header(source): target for source, target in mapping.items()},
+            "origem": origem,
+        }
+        with self._lock:
+            self._add(layout)
+            self._write()
+        return layout
+    
+    def renames(self, layout, columns):
+        """Dicionário para DataFrame.rename a partir do mapeamento do layout."""
+        mapping = layout.get("mapping", {})
+        renames = {}
+        for column in columns:
+            target = mapping.get(normalize_header(column))
+            if target is not None and target != column:
+                renames[column] = target
+        return renames
+    
+    def layouts(self):
+        return list(self._layouts.values())
+
+
+@functools.lru_cache(maxsize=None)
+def default_layout_registry():
+    """Registro de layouts compartilhado pelo processo (LAYOUTS_FILE)."""
+    return HeaderLayoutRegistry()
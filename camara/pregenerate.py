@@ -0,0 +1,130 @@
+"""
+Pré-geração dos relatórios da competência (cron ou timer do systemd).
+
+    python -m camara pregerar [CAMINHOS ...] [--desde AAAA-MM-DD] [--relatorios tipo,...]
+
+Processa os arquivos mais recentes da Câmara com a configuração padrão da
+interface (data no último dia do mês anterior) e gera, no cache de artefatos, o
+relatório unificado, o de IRRF e os oito relatórios contábeis sobre os dados
+consolidados. Quando a aba Relatórios Contábeis recebe os mesmos arquivos, a
+geração encontra os artefatos prontos em vez de renderizá-los.
+"""
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from .jobs import (REPORT_KINDS, ProcessingFailed, WorkerPool, artifact_files, default_report_options,
+                   process_file_cached)
+from .processor import EntryValidationError, NeodontoCsvProcessor, RunConfig
+from .storage import ArtifactCache
+
+logger = logging.getLogger(__name__)
+
+# Relatórios pedidos pelo contador logo após o fechamento da Câmara
+PREGENERATED_REPORTS = ("unificado", "irrf", "contabeis")
+
+
+def newest_files(folder, since):
+    """CSVs da pasta (sem subpastas, ignorando contabil_*) modificados a partir de `since`."""
+    files = []
+    for entry in os.scandir(folder):
+        name = entry.name
+        if (entry.is_file() and name.lower().endswith(".csv") and not name.startswith((".", "contabil_"))
+                and datetime.fromtimestamp(entry.stat().st_mtime) >= since):
+            files.append(entry.path)
+    return sorted(files)
+
+
+def select_files(paths, since=None, config=None):
+    """
+    Arquivos da pré-geração: os informados diretamente e, das pastas, os modificados
+    desde `since` (padrão: o dia seguinte à data de referência, isto é, os que
+    chegaram depois do fechamento da competência).
+    """
+    config = config or RunConfig.default()
+    since = since or config.reference_date + timedelta(days=1)
+    selected = []
+    for path in paths:
+        selected.extend(newest_files(path, since) if os.path.isdir(path) else [path])
+    return list(dict.fromkeys(selected))
+
+
+def pregenerate(paths, config=None, reports=PREGENERATED_REPORTS, pool=None, cache=None):
+    """
+    Processa os arquivos e gera os relatórios no cache de artefatos.
+
+    Os arquivos são consolidados como na aba Relatórios Contábeis (ordem por nome,
+    duplicados entre arquivos removidos) e cada relatório usa as opções padrão da
+    aba (default_report_options), de modo que as chaves no cache coincidam.
+    Retorna um resumo com os arquivos, os relatórios e o que veio do cache.
+    """
+    import pandas as pd
+
+    unknown = [kind for kind in reports if kind not in REPORT_KINDS]
+    if unknown:
+        raise ValueError(f"Relatórios desconhecidos: {', '.join(unknown)}")
+    config = config or RunConfig.default()
+    pool = pool or WorkerPool(is_session_alive=lambda client: True)
+    cache = cache or ArtifactCache()
+    started = time.perf_counter()
+    summary = {"data": config.reference_date.strftime("%Y-%m-%d"), "arquivos": [], "relatorios": {}, "erro": None}
+
+    frames = {}
+    for path in paths:
+        name = os.path.basename(path)
+        item = {"arquivo": name, "caminho": path, "ok": False}
+        summary["arquivos"].append(item)
+        if name in frames:
+            item["erro"] = "Outro arquivo com o mesmo nome já foi selecionado"
+            continue
+        try:
+            processed, cached = process_file_cached(pool, cache, "pregeracao", path, name, config)
+        except ProcessingFailed as e:
+            item["erro"] = str(e).strip()
+            continue
+        except Exception as e:
+            item["erro"] = f"{type(e).__name__}: {e}"
+            continue
+        item.update(ok=True, lancamentos=processed["lancamentos"], cache=cached)
+        frames[name] = pd.read_pickle(processed["dados_file"])
+        logger.info("%s: %d lançamentos%s", name, processed["lancamentos"], " (cache)" if cached else "")
+
+    if frames:
+        processor = NeodontoCsvProcessor(config)
+        processor.quiet = True
+        df, duplicates = processor.deduplicate_frames({name: frames[name] for name in sorted(frames)})
+        summary["registros"] = len(df)
+        summary["duplicados_removidos"] = int(duplicates['confirmado'].sum())
+        summary["possiveis_duplicados"] = len(duplicates) - summary["duplicados_removidos"]
+        try:
+            # A aba de relatórios recusa dados acima do orçamento de violações: nada a pré-gerar
+            processor.enforce_error_budget(processor.validate_entries(df), source="dados consolidados")
+        except EntryValidationError as e:
+            summary["erro"] = str(e)
+            reports = ()
+        for kind in reports:
+            options = default_report_options(kind)
+            kind_started = time.perf_counter()
+
+            def build(output_dir, kind=kind, options=options):
+                return pool.run("pregeracao", "relatorios", kind, df, options, output_dir)
+
+            try:
+                result, cached = cache.get_or_build(df, kind, options, build)
+            except Exception as e:
+                summary["relatorios"][kind] = {"ok": False, "erro": f"{type(e).__name__}: {e}"}
+                continue
+            summary["relatorios"][kind] = {
+                "ok": True,
+                "cache": cached,
+                "chave": cache.key(df, kind, options),
+                "arquivos": len(artifact_files(result)),
+                "segundos": round(time.perf_counter() - kind_started, 2),
+            }
+            logger.info("Relatório %s: %s", kind, "já estava no cache" if cached else "gerado")
+
+    summary["segundos"] = round(time.perf_counter() - started, 2)
+    summary["ok"] = (bool(frames) and summary["erro"] is None
+                     and all(report["ok"] for report in summary["relatorios"].values()))
+    return summary
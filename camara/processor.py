@@ -0,0 +1,2230 @@
+"""
+Motor de processamento dos arquivos da Câmara de Compensação: leitura, mapeamento
+de layouts, regras contábeis, lançamentos de IRRF, validação e serialização.
+
+Não depende do Streamlit nem das bibliotecas de relatórios (ver camara.reports).
+"""
+import base64
+import contextvars
+import copy
+import io
+import logging
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .config import (ANOMALY_MIN_HISTORY, ANOMALY_THRESHOLD, CACHE_DIR, CONTAS_REGRAS, NOMES_CONTAS_CONTABEIS,
+                     RULES_VERSION, STREAM_CHUNK_ROWS, VALIDATION_ERROR_BUDGET)
+from .layouts import default_layout_registry
+from .storage import StreamingZipWriter
+
+logger = logging.getLogger(__name__)
+
+
+PROCESSED_SCHEMA = {
+    'Debito': 'Int32',
+    'Credito': 'Int32',
+    'Historico': 'Int32',
+    'DATA': 'datetime64[ns]',
+    'valor': 'int64',
+    'CodigoTipoRecebimento': 'Int8',
+    'CodigoSingular': 'Int32',
+    'Tipo': 'category',
+    'TipoSingular': 'category',
+    'NomeSingular': 'category',
+    'DescricaoTipoRecebimento': 'category',
+}
+
+
+def apply_processed_schema(df):
+    """Converte as colunas de um DataFrame processado para os tipos de PROCESSED_SCHEMA."""
+    for col, dtype in PROCESSED_SCHEMA.items():
+        if col not in df.columns or str(df[col].dtype) == dtype:
+            continue
+        if dtype.startswith('datetime'):
+            df[col] = pd.to_datetime(df[col], dayfirst=True).dt.normalize()
+        elif dtype.startswith('Int'):
+            df[col] = pd.to_numeric(df[col].replace('', None), errors='coerce').astype(dtype)
+        elif dtype == 'int64':
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).round().astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def format_cents_series(cents, thousands=False):
+    """Formata uma série em centavos como texto com vírgula decimal (ex.: 12122 -> '121,22')."""
+    cents = cents.fillna(0).astype('int64')
+    absolute = cents.abs()
+    reais = absolute // 100
+    if thousands:
+        reais_str = reais.map('{:,}'.format).astype(str).str.replace(',', '.', regex=False)
+    else:
+        reais_str = reais.astype(str)
+    sign = pd.Series(np.where(cents < 0, '-', ''), index=cents.index)
+    return sign + reais_str + ',' + (absolute % 100).astype(str).str.zfill(2)
+
+
+class EntryValidationError(Exception):
+    """Violações de partidas dobradas acima do orçamento de erros."""
+    
+    def __init__(self, violations, budget, source=None):
+        self.violations = violations
+        self.budget = budget
+        self.source = source
+        counts = violations['tipo'].value_counts()
+        detail = ', '.join(f"{tipo}: {count}" for tipo, count in counts.items() if count)
+        origem = f" em {source}" if source else ""
+        super().__init__(f"{len(violations)} violação(ões){origem} acima do limite de {budget} ({detail})")
+
+
+# Mensagens de processamento da execução corrente; cada thread (ou contexto) tem a sua
+_run_messages = contextvars.ContextVar("camara_run_messages", default=None)
+
+
+@contextmanager
+def capture_messages():
+    """Guarda as mensagens de processamento (kind, args, kwargs) em uma lista em vez de exibi-las."""
+    messages = []
+    token = _run_messages.set(messages)
+    try:
+        yield messages
+    finally:
+        _run_messages.reset(token)
+
+
+@dataclass(frozen=True)
+class RunConfig:
+    """
+    Configuração imutável de uma execução: data dos lançamentos (último dia do mês
+    de referência), versão das regras e orçamento de violações (None = apenas alerta).
+    """
+    reference_date: datetime
+    rules_version: str = RULES_VERSION
+    error_budget: Optional[int] = VALIDATION_ERROR_BUDGET
+
+    @classmethod
+    def default(cls, today=None, **kwargs):
+        """Configuração com a data de referência no último dia do mês anterior a `today` (hoje)."""
+        # Meia-noite: a hora da execução não deve entrar nos lançamentos (nem no hash do cache)
+        today = (today or datetime.today()).replace(hour=0, minute=0, second=0, microsecond=0)
+        return cls(reference_date=today.replace(day=1) - timedelta(days=1), **kwargs)
+
+
+@dataclass
+class ProcessingResult:
+    """
+    Resultado do processamento de um arquivo (NeodontoCsvProcessor.process_file ou
+    process_csv_stream). Pode ser serializado com pickle, para voltar de um processo
+    de trabalho ou ser gravado pela linha de comando.
+    """
+    source: str
+    config: RunConfig
+    processed: Optional[pd.DataFrame] = None   # lançamentos contábeis
+    mapped: Optional[pd.DataFrame] = None      # original com as colunas da Câmara
+    mapping_info: str = ""
+    totals: Optional[dict] = None              # totais acumulados (modo streaming)
+    violations: Optional[pd.DataFrame] = None
+    anomalies: Optional[pd.DataFrame] = None
+    messages: list = field(default_factory=list)  # (kind, args, kwargs), ver show_messages
+    timings: dict = field(default_factory=dict)   # etapa -> segundos
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class NeodontoCsvProcessor:
+    def __init__(self, config=None):
+        # Configuração imutável da execução; with_config cria um processador com outra
+        self.config = config or RunConfig.default()
+        
+        # Mapeamento oficial CodigoTipoRecebimento <-> DescricaoTipoRecebimento
+        self.codigo_descricao_map = {
+            1: "Repasse em Pré-pagamento",
+            2: "Repasse em Custo Operacional", 
+            3: "Taxa de Manutenção",
+            4: "Fundo de Marketing",
+            5: "Juros",
+            6: "Outros"
+        }
+        
+        # Mapeamento reverso para sincronização
+        self.descricao_codigo_map = {v: k for k, v in self.codigo_descricao_map.items()}
+        
+        # Quando True, as mensagens de processamento não são exibidas; display(kind, args, kwargs)
+        # exibe as demais (ex.: no Streamlit) e, sem ele, elas vão para o logging
+        self.quiet = False
+        self.display = None
+        
+        # Serviços compartilhados (não guardam estado da execução): history_source devolve
+        # o histórico de valores (JournalLedger.history) ou None para não verificar
+        # valores atípicos; worker_pool (WorkerPool) executa as regras em outro processo,
+        # na fila da sessão session_id (None = na própria thread); layout_registry
+        # (HeaderLayoutRegistry) reconhece os cabeçalhos (None = registro padrão do processo)
+        self.history_source = None
+        self.worker_pool = None
+        self.session_id = None
+        self.layout_registry = None
+    
+    @property
+    def last_day_of_previous_month(self):
+        """Data dos lançamentos gerados (RunConfig.reference_date)."""
+        return self.config.reference_date
+    
+    @property
+    def error_budget(self):
+        """Máximo de violações aceitas por arquivo (RunConfig.error_budget)."""
+        return self.config.error_budget
+    
+    def with_config(self, config):
+        """Cópia do processador com outra configuração (mesmos serviços compartilhados)."""
+        processor = copy.copy(self)
+        processor.config = config
+        return processor
+    
+    def _notify(self, kind, *args, **kwargs):
+        """
+        Exibe uma mensagem de processamento (kind = 'info', 'warning', 'dataframe', ...),
+        exceto em modo silencioso. Dentro de capture_messages() a mensagem é apenas guardada.
+        """
+        messages = _run_messages.get()
+        if messages is not None:
+            messages.append((kind, args, kwargs))
+        elif self.quiet:
+            return
+        elif self.display is not None:
+            self.display(kind, args, kwargs)
+        elif args and isinstance(args[0], str):
+            level = {'error': logging.ERROR, 'warning': logging.WARNING}.get(kind, logging.INFO)
+            # Do expansor registra-se apenas o título
+            logger.log(level, args[0] if kind == 'expander' else " ".join(str(arg) for arg in args))
+    
+    def show_messages(self, messages):
+        """Exibe as mensagens guardadas de uma execução (ProcessingResult.messages)."""
+        for kind, args, kwargs in messages:
+            self._notify(kind, *args, **kwargs)
+    
+    def apply_rules(self, df):
+        """
+        Executa process_dataframe no pool de processos, quando configurado, e
+        repassa as mensagens geradas no processo de trabalho.
+        """
+        if self.worker_pool is None:
+            return self.process_dataframe(df)
+        processed_df, messages = self.worker_pool.run(self.session_id, "regras", df, self.config)
+        self.show_messages(messages)
+        return processed_df
+    
+    def sync_codigo_descricao(self, df):
+        """
+        Sincroniza CodigoTipoRecebimento e DescricaoTipoRecebimento para garantir consistência.
+        Prioriza o CodigoTipoRecebimento como fonte da verdade.
+        """
+        inconsistencias = []
+        
+        for idx, row in df.iterrows():
+            codigo = row.get('CodigoTipoRecebimento')
+            descricao = row.get('DescricaoTipoRecebimento', '').strip()
+            
+            # Verificar se o código é válido
+            if codigo in self.codigo_descricao_map:
+                descricao_esperada = self.codigo_descricao_map[codigo]
+                
+                # Se a descrição não bate com o código, corrigir
+                if descricao != descricao_esperada:
+                    inconsistencias.append({
+                        'index': idx,
+                        'NomeSingular': row.get('NomeSingular', 'N/A'),
+                        'codigo': codigo,
+                        'descricao_atual': descricao,
+                        'descricao_correta': descricao_esperada
+                    })
+                    
+                    # Corrigir a descrição baseada no código
+                    df.at[idx, 'DescricaoTipoRecebimento'] = descricao_esperada
+            else:
+                # Código inválido - tentar corrigir baseado na descrição
+                if descricao in self.descricao_codigo_map:
+                    codigo_correto = self.descricao_codigo_map[descricao]
+                    inconsistencias.append({
+                        'index': idx,
+                        'NomeSingular': row.get('NomeSingular', 'N/A'),
+                        'codigo': codigo,
+                        'codigo_correto': codigo_correto,
+                        'descricao_atual': descricao
+                    })
+                    
+                    # Corrigir o código baseado na descrição
+                    df.at[idx, 'CodigoTipoRecebimento'] = codigo_correto
+                else:
+                    # Nem código nem descrição são válidos - usar padrão
+                    inconsistencias.append({
+                        'index': idx,
+                        'NomeSingular': row.get('NomeSingular', 'N/A'),
+                        'codigo': codigo,
+                        'descricao_atual': descricao,
+                        'acao': 'Definido como "Outros" (código 6)'
+                    })
+                    
+                    df.at[idx, 'CodigoTipoRecebimento'] = 6
+                    df.at[idx, 'DescricaoTipoRecebimento'] = "Outros"
+        
+        # Reportar inconsistências corrigidas
+        if inconsistencias and not self.quiet:
+            self._notify('warning', f"🔄 **SINCRONIZAÇÃO**: {len(inconsistencias)} inconsistências entre Código e Descrição foram corrigidas automaticamente")
+            
+            detalhes = []
+            for inc in inconsistencias:
+                if 'descricao_correta' in inc:
+                    detalhes.append(f"• **{inc['NomeSingular']}**: Código {inc['codigo']} → Descrição corrigida para '{inc['descricao_correta']}'")
+                elif 'codigo_correto' in inc:
+                    detalhes.append(f"• **{inc['NomeSingular']}**: Descrição '{inc['descricao_atual']}' → Código corrigido para {inc['codigo_correto']}")
+                else:
+                    detalhes.append(f"• **{inc['NomeSingular']}**: {inc['acao']}")
+            self._notify('expander', "Ver detalhes das correções", "\n\n".join(detalhes))
+        
+        return df
+    
+    def calculate_debit(self, row):
+        """Calcula o valor de débito baseado nas condições específicas (None quando nenhuma regra se aplica)."""
+        tipo = row['Tipo']
+        tipo_singular = row['TipoSingular']
+        codigo_tipo_recebimento = row['CodigoTipoRecebimento']
+        nome_singular = str(row['NomeSingular']).upper() if pd.notnull(row['NomeSingular']) else ""
+        descricao = str(row['Descricao']).upper() if pd.notnull(row['Descricao']) else ""
+        
+        # Novas regras para convenção
+        if "CONVENCAO" in descricao or "CONVENÇÃO" in descricao:
+            if tipo == 'A pagar':
+                return 53742
+            elif tipo == 'A receber':
+                return 84679
+
+        # Regras especiais para CodigoTipoRecebimento 5
+        if codigo_tipo_recebimento == 5:
+            if tipo == 'A receber':
+                if "LGPD" in descricao or "ATUARIO" in descricao or "ATUÁRIO" in descricao:
+                    return 84679
+            else:  # A pagar
+                if "LGPD" in descricao:
+                    return 52129
+                elif "ATUARIO" in descricao or "ATUÁRIO" in descricao:
+                    return 52451
+
+        # A pagar
+        if tipo == 'A pagar':
+            if tipo_singular == 'Operadora':
+                if codigo_tipo_recebimento == 1:
+                    return 31731
+                elif codigo_tipo_recebimento == 2:
+                    return 40507
+                elif codigo_tipo_recebimento == 3:
+                    if nome_singular == "UNIODONTO DO BRASIL":
+                        return 52631
+                    else:
+                        return 52632
+                elif codigo_tipo_recebimento == 4:
+                    return 52532
+                elif codigo_tipo_recebimento == 5:
+                    return 51818
+                elif codigo_tipo_recebimento == 6:
+                    return 51202
+            elif tipo_singular == 'Prestadora':
+                if codigo_tipo_recebimento in [1, 2]:
+                    return 40140
+                elif codigo_tipo_recebimento == 3:
+                    if nome_singular == "UNIODONTO DO BRASIL":
+                        return 52631
+                    else:
+                        return 52632
+                elif codigo_tipo_recebimento == 4:
+                    return 52532
+                elif codigo_tipo_recebimento == 5:
+                    return 51818
+                elif codigo_tipo_recebimento == 6:
+                    return 51202
+        # A receber
+        elif tipo == 'A receber':
+            if tipo_singular == 'Operadora':
+                if codigo_tipo_recebimento == 1:
+                    return 19958
+                elif codigo_tipo_recebimento == 2:
+                    return 85433
+                elif codigo_tipo_recebimento in [3, 4, 5]:
+                    return 84679
+                elif codigo_tipo_recebimento == 6:
+                    return 19253
+            elif tipo_singular == 'Prestadora':
+                if codigo_tipo_recebimento == 1:
+                    return 19253
+                elif codigo_tipo_recebimento == 2:
+                    return 19253
+                elif codigo_tipo_recebimento in [3, 4, 5]:
+                    return 84679
+                elif codigo_tipo_recebimento == 6:
+                    return 19253
+        return None
+    
+    def calculate_credit(self, row):
+        """Calcula o valor de crédito baseado nas condições específicas (None quando nenhuma regra se aplica)."""
+        tipo = row['Tipo']
+        tipo_singular = row['TipoSingular']
+        codigo_tipo_recebimento = row['CodigoTipoRecebimento']
+        nome_singular = str(row['NomeSingular']).upper() if pd.notnull(row['NomeSingular']) else ""
+        descricao = str(row['Descricao']).upper() if pd.notnull(row['Descricao']) else ""
+        
+        # Novas regras para convenção
+        if "CONVENCAO" in descricao or "CONVENÇÃO" in descricao:
+            if tipo == 'A pagar':
+                if "PAULISTA" in descricao:
+                    return 22036
+                else:
+                    return 21898
+            elif tipo == 'A receber':
+                if "PAULISTA" in descricao:
+                    return 19265
+                else:
+                    return 11021
+
+        # Regras especiais para CodigoTipoRecebimento 5
+        if codigo_tipo_recebimento == 5:
+            if tipo == 'A receber':
+                if "LGPD" in descricao:
+                    return 30173
+                elif "ATUARIO" in descricao or "ATUÁRIO" in descricao:
+                    return 30088
+            else:  # A pagar
+                if "LGPD" in descricao or "ATUARIO" in descricao or "ATUÁRIO" in descricao:
+                    return 22036
+
+        # A pagar
+        if tipo == 'A pagar':
+            if tipo_singular == 'Operadora':
+                if codigo_tipo_recebimento == 1:
+                    return 90918
+                elif codigo_tipo_recebimento == 2:
+                    return 90919
+                elif codigo_tipo_recebimento == 3:
+                    if nome_singular == "UNIODONTO DO BRASIL":
+                        return 21898
+                    else:
+                        return 22036
+                elif codigo_tipo_recebimento == 4:
+                    if nome_singular == "UNIODONTO DO BRASIL":
+                        return 21898
+                    else:
+                        return 22036
+                elif codigo_tipo_recebimento == 5:
+                    return 51818
+                elif codigo_tipo_recebimento == 6:
+                    return 90919
+            elif tipo_singular == 'Prestadora':
+                if codigo_tipo_recebimento in [1, 2]:
+                    return 92003
+                elif codigo_tipo_recebimento == 3:
+                    if nome_singular == "UNIODONTO DO BRASIL":
+                        return 21898
+                    else:
+                        return 22036
+                elif codigo_tipo_recebimento == 4:
+                    if nome_singular == "UNIODONTO DO BRASIL":
+                        return 21898
+                    else:
+                        return 22036
+                elif codigo_tipo_recebimento == 5:
+                    return 51818
+                elif codigo_tipo_recebimento == 6:
+                    return 90919
+        # A receber
+        elif tipo == 'A receber':
+            if tipo_singular == 'Operadora':
+                if codigo_tipo_recebimento == 1:
+                    return 30203
+                elif codigo_tipo_recebimento == 2:
+                    return 40413
+                elif codigo_tipo_recebimento == 3:
+                    return 30069
+                elif codigo_tipo_recebimento == 4:
+                    return 30071
+                elif codigo_tipo_recebimento == 5:
+                    return 31426
+                elif codigo_tipo_recebimento == 6:
+                    return 30127
+            elif tipo_singular == 'Prestadora':
+                if codigo_tipo_recebimento == 1:
+                    return 30203
+                elif codigo_tipo_recebimento == 2:
+                    return 40413
+                elif codigo_tipo_recebimento == 3:
+                    return 30069
+                elif codigo_tipo_recebimento == 4:
+                    return 30071
+                elif codigo_tipo_recebimento == 5:
+                    return 31426
+                elif codigo_tipo_recebimento == 6:
+                    return 30127
+        return None
+    
+    def calculate_history(self, row):
+        """Calcula o histórico baseado nas condições específicas (None quando nenhuma regra se aplica)."""
+        tipo = row['Tipo']
+        tipo_singular = row['TipoSingular']
+        codigo_tipo_recebimento = row['CodigoTipoRecebimento']
+        nome_singular = str(row['NomeSingular']).upper() if pd.notnull(row['NomeSingular']) else ""
+        descricao = str(row['Descricao']).upper() if pd.notnull(row['Descricao']) else ""
+        
+        # Novas regras para convenção
+        if "CONVENCAO" in descricao or "CONVENÇÃO" in descricao:
+            if tipo == 'A pagar':
+                return 2005
+            elif tipo == 'A receber':
+                return 1021
+
+        # Regras especiais para CodigoTipoRecebimento 5
+        if codigo_tipo_recebimento == 5:
+            if tipo == 'A receber':
+                if "LGPD" in descricao or "ATUARIO" in descricao or "ATUÁRIO" in descricao:
+                    return 1021
+            else:  # A pagar
+                if "LGPD" in descricao or "ATUARIO" in descricao or "ATUÁRIO" in descricao:
+                    return 2005
+
+        # A pagar
+        if tipo == 'A pagar':
+            if codigo_tipo_recebimento in [1, 2, 6]:
+                return 2005
+            elif codigo_tipo_recebimento == 3:
+                if nome_singular == "UNIODONTO DO BRASIL":
+                    return 361
+                else:
+                    return 368
+            elif codigo_tipo_recebimento == 4:
+                return 365
+            elif codigo_tipo_recebimento == 5:
+                return 179
+        # A receber
+        elif tipo == 'A receber':
+            if codigo_tipo_recebimento in [1, 2, 6]:
+                return 1021
+            elif codigo_tipo_recebimento == 3:
+                return 33
+            elif codigo_tipo_recebimento == 4:
+                return 228
+            elif codigo_tipo_recebimento == 5:
+                return 30
+        return None
+    
+    def normalize_cents(self, value):
+        """
+        Converte um valor monetário para centavos (int), sem passar por float.
+        
+        Aceita números e textos nos formatos brasileiro ("1.234,56") e americano ("1,234.56").
+        Valores vazios ou inválidos retornam 0.
+        """
+        if value is None or value is pd.NA or (isinstance(value, str) and value == ''):
+            return 0
+        
+        if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+            return int(value) * 100
+        
+        if isinstance(value, (float, np.floating)):
+            if pd.isna(value):
+                return 0
+            return self._decimal_to_cents(Decimal(repr(float(value))))
+        
+        # Converter para string para processamento
+        value_str = str(value).strip()
+        
+        # Se o valor está vazio após strip
+        if not value_str or value_str.lower() == 'nan':
+            return 0
+            
+        # Detectar formato monetário brasileiro (com vírgula como decimal)
+        # Ex: "1.234,56" ou "234,56" ou "1234,56"
+        if ',' in value_str and value_str.count(',') == 1:
+            # Verificar se é formato brasileiro (vírgula decimal)
+            partes = value_str.split(',')
+            if len(partes) == 2 and len(partes[1]) <= 2 and partes[1].isdigit():
+                # É formato brasileiro (vírgula decimal)
+                parte_inteira = re.sub(r'[^\d]', '', partes[0])  # Remove pontos de milhares
+                parte_decimal = partes[1].ljust(2, '0')
+                if parte_inteira == '':
+                    parte_inteira = '0'
+                return int(parte_inteira) * 100 + int(parte_decimal)
+        
+        # Para outros casos, remover caracteres não numéricos exceto ponto e vírgula
+        value_str = re.sub(r'[^\d.,]', '', value_str)
+        
+        # Se não há dígitos, retornar 0
+        if not re.search(r'\d', value_str):
+            return 0
+        
+        # Detectar se é valor em formato americano (ponto como decimal)
+        if '.' in value_str and ',' in value_str:
+            # Formato com separadores de milhares e decimal
+            # Ex: "1,234.56" (americano) ou "1.234,56" (brasileiro)
+            if value_str.rfind('.') > value_str.rfind(','):
+                # Ponto vem depois da vírgula = formato americano
+                value_str = value_str.replace(',', '')  # Remove separador de milhares
+            else:
+                # Vírgula vem depois do ponto = formato brasileiro
+                value_str = value_str.replace('.', '')  # Remove separador de milhares
+                value_str = value_str.replace(',', '.')  # Converte decimal
+        elif ',' in value_str:
+            # Apenas vírgula - assumir como decimal brasileiro
+            value_str = value_str.replace(",", ".")
+        try:
+            return self._decimal_to_cents(Decimal(value_str))
+        except InvalidOperation:
+            return 0
+    
+    @staticmethod
+    def _decimal_to_cents(amount):
+        """Converte um Decimal em reais para centavos, arredondando meio centavo para cima."""
+        return int((amount * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    
+    def normalize_cents_series(self, series):
+        """Versão vetorizada de normalize_cents: converte cada valor distinto uma única vez."""
+        values = series.astype(object).where(series.notna(), '')
+        mapping = {value: self.normalize_cents(value) for value in pd.unique(values)}
+        return values.map(mapping).astype('int64')
+    
+    def normalize_value(self, value):
+        """Normaliza um valor monetário para reais (float). Prefira normalize_cents para somas."""
+        return self.normalize_cents(value) / 100
+    
+    def process_dataframe(self, df):
+        """Processa o dataframe conforme as regras estabelecidas."""
+        # Verifica se o DataFrame tem as colunas necessárias
+        required_columns = [
+            'Tipo', 'CodigoSingular', 'NomeSingular', 'TipoSingular', 
+            'CodigoTipoRecebimento', 'DescricaoTipoRecebimento', 
+            'ValorBruto', 'IRRF', 'Descricao'
+        ]
+        
+        missing_columns = [col for col in required_columns if col not in df.columns]
+        if missing_columns:
+            self._notify('error', f"Colunas ausentes no arquivo: {', '.join(missing_columns)}")
+            return None
+
+        # PROTEÇÃO: Criar backup dos valores originais do CodigoTipoRecebimento
+        original_codigo_tipo = df['CodigoTipoRecebimento'].copy()
+        
+        self._notify('info', "🔒 **PROTEÇÃO ATIVADA**: Valores originais de CodigoTipoRecebimento foram preservados")
+
+        # Converte CodigoTipoRecebimento para inteiro
+        try:
+            df['CodigoTipoRecebimento'] = pd.to_numeric(df['CodigoTipoRecebimento'], errors='coerce').fillna(6).astype(int)
+            
+            # VERIFICAÇÃO: Comparar se houve alterações não autorizadas
+            try:
+                original_codigo_int = pd.to_numeric(original_codigo_tipo, errors='coerce').fillna(6).astype(int)
+                if not df['CodigoTipoRecebimento'].equals(original_codigo_int):
+                    alteracoes = df[df['CodigoTipoRecebimento'] != original_codigo_int]
+                    if len(alteracoes) > 0:
+                        self._notify('warning', f"⚠️ **ATENÇÃO**: {len(alteracoes)} registros tiveram CodigoTipoRecebimento alterado durante a conversão numérica!")
+                        self._notify('write', "Registros afetados:")
+                        self._notify('dataframe', alteracoes[['NomeSingular', 'Descricao', 'CodigoTipoRecebimento']])
+            except Exception as e:
+                self._notify('info', f"Aviso na verificação de alterações: {str(e)}")
+                    
+        except Exception as e:
+            self._notify('warning', f"Aviso ao converter CodigoTipoRecebimento: {str(e)}. Tentando continuar o processamento.")
+
+        # SINCRONIZAÇÃO: Garantir consistência entre Código e Descrição
+        df = self.sync_codigo_descricao(df)
+
+        # Aplica as funções para criar as colunas necessárias
+        df['Debito'] = df.apply(self.calculate_debit, axis=1)
+        df['Credito'] = df.apply(self.calculate_credit, axis=1)
+        df['Historico'] = df.apply(self.calculate_history, axis=1)
+        
+        # Adiciona a coluna DATA com o último dia do mês anterior
+        df['DATA'] = self.last_day_of_previous_month
+        
+        # Adiciona a coluna valor (em centavos) com os dados de ValorBruto.
+        # Valores fora do padrão não são corrigidos aqui: detect_value_anomalies os
+        # compara com o histórico e os envia para revisão
+        df['valor'] = self.normalize_cents_series(df['ValorBruto'])
+        
+        # Cria a coluna complemento com o formato especificado + tipo
+        df['complemento'] = (df['NomeSingular'].fillna('') + " | " + 
+                           df['DescricaoTipoRecebimento'].fillna('') + " | " + 
+                           df['Descricao'].fillna('') + " | " + 
+                           df['Tipo'].fillna(''))
+        
+        # AJUSTE PROVISÓRIO: Verificação de inconsistências na conciliação da câmara
+        # Quando CodigoTipoRecebimento = 2, DescricaoTipoRecebimento = "Repasse em Custo Operacional"
+        # e Descrição contém "Mensalidade" ou "Mensalidades"
+        # IMPORTANTE: Esta regra NÃO altera o CodigoTipoRecebimento, apenas marca como inconsistente
+        def verificar_inconsistencia(row):
+            if (row['CodigoTipoRecebimento'] == 2 and 
+                str(row['DescricaoTipoRecebimento']).strip() == 'Repasse em Custo Operacional' and
+                ('mensalidade' in str(row['Descricao']).lower() or 'mensalidades' in str(row['Descricao']).lower())):
+                return "*** Lançamento Inconsistente, verifique | " + str(row['complemento'])
+            else:
+                return row['complemento']
+        
+        # Aplicar a verificação de inconsistência
+        df['complemento'] = df.apply(verificar_inconsistencia, axis=1)
+        
+        # VERIFICAÇÃO FINAL: Garantir que CodigoTipoRecebimento não foi alterado
+        try:
+            final_codigo_tipo = df['CodigoTipoRecebimento'].copy()
+            original_codigo_int = pd.to_numeric(original_codigo_tipo, errors='coerce').fillna(6).astype(int)
+            
+            if not final_codigo_tipo.equals(original_codigo_int):
+                alteracoes_finais = df[df['CodigoTipoRecebimento'] != original_codigo_int]
+                if len(alteracoes_finais) > 0:
+                    self._notify('error', f"🚨 **ERRO CRÍTICO**: {len(alteracoes_finais)} registros tiveram CodigoTipoRecebimento alterado sem autorização!")
+                    self._notify('write', "**Registros com alterações não autorizadas:**")
+                    for idx, row in alteracoes_finais.iterrows():
+                        original_val = original_codigo_int.iloc[idx]
+                        new_val = row['CodigoTipoRecebimento']
+                        self._notify('write', f"- {row['NomeSingular']}: {original_val} → {new_val} (Descrição: {row['Descricao']})")
+                    
+                    # Restaurar valores originais
+                    df['CodigoTipoRecebimento'] = original_codigo_int
+                    self._notify('success', "✅ **VALORES RESTAURADOS**: CodigoTipoRecebimento foi restaurado aos valores originais")
+        except Exception as e:
+            self._notify('info', f"Aviso na verificação final: {str(e)}")
+        
+        # Cria o DataFrame para exportação
+        df_export = df[['Debito', 'Credito', 'Historico', 'DATA', 'valor', 'complemento']].copy()
+        
+        # Adiciona registros baseados na condição IRRF
+        irrf_rows = []
+        for index, row in df.iterrows():
+            irrf_value = self.normalize_cents(row['IRRF'])
+            if irrf_value > 0:
+                if row['Tipo'] == 'A pagar':
+                    debito_irrf = df_export.iloc[index]['Credito']
+                    credito_irrf = 23476
+                    historico_irrf = 2341
+                elif row['Tipo'] == 'A receber':
+                    debito_irrf = 15456
+                    credito_irrf = df_export.iloc[index]['Debito']
+                    historico_irrf = 22
+                
+                irrf_rows.append({
+                    'Debito': debito_irrf,
+                    'Credito': credito_irrf,
+                    'Historico': historico_irrf,
+                    'DATA': self.last_day_of_previous_month,
+                    'valor': irrf_value,
+                    'complemento': (str(row['NomeSingular']) if pd.notnull(row['NomeSingular']) else '') + 
+                                 " | " + (str(row['DescricaoTipoRecebimento']) if pd.notnull(row['DescricaoTipoRecebimento']) else '') +
+                                 " | " + (str(row['Descricao']) if pd.notnull(row['Descricao']) else '') + 
+                                 " | " + (str(row['Tipo']) if pd.notnull(row['Tipo']) else '') + " | IRRF"
+                })
+        
+        # Adiciona as linhas de IRRF ao DataFrame de exportação
+        if irrf_rows:
+            df_export = pd.concat([df_export, pd.DataFrame(irrf_rows)], ignore_index=True)
+        
+        # Preservar também as colunas originais para filtros
+        if 'TipoSingular' in df.columns:
+            df_export['TipoSingular'] = df['TipoSingular']
+        if 'CodigoTipoRecebimento' in df.columns:
+            df_export['CodigoTipoRecebimento'] = df['CodigoTipoRecebimento']
+        if 'Tipo' in df.columns:
+            df_export['Tipo'] = df['Tipo']
+        if 'CodigoSingular' in df.columns:
+            df_export['CodigoSingular'] = df['CodigoSingular']
+        if 'NomeSingular' in df.columns:
+            df_export['NomeSingular'] = df['NomeSingular']
+        if 'DescricaoTipoRecebimento' in df.columns:
+            df_export['DescricaoTipoRecebimento'] = df['DescricaoTipoRecebimento']
+        if 'Descricao' in df.columns:
+            df_export['Descricao'] = df['Descricao']
+        if 'ValorBruto' in df.columns:
+            df_export['ValorBruto'] = df['ValorBruto']
+        if 'IRRF' in df.columns:
+            df_export['IRRF'] = df['IRRF']
+        if 'NumeroDocumento' in df.columns:
+            df_export['NumeroDocumento'] = df['NumeroDocumento']
+        
+        # Tipos compactos; a DATA só é formatada (dd/mm/yyyy) na exportação
+        return apply_processed_schema(df_export)
+    
+    def create_download_link(self, df, filename):
+        """Cria um link para download do DataFrame como CSV."""
+        csv_string = self.df_to_csv_string(df)
+        b64 = base64.b64encode(csv_string.encode('utf-8')).decode()
+        href = f'<a href="data:file/csv;base64,{b64}" download="{filename}" class="download-button">Baixar {filename}</a>'
+        return href
+    
+    def df_to_csv_string(self, df):
+        """Converte DataFrame para string CSV no formato brasileiro."""
+        csv_buffer = io.StringIO()
+        
+        # Cria uma cópia do dataframe para exportação
+        export_df = df.copy()
+        
+        # Para arquivos contábeis, filtrar apenas as 6 colunas específicas
+        if all(col in export_df.columns for col in ['Debito', 'Credito', 'Historico', 'DATA', 'valor', 'complemento']):
+            # Arquivo contábil: apenas as 6 colunas específicas
+            export_df = export_df[['Debito', 'Credito', 'Historico', 'DATA', 'valor', 'complemento']].copy()
+            
+            # Renomear DATA para data
+            export_df = export_df.rename(columns={'DATA': 'data'})
+            
+            # Recriar o campo complemento com dados atualizados
+            if all(col in df.columns for col in ['NomeSingular', 'DescricaoTipoRecebimento', 'Descricao']):
+                # Verificar se existe flag de IRRF no complemento
+                irrf_mask = export_df['complemento'].str.contains('IRRF', na=False)
+                
+                # Para registros normais, recriar o complemento
+                normal_mask = ~irrf_mask
+                if normal_mask.any():
+                    # Mapear os índices corretos (posição no DataFrame original)
+                    labels = export_df.index[normal_mask]
+                    labels = labels[labels < len(df)]
+                    originals = df.iloc[labels]
+                    
+                    def as_text(column):
+                        if column not in originals.columns:
+                            return pd.Series('', index=originals.index)
+                        values = originals[column]
+                        return values.astype(object).where(values.notna(), '').astype(str)
+                    
+                    desc_tipo = as_text('DescricaoTipoRecebimento')
+                    desc = as_text('Descricao')
+                    complemento = as_text('NomeSingular') + ' | ' + desc_tipo + ' | ' + desc + ' | ' + as_text('Tipo')
+                    
+                    # Verificar inconsistências
+                    if 'CodigoTipoRecebimento' in originals.columns:
+                        inconsistente = (
+                            (originals['CodigoTipoRecebimento'] == 2).fillna(False).astype(bool) &
+                            (desc_tipo.str.strip() == 'Repasse em Custo Operacional') &
+                            desc.str.lower().str.contains('mensalidade', regex=False)
+                        )
+                        complemento = complemento.where(~inconsistente, '*** Lançamento Inconsistente, verifique | ' + complemento)
+                    
+                    export_df.loc[labels, 'complemento'] = complemento.to_numpy()
+        else:
+            # Arquivo original: remover apenas colunas extras de controle
+            if 'TipoSingular' in export_df.columns:
+                export_df = export_df.drop(['TipoSingular', 'CodigoTipoRecebimento', 'Tipo'], axis=1, errors='ignore')
+        
+        # Escreve o cabeçalho
+        csv_buffer.write(';'.join(export_df.columns) + '\n')
+        
+        # Escreve as linhas sem aspas (formatação vetorizada coluna a coluna)
+        if len(export_df):
+            formatted = [self._format_export_column(col, export_df[col]) for col in export_df.columns]
+            lines = formatted[0]
+            for column_values in formatted[1:]:
+                lines = lines + ';' + column_values
+            csv_buffer.write('\n'.join(lines.tolist()) + '\n')
+        
+        return csv_buffer.getvalue()
+    
+    def iter_csv_chunks(self, df, chunk_rows=None):
+        """Gera o CSV de df_to_csv_string em blocos de linhas (cabeçalho só no primeiro)."""
+        chunk_rows = chunk_rows or STREAM_CHUNK_ROWS
+        for start in range(0, max(len(df), 1), chunk_rows):
+            csv_string = self.df_to_csv_string(df.iloc[start:start + chunk_rows].reset_index(drop=True))
+            yield csv_string if start == 0 else csv_string.split('\n', 1)[1]
+    
+    def write_csv(self, df, path):
+        """Grava em path o CSV de df_to_csv_string, em blocos (ver iter_csv_chunks)."""
+        with open(path, 'w', encoding='utf-8', newline='') as output:
+            for chunk in self.iter_csv_chunks(df):
+                output.write(chunk)
+        return path
+    
+    def _format_export_column(self, col, series):
+        """Formata uma coluna para o CSV brasileiro (vírgula decimal, datas dd/mm/yyyy, contas sem <NA>)."""
+        if col in ['Debito', 'Credito', 'Historico']:
+            return series.astype('string').fillna('').astype(str)
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series.dt.strftime('%d/%m/%Y').fillna('')
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            if col == 'valor':
+                return format_cents_series(series)
+            return series.astype(str).str.replace('.', ',', regex=False)
+        return series.astype(str)
+    
+    def create_default_columns(self, df):
+        """Cria colunas padrão quando estão ausentes."""
+        # Colunas obrigatórias com valores padrão
+        default_values = {
+            'Tipo': 'A receber',  # Valor padrão
+            'CodigoSingular': 0,
+            'NomeSingular': 'Não informado',
+            'TipoSingular': 'Operadora',  # Valor padrão mais comum
+            'CodigoTipoRecebimento': 6,  # Outras
+            'DescricaoTipoRecebimento': 'Outras',
+            'ValorBruto': 0.0,
+            'IRRF': 0.0,
+            'Descricao': 'Importado automaticamente'
+        }
+        
+        # Adicionar colunas ausentes com valores padrão
+        for col, default_val in default_values.items():
+            if col not in df.columns:
+                df[col] = default_val
+                self._notify('warning', f"⚠️ Coluna '{col}' não encontrada. Usando valor padrão: {default_val}")
+        
+        return df
+    
+    # Apelidos de colunas da Câmara: nome no arquivo -> (coluna esperada, prioridade)
+    POSSIBLE_MAPPINGS = {
+        'Tipo': ['tipo', 'Type', 'TIPO'],
+        'CodigoSingular': ['codigo_singular', 'codigo singular', 'CodSingular', 'CODIGO_SINGULAR'],
+        'NomeSingular': ['nome_singular', 'nome singular', 'NomeSing', 'NOME_SINGULAR', 'Nome'],
+        'TipoSingular': ['tipo_singular', 'tipo singular', 'TipoSing', 'TIPO_SINGULAR'],
+        'CodigoTipoRecebimento': ['codigo_tipo_recebimento', 'cod_tipo_receb', 'CodTipoReceb', 'CODIGO_TIPO_RECEBIMENTO'],
+        'DescricaoTipoRecebimento': ['descricao_tipo_recebimento', 'desc_tipo_receb', 'DescTipoReceb', 'DESCRICAO_TIPO_RECEBIMENTO'],
+        'ValorBruto': ['valor_bruto', 'valor bruto', 'Valor', 'VALOR_BRUTO', 'ValorTotal'],
+        'IRRF': ['irrf', 'ir', 'IR', 'ImpostoRenda'],
+        'Descricao': ['descricao', 'desc', 'Desc', 'DESCRICAO', 'Observacao']
+    }
+    COLUMN_ALIASES = {
+        name: (expected_col, priority)
+        for expected_col, names in POSSIBLE_MAPPINGS.items()
+        for priority, name in enumerate(names)
+    }
+    
+    def detect_simplified_format(self, df):
+        """Detecta formato simplificado de relatório financeiro."""
+        available_columns = df.columns.tolist()
+        
+        # Verificar se é o formato simplificado (com colunas como Vencimento, Código, Nome, etc.)
+        simplified_indicators = [
+            'Vencimento' in available_columns,
+            'Código' in available_columns,
+            'Nome' in available_columns,
+            'Tipo' in available_columns,
+            any('Valor a Receber' in col or 'Valor a Pagar' in col for col in available_columns)
+        ]
+        
+        if sum(simplified_indicators) >= 4:
+            return self.convert_simplified_format(df)
+        
+        return None, "Não é formato simplificado"
+    
+    def convert_simplified_format(self, df):
+        """Converte o relatório simplificado da federação para o formato da Câmara."""
+        available_columns = df.columns.tolist()
+        self._notify('info', "📋 **Formato Simplificado Detectado**")
+        self._notify('info', "Este arquivo parece ser um relatório financeiro simplificado. Convertendo para o formato da Câmara de Compensação...")
+        
+        # Criar DataFrame mapeado para o formato da Câmara
+        df_mapped = df.copy()
+        
+        # Mapeamentos básicos
+        column_mapping = {}
+        if 'Nome' in available_columns:
+            column_mapping['Nome'] = 'NomeSingular'
+        if 'Código' in available_columns:
+            column_mapping['Código'] = 'CodigoSingular'
+        if 'Tipo' in available_columns:
+            column_mapping['Tipo'] = 'Tipo'
+        
+        # Aplicar mapeamentos
+        df_mapped = df_mapped.rename(columns=column_mapping)
+        
+        # Criar colunas padrão necessárias
+        default_values = {
+            'TipoSingular': 'Operadora',
+            'CodigoTipoRecebimento': 6,  # Outras
+            'DescricaoTipoRecebimento': 'Outras',
+            'IRRF': 0.0,
+            'Descricao': 'Importado de relatório simplificado'
+        }
+        
+        for col, default_val in default_values.items():
+            if col not in df_mapped.columns:
+                df_mapped[col] = default_val
+        
+        # Um lançamento A receber e/ou um A pagar por linha, conforme os valores preenchidos
+        if 'Valor a Receber' in available_columns and 'Valor a Pagar' in available_columns:
+            a_receber = self.normalize_cents_series(df['Valor a Receber']).to_numpy()
+            a_pagar = self.normalize_cents_series(df['Valor a Pagar']).to_numpy()
+            df_mapped['LinhaArquivo'] = np.arange(len(df_mapped))
+            
+            # Linhas sem valor nos dois lados continuam gerando um lançamento A pagar zerado
+            receber_rows = df_mapped[a_receber > 0].assign(Tipo='A receber', ValorBruto=a_receber[a_receber > 0] / 100)
+            pagar_mask = (a_pagar > 0) | (a_receber <= 0)
+            pagar_rows = df_mapped[pagar_mask].assign(Tipo='A pagar', ValorBruto=a_pagar[pagar_mask] / 100)
+            
+            df_mapped = (pd.concat([receber_rows, pagar_rows])
+                         .sort_values('LinhaArquivo', kind='stable')
+                         .reset_index(drop=True))
+            
+            ambos = int(((a_receber > 0) & (a_pagar > 0)).sum())
+            if ambos:
+                self._notify('info', f"ℹ️ {ambos} singular(es) com valores a receber e a pagar: os dois lançamentos foram gerados")
+        
+        return df_mapped, "✅ Formato simplificado convertido para Câmara de Compensação"
+    
+    def detect_csv_format(self, df):
+        """Detecta o formato do CSV e tenta mapear as colunas."""
+        # Colunas esperadas pelo sistema
+        expected_columns = [
+            'Tipo', 'CodigoSingular', 'NomeSingular', 'TipoSingular', 
+            'CodigoTipoRecebimento', 'DescricaoTipoRecebimento', 
+            'ValorBruto', 'IRRF', 'Descricao'
+        ]
+        
+        # Verificar se já está no formato correto
+        if set(expected_columns).issubset(df.columns):
+            return df, "Formato padrão da Câmara de Compensação detectado"
+        
+        # Colunas disponíveis no arquivo
+        available_columns = df.columns.tolist()
+        
+        # Layout já conhecido pela assinatura do cabeçalho (uma consulta por arquivo)
+        registry = self.layout_registry or default_layout_registry()
+        layout = registry.lookup(available_columns)
+        if layout is not None:
+            if layout["kind"] == "simplificado":
+                return self.convert_simplified_format(df)
+            column_mapping = registry.renames(layout, available_columns)
+            df_mapped = df.rename(columns=column_mapping)
+            missing_after_mapping = [col for col in expected_columns if col not in df_mapped.columns]
+            if missing_after_mapping:
+                df_mapped = self.create_default_columns(df_mapped)
+            if layout["kind"] == "padrao":
+                return df_mapped, "Formato padrão da Câmara de Compensação detectado"
+            return df_mapped, f"✅ Mapeamento aplicado (layout \"{layout['name']}\"): {column_mapping}"
+        
+        # Depois, tentar detectar formato simplificado
+        simplified_result, simplified_message = self.detect_simplified_format(df)
+        if simplified_result is not None:
+            return simplified_result, simplified_message
+        
+        # Verificar se é um arquivo da Câmara de Compensação válido
+        # Deve ter pelo menos algumas colunas essenciais
+        header_text = '\x1f'.join(str(col) for col in available_columns).lower()
+        essential_indicators = [keyword in header_text for keyword in ('tipo', 'singular', 'valor', 'recebimento')]
+        
+        # Se não tem pelo menos 2 indicadores essenciais, não é arquivo da Câmara
+        if sum(essential_indicators) < 2:
+            return None, f"""
+            ❌ ARQUIVO NÃO COMPATÍVEL COM CÂMARA DE COMPENSAÇÃO
+            
+            Este arquivo não parece ser um CSV da Câmara de Compensação Uniodonto.
+            
+            📋 Formato esperado deve conter colunas como:
+            • Tipo (A pagar/A receber)
+            • NomeSingular (Nome da cooperativa)
+            • CodigoTipoRecebimento (1-6)
+            • ValorBruto (Valor da transação)
+            • IRRF (Imposto retido)
+            
+            📁 Colunas encontradas no seu arquivo:
+            {', '.join(available_columns)}
+            
+            💡 Verifique se está usando o arquivo correto da Câmara de Compensação.
+            """
+        
+        # Tentar mapear colunas similares: uma passada pelas colunas na tabela de apelidos;
+        # para cada coluna esperada vale o apelido de menor prioridade presente
+        best = {}
+        for column in available_columns:
+            alias = self.COLUMN_ALIASES.get(column)
+            if alias is not None and (alias[0] not in best or alias[1] < best[alias[0]][1]):
+                best[alias[0]] = (column, alias[1])
+        column_mapping = {column: expected_col for expected_col, (column, _) in best.items()}
+        
+        # Se encontrou mapeamentos suficientes, aplicar
+        if len(column_mapping) >= 5:  # Pelo menos 5 colunas mapeadas
+            df_mapped = df.rename(columns=column_mapping)
+            
+            # Verificar se ainda faltam colunas após o mapeamento
+            missing_after_mapping = [col for col in expected_columns if col not in df_mapped.columns]
+            
+            if len(missing_after_mapping) > 3:
+                return None, f"❌ Muitas colunas ausentes após mapeamento: {', '.join(missing_after_mapping)}"
+            
+            # Aprender o layout: os próximos arquivos com este cabeçalho vão direto pela assinatura
+            registry.register(f"Aprendido: {', '.join(map(str, available_columns))[:80]}", available_columns,
+                              column_mapping, origem="aprendido")
+            
+            if missing_after_mapping:
+                # Só criar colunas padrão se for um número pequeno de colunas ausentes
+                df_mapped = self.create_default_columns(df_mapped)
+                return df_mapped, f"✅ Mapeamento aplicado: {column_mapping}. Colunas padrão criadas para: {', '.join(missing_after_mapping)}"
+            
+            return df_mapped, f"✅ Mapeamento aplicado com sucesso: {column_mapping}"
+        
+        # Se não conseguiu mapear suficientemente, retornar erro detalhado
+        return None, f"""
+        ❌ FORMATO NÃO RECONHECIDO
+        
+        Não foi possível mapear as colunas automaticamente.
+        
+        📁 Colunas disponíveis no arquivo:
+        {', '.join(available_columns)}
+        
+        📋 Colunas esperadas pela Câmara de Compensação:
+        {', '.join(expected_columns)}
+        
+        💡 Verifique se o arquivo está no formato correto, renomeie as colunas ou registre o layout em "Registrar layout de arquivo".
+        """
+    
+    def read_csv_source(self, source):
+        """Lê um CSV testando as combinações de encoding e separador usadas pela Câmara."""
+        # Lista de encodings para tentar
+        encodings = ['utf-8', 'latin1', 'iso-8859-1', 'windows-1252', 'cp1252']
+        separators = [';', ',']
+        
+        # Tenta diferentes combinações de encoding e separador
+        for encoding in encodings:
+            for sep in separators:
+                try:
+                    source.seek(0)  # Volta ao início do arquivo
+                    return pd.read_csv(source, sep=sep, encoding=encoding)
+                except:
+                    continue
+        
+        # Se nenhuma combinação funcionou, tenta detectar o separador
+        source.seek(0)
+        sample = source.read(1024).decode('utf-8', errors='ignore')
+        sep = ',' if ',' in sample and ';' not in sample else ';'
+        source.seek(0)
+        return pd.read_csv(source, sep=sep, encoding='utf-8', on_bad_lines='skip')
+    
+    def process_file(self, source, name=None):
+        """
+        Processa um arquivo CSV (objeto de arquivo ou caminho) e retorna um ProcessingResult.
+        
+        Não altera o processador nem escreve na interface: as mensagens ficam em
+        result.messages (ver show_messages), o que permite executar várias chamadas
+        em paralelo com o mesmo processador.
+        """
+        if not hasattr(source, 'read'):
+            name = name or os.path.basename(os.fspath(source))
+        name = name or getattr(source, 'name', 'arquivo')
+        result = ProcessingResult(source=name, config=self.config)
+        started = clock = time.perf_counter()
+        
+        def lap(stage):
+            nonlocal clock
+            now = time.perf_counter()
+            result.timings[stage] = round(now - clock, 4)
+            clock = now
+        
+        with capture_messages() as messages:
+            try:
+                if self.config.rules_version != RULES_VERSION:
+                    raise ValueError(f"Versão de regras {self.config.rules_version} indisponível (atual: {RULES_VERSION})")
+                if not hasattr(source, 'read'):
+                    with open(source, 'rb') as f:
+                        source = io.BytesIO(f.read())
+                df = self.read_csv_source(source)
+                lap('leitura')
+                
+                # Processa o DataFrame
+                mapped_df, mapping_info = self.detect_csv_format(df)
+                result.mapping_info = mapping_info
+                lap('mapeamento')
+                if mapped_df is None:
+                    # Erro no mapeamento
+                    result.error = mapping_info
+                    self._notify('error', f"❌ {mapping_info}")
+                else:
+                    # Exibir informação sobre o mapeamento
+                    if "Mapeamento aplicado" in mapping_info:
+                        self._notify('info', f"✅ {mapping_info}")
+                    elif "Formato padrão" in mapping_info:
+                        self._notify('success', f"✅ {mapping_info}")
+                    
+                    # Processar o DataFrame mapeado
+                    processed_df = self.apply_rules(mapped_df)
+                    lap('regras')
+                    if processed_df is None:
+                        result.error = "Falha ao aplicar as regras contábeis"
+                    else:
+                        # Validar as partidas dobradas antes de liberar o arquivo
+                        violations = self.validate_entries(processed_df)
+                        result.violations = violations
+                        if len(violations):
+                            self._notify('warning', f"⚠️ {len(violations)} violação(ões) de partidas dobradas em {name}")
+                        self.enforce_error_budget(violations, source=name)
+                        lap('validacao')
+                        
+                        # Valores atípicos frente ao histórico: apenas para revisão
+                        anomalies = self.review_value_anomalies(processed_df, name)
+                        result.anomalies = anomalies
+                        if anomalies is not None and len(anomalies):
+                            self._notify('warning', f"🔎 {len(anomalies)} valor(es) atípico(s) frente ao histórico em {name}")
+                        lap('anomalias')
+                        
+                        result.processed = processed_df
+                        result.mapped = mapped_df  # Retorna também o DataFrame original mapeado
+            except EntryValidationError as e:
+                result.error = str(e)
+                self._notify('error', f"❌ Processamento interrompido: {str(e)}")
+            except Exception as e:
+                result.error = str(e)
+                self._notify('error', f"Erro ao processar o arquivo {name}: {str(e)}")
+        
+        result.messages = messages
+        result.timings['total'] = round(time.perf_counter() - started, 4)
+        return result
+    
+    def _sniff_csv(self, uploaded_file, sample_size=65536):
+        """Detecta encoding e separador a partir de uma amostra, na mesma ordem de read_csv_source."""
+        uploaded_file.seek(0)
+        sample = uploaded_file.read(sample_size)
+        uploaded_file.seek(0)
+        if isinstance(sample, str):
+            sample = sample.encode('utf-8')
+        # Descartar a última linha (possivelmente incompleta) da amostra
+        if len(sample) == sample_size and b'\n' in sample:
+            sample = sample[:sample.rindex(b'\n') + 1]
+        
+        for encoding in ['utf-8', 'latin1', 'iso-8859-1', 'windows-1252', 'cp1252']:
+            for sep in [';', ',']:
+                try:
+                    pd.read_csv(io.BytesIO(sample), sep=sep, encoding=encoding)
+                    return encoding, sep
+                except Exception:
+                    continue
+        
+        text = sample.decode('utf-8', errors='ignore')
+        return 'utf-8', (',' if ',' in text and ';' not in text else ';')
+    
+    def process_csv_stream(self, uploaded_file, output, chunksize=None, progress_callback=None, chunk_callback=None):
+        """
+        Processa um CSV em blocos, gravando o arquivo contábil diretamente em `output`.
+        Apenas um bloco fica em memória por vez; retorna um ProcessingResult com os totais
+        acumulados (centavos) em `totals` e os valores atípicos frente ao histórico em
+        `anomalies` (linha = posição na saída), ou com `error` se o formato não for
+        reconhecido. chunk_callback, se informado, recebe o DataFrame processado de cada
+        bloco (ex.: gravação no livro de lançamentos).
+        """
+        chunksize = chunksize or STREAM_CHUNK_ROWS
+        name = getattr(uploaded_file, 'name', 'arquivo')
+        result = ProcessingResult(source=name, config=self.config)
+        started = time.perf_counter()
+        
+        totals = {
+            'linhas_lidas': 0,
+            'registros': 0,
+            'lancamentos_irrf': 0,
+            'blocos': 0,
+            'violacoes': 0,
+            'atipicos': 0,
+        }
+        violations = []
+        anomalies = []
+        with capture_messages() as messages:
+            try:
+                # Linhas de base do histórico calculadas uma vez (os singulares do arquivo só
+                # são conhecidos ao final, então o histórico vem completo)
+                baselines = None
+                if self.history_source is not None:
+                    baselines = self.value_baselines(self.history_source(exclude_arquivo=name))
+                
+                encoding, sep = self._sniff_csv(uploaded_file)
+                reader = pd.read_csv(uploaded_file, sep=sep, encoding=encoding,
+                                     encoding_errors='replace', chunksize=chunksize)
+                for chunk in reader:
+                    chunk = chunk.reset_index(drop=True)
+                    # Avisos da sincronização são exibidos só para o primeiro bloco
+                    with capture_messages() if totals['blocos'] else nullcontext():
+                        mapped_df, mapping_info = self.detect_csv_format(chunk)
+                        if mapped_df is None:
+                            if totals['blocos'] == 0:
+                                result.mapping_info = result.error = mapping_info
+                                self._notify('error', f"❌ {mapping_info}")
+                                break
+                            continue
+                        
+                        processed_df = self.apply_rules(mapped_df)
+                    if processed_df is None:
+                        continue
+                    
+                    # Violações acumuladas do arquivo (linha = posição na saída); interrompe ao exceder o orçamento
+                    chunk_violations = self.validate_entries(processed_df)
+                    chunk_violations['linha'] += totals['registros']
+                    violations.append(chunk_violations)
+                    totals['violacoes'] += len(chunk_violations)
+                    if self.error_budget is not None and totals['violacoes'] > self.error_budget:
+                        self.enforce_error_budget(pd.concat(violations, ignore_index=True), source=name)
+                    
+                    # Valores atípicos frente ao histórico: apenas para revisão
+                    if baselines is not None:
+                        chunk_anomalies = self.detect_value_anomalies(processed_df, baselines)
+                        chunk_anomalies['linha'] += totals['registros']
+                        anomalies.append(chunk_anomalies)
+                        totals['atipicos'] += len(chunk_anomalies)
+                    
+                    csv_string = self.df_to_csv_string(processed_df)
+                    if totals['blocos'] > 0:
+                        # Cabeçalho apenas no primeiro bloco
+                        csv_string = csv_string.split('\n', 1)[1]
+                    output.write(csv_string)
+                    if chunk_callback is not None:
+                        chunk_callback(processed_df)
+                    
+                    for key, value in self.calculate_irrf_from_original_data(processed_df).items():
+                        totals[key] = totals.get(key, 0) + value
+                    totals['linhas_lidas'] += len(chunk)
+                    totals['registros'] += len(processed_df)
+                    totals['lancamentos_irrf'] += int(self.is_irrf_record(processed_df).sum())
+                    totals['blocos'] += 1
+                    result.mapping_info = result.mapping_info or mapping_info
+                    
+                    if progress_callback is not None:
+                        progress_callback(totals)
+            except Exception as e:
+                result.error = str(e)
+                self._notify('error', f"Erro ao processar o arquivo {name}: {str(e)}")
+            
+            if result.ok and totals['atipicos']:
+                self._notify('warning', f"🔎 {totals['atipicos']} valor(es) atípico(s) frente ao histórico em {name}")
+        
+        if violations:
+            result.violations = pd.concat(violations, ignore_index=True)
+        if anomalies:
+            result.anomalies = pd.concat(anomalies, ignore_index=True)
+        if result.ok:
+            result.totals = totals
+        result.messages = messages
+        result.timings['total'] = round(time.perf_counter() - started, 4)
+        return result
+    
+    def debug_report_data(self, df, report_name):
+        """Função de debug para verificar dados dos relatórios."""
+        self._notify('write', f"### Debug - {report_name}")
+        
+        # Verificar colunas disponíveis
+        self._notify('write', "**Colunas disponíveis:**", list(df.columns))
+        
+        # Verificar valores únicos em colunas importantes
+        if 'CodigoTipoRecebimento' in df.columns:
+            self._notify('write', "**Códigos de tipo de recebimento:**", sorted(df['CodigoTipoRecebimento'].dropna().unique()))
+        
+        if 'TipoSingular' in df.columns:
+            self._notify('write', "**Tipos de singular:**", sorted(df['TipoSingular'].dropna().unique()))
+        
+        if 'Tipo' in df.columns:
+            self._notify('write', "**Tipos:**", sorted(df['Tipo'].dropna().unique()))
+        
+        # Mostrar primeiras linhas
+        self._notify('write', "**Primeiras 3 linhas:**")
+        self._notify('dataframe', df.head(3))
+        
+        self._notify('write', "---")
+
+    def generate_accounting_reports(self, df, output_dir, **options):
+        """Relatórios contábeis solicitados pelo contador (ver reports.generate_accounting_reports)."""
+        from . import reports
+        return reports.generate_accounting_reports(self, df, output_dir, **options)
+
+    def truncate_lines(self, text, max_chars_per_line=55, max_lines=3):
+        """
+        Divide o texto em linhas com quebra inteligente por palavras.
+        
+        Args:
+            text: Texto a ser formatado
+            max_chars_per_line: Máximo de caracteres por linha
+            max_lines: Máximo de linhas permitidas
+            
+        Returns:
+            String formatada com <br/> para uso em Paragraph
+        """
+        if not text or pd.isna(text):
+            return ""
+        
+        text_str = str(text).strip()
+        if not text_str:
+            return ""
+        
+        # Se o texto é curto, retornar como está
+        if len(text_str) <= max_chars_per_line:
+            return text_str
+        
+        # Dividir por palavras
+        words = text_str.split()
+        lines = []
+        current_line = ""
+        
+        for word in words:
+            # Verificar se adicionando a palavra ultrapassaria o limite
+            test_line = current_line + " " + word if current_line else word
+            
+            if len(test_line) <= max_chars_per_line:
+                current_line = test_line
+            else:
+                # Se a linha atual não está vazia, adicionar às linhas
+                if current_line:
+                    lines.append(current_line)
+                    current_line = word
+                else:
+                    # Palavra muito longa, forçar quebra
+                    lines.append(word)
+                    current_line = ""
+        
+        # Adicionar última linha se não estiver vazia
+        if current_line:
+            lines.append(current_line)
+        
+        # Limitar ao número máximo de linhas
+        if len(lines) > max_lines:
+            lines = lines[:max_lines]
+            # Adicionar "..." na última linha se necessário
+            if lines:
+                last_line = lines[-1]
+                if len(last_line) + 3 <= max_chars_per_line:
+                    lines[-1] = last_line + "..."
+                else:
+                    # Truncar a última linha para dar espaço ao "..."
+                    lines[-1] = last_line[:max_chars_per_line-3] + "..."
+        
+        # Juntar com <br/> para ReportLab
+        return "<br/>".join(lines)
+
+    def format_currency(self, value):
+        """Formata valor monetário em centavos (int) com separador de milhares (ex.: 123456 -> '1.234,56')."""
+        if value is None or pd.isna(value) or value == 0:
+            return "0,00"
+        
+        # Textos são convertidos para centavos
+        if isinstance(value, str):
+            value = self.normalize_cents(value)
+        
+        cents = int(value)
+        sign = '-' if cents < 0 else ''
+        reais, centavos = divmod(abs(cents), 100)
+        # Separador de milhares com ponto e decimal com vírgula (padrão brasileiro)
+        return f"{sign}{reais:,}".replace(',', '.') + f",{centavos:02d}"
+    
+    def for_display(self, df):
+        """Cópia para exibição na interface, com a coluna valor convertida de centavos para reais."""
+        display = df.copy()
+        if 'valor' in display.columns:
+            display['valor'] = display['valor'] / 100
+        return display
+
+    def format_date(self, value):
+        """Formata uma data no padrão brasileiro (dd/mm/yyyy)."""
+        if value is None or pd.isna(value):
+            return ""
+        if isinstance(value, str):
+            return value
+        return pd.Timestamp(value).strftime('%d/%m/%Y')
+
+    def format_account(self, value):
+        """Formata um código de conta/histórico, vazio quando ausente."""
+        if value is None or pd.isna(value):
+            return ""
+        return str(int(value))
+
+    def unified_report_rows(self, data_df):
+        """
+        Pré-calcula as linhas do relatório unificado em bloco.
+        
+        Para lançamentos de IRRF o valor é o próprio IRRF (bruto e líquido zerados);
+        para registros originais o IRRF vem da coluna IRRF original. Retorna um
+        DataFrame só com textos prontos para o PDF e os totais em centavos.
+        """
+        is_irrf = self.is_irrf_record(data_df).to_numpy()
+        valor = data_df['valor'].fillna(0).astype('int64').to_numpy()
+        if 'IRRF' in data_df.columns:
+            irrf_original = self.normalize_cents_series(data_df['IRRF']).to_numpy()
+        else:
+            irrf_original = np.zeros(len(data_df), dtype='int64')
+        
+        valor_bruto = np.where(is_irrf, 0, valor)
+        irrf = np.where(is_irrf, valor, irrf_original)
+        valor_liquido = np.where(is_irrf, 0, valor_bruto - irrf)
+        
+        index = data_df.index
+        if pd.api.types.is_datetime64_any_dtype(data_df['DATA']):
+            datas = data_df['DATA'].dt.strftime('%d/%m/%Y').fillna('')
+        else:
+            datas = data_df['DATA'].map(self.format_date)
+        
+        def accounts(series):
+            return pd.to_numeric(series, errors='coerce').astype('Int64').astype('string').fillna('').astype(str)
+        
+        # Quebra de linhas do complemento calculada uma vez por texto distinto
+        complementos = data_df['complemento'].astype(object).where(data_df['complemento'].notna(), '').astype(str)
+        quebras = {texto: self.truncate_lines(texto, max_chars_per_line=55, max_lines=3) for texto in pd.unique(complementos)}
+        
+        rows = pd.DataFrame({
+            'data': datas,
+            'complemento': complementos.map(quebras),
+            'valor_bruto': format_cents_series(pd.Series(valor_bruto, index=index), thousands=True),
+            'irrf': format_cents_series(pd.Series(irrf, index=index), thousands=True),
+            'valor_liquido': format_cents_series(pd.Series(valor_liquido, index=index), thousands=True),
+            'debito': accounts(data_df['Debito']),
+            'credito': accounts(data_df['Credito']),
+            'historico': accounts(data_df['Historico']),
+        }, index=index)
+        totals = {
+            'valor_bruto': int(valor_bruto.sum()),
+            'irrf': int(irrf.sum()),
+            'valor_liquido': int(valor_liquido.sum()),
+        }
+        return rows, totals
+    
+    def generate_unified_report(self, df, output_dir, display_result=False):
+        """Relatório unificado: CSV convertido em PDF + página de resumo (ver reports)."""
+        from . import reports
+        return reports.generate_unified_report(self, df, output_dir, display_result)
+
+    def generate_irrf_report(self, df, output_dir, display_result=False):
+        """Relatório de IRRF (Imposto de Renda Retido na Fonte), ver reports."""
+        from . import reports
+        return reports.generate_irrf_report(self, df, output_dir, display_result)
+
+    def generate_netting_report(self, df, output_dir, display_result=False, max_pdf_rows=40):
+        """Compensação por singular: CSV completo + PDF de uma página (ver reports)."""
+        from . import reports
+        return reports.generate_netting_report(self, df, output_dir, display_result, max_pdf_rows)
+    
+    def calculate_trial_balance(self, df, by_month=False):
+        """
+        Balancete: débitos, créditos e saldo (débitos - créditos) por conta, em centavos.
+        
+        Aceita o DataFrame processado (Debito/Credito/DATA/valor) ou o resultado de
+        JournalLedger.query (debito/credito/data/valor). Cada lançamento soma o valor
+        na conta de débito e na de crédito (dois group-bys); com by_month=True o
+        balancete é aberto também por mês (coluna mes, AAAA-MM).
+        """
+        frame = pd.DataFrame({
+            'debito': pd.to_numeric(df['Debito' if 'Debito' in df.columns else 'debito'], errors='coerce').astype('Int64'),
+            'credito': pd.to_numeric(df['Credito' if 'Credito' in df.columns else 'credito'], errors='coerce').astype('Int64'),
+            'valor': pd.to_numeric(df['valor'], errors='coerce').fillna(0).astype('int64'),
+        })
+        keys = []
+        if by_month:
+            # Mês como inteiro AAAAMM no agrupamento; o texto só é montado no resultado
+            datas = pd.to_datetime(df['DATA' if 'DATA' in df.columns else 'data'], dayfirst=True)
+            frame['mes'] = (datas.dt.year * 100 + datas.dt.month).to_numpy()
+            keys = ['mes']
+        
+        # dropna=False: lançamentos sem conta formam a linha "sem conta" (conta vazia) em vez de sumir
+        debits = frame.groupby(keys + ['debito'], sort=False, dropna=False)['valor'].sum().rename_axis(keys + ['conta'])
+        credits = frame.groupby(keys + ['credito'], sort=False, dropna=False)['valor'].sum().rename_axis(keys + ['conta'])
+        balance = pd.concat([debits.rename('debitos'), credits.rename('creditos')], axis=1).fillna(0).astype('int64')
+        balance = balance.sort_index().reset_index()
+        balance['conta'] = balance['conta'].astype('Int64')
+        balance['descricao'] = balance['conta'].map(NOMES_CONTAS_CONTABEIS).fillna('Conta não cadastrada').astype(str)
+        balance.loc[balance['conta'].isna(), 'descricao'] = 'Sem conta'
+        if by_month:
+            meses = balance['mes'].astype('Int64')
+            balance['mes'] = (meses // 100).astype(str) + '-' + (meses % 100).astype(str).str.zfill(2)
+        balance['saldo'] = balance['debitos'] - balance['creditos']
+        balance['natureza'] = np.where(balance['saldo'] > 0, 'D', np.where(balance['saldo'] < 0, 'C', ''))
+        return balance[keys + ['conta', 'descricao', 'debitos', 'creditos', 'saldo', 'natureza']]
+    
+    def trial_balance_check(self, balance):
+        """Totais do balancete e a conferência débitos = créditos (por mês quando houver)."""
+        total_debitos = int(balance['debitos'].sum())
+        total_creditos = int(balance['creditos'].sum())
+        check = {
+            "contas": int(balance['conta'].nunique()),
+            "total_debitos": total_debitos,
+            "total_creditos": total_creditos,
+            "diferenca": total_debitos - total_creditos,
+            "equilibrado": total_debitos == total_creditos,
+            # Linhas de lançamentos sem conta de débito ou de crédito (valores já incluídos nos totais)
+            "sem_conta": int(balance['conta'].isna().sum()),
+        }
+        if 'mes' in balance.columns:
+            by_month = balance.groupby('mes')[['debitos', 'creditos']].sum()
+            check["meses_desequilibrados"] = by_month.index[by_month['debitos'] != by_month['creditos']].tolist()
+        return check
+    
+    def trial_balance_to_csv_string(self, balance):
+        """CSV brasileiro (;) do balancete, valores com vírgula decimal."""
+        headers = {'mes': 'Mes', 'conta': 'Conta', 'descricao': 'Descricao', 'debitos': 'Debitos',
+                   'creditos': 'Creditos', 'saldo': 'Saldo', 'natureza': 'Natureza'}
+        headers = {col: title for col, title in headers.items() if col in balance.columns}
+        lines = [';'.join(headers.values())]
+        if len(balance):
+            formatted = []
+            for col in headers:
+                if col == 'conta':
+                    formatted.append(balance[col].astype('string').fillna('').astype(str))
+                elif col in ('mes', 'descricao', 'natureza'):
+                    formatted.append(balance[col].astype(str))
+                else:
+                    formatted.append(format_cents_series(balance[col]))
+            rows = formatted[0]
+            for column_values in formatted[1:]:
+                rows = rows + ';' + column_values
+            lines.extend(rows.tolist())
+        return '\n'.join(lines) + '\n'
+    
+    def generate_trial_balance_report(self, df, output_dir, display_result=False, by_month=False):
+        """Balancete (CSV + PDF) a partir do DataFrame processado ou do livro (ver reports)."""
+        from . import reports
+        return reports.generate_trial_balance_report(self, df, output_dir, display_result, by_month)
+    
+    def export_to_csv(self, df, filename):
+        """Exporta o DataFrame para um arquivo CSV."""
+        csv_content = self.df_to_csv_string(df)
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(csv_content)
+        return filename
+
+    def write_csv_zip(self, dataframes, compresslevel=None, zip_path=None):
+        """
+        Grava um ZIP com os arquivos contábeis (contabil_<arquivo>) em disco.
+        Cada CSV é gerado e comprimido em blocos, sem montar o arquivo inteiro em memória.
+        """
+        if zip_path is None:
+            download_dir = os.path.join(CACHE_DIR, "downloads")
+            os.makedirs(download_dir, exist_ok=True)
+            zip_path = os.path.join(download_dir, f"{uuid.uuid4().hex}.zip")
+        with StreamingZipWriter(zip_path, compresslevel) as zip_writer:
+            for filename, df in dataframes.items():
+                zip_writer.write_chunks(f"contabil_{filename}", self.iter_csv_chunks(df))
+        return zip_path
+
+    def safe_numeric_sum(self, series):
+        """Soma exata de uma série em centavos (int), tratando valores não-numéricos como zero."""
+        if series.empty:
+            return 0
+        
+        # Converter para numérico, forçando erros para NaN
+        numeric_series = pd.to_numeric(series, errors='coerce')
+        
+        # Substituir NaN por 0 e somar como inteiros (centavos)
+        return int(numeric_series.fillna(0).round().astype('int64').sum())
+    
+    # Chaves do cubo de resumo
+    SUMMARY_CUBE_KEYS = ['Tipo', 'TipoSingular', 'CodigoTipoRecebimento', 'lancamento', 'Debito', 'Credito', 'Historico']
+    
+    def summary_cube(self, df):
+        """
+        Cubo de resumo do DataFrame processado: uma única agregação por
+        (Tipo, TipoSingular, CodigoTipoRecebimento, lancamento, Debito, Credito, Historico),
+        onde lancamento é 'irrf' ou 'original', com as medidas registros, valor,
+        irrf_original (coluna IRRF > 0 dos registros) e registros_com_irrf, em centavos.
+        
+        Não há cache: quem monta o DataFrame consolidado calcula o cubo uma vez e o
+        repassa aos resumos (parâmetro cube) e aos demais totais.
+        """
+        valores = pd.to_numeric(df['valor'], errors='coerce').fillna(0) if 'valor' in df.columns else pd.Series(0, index=df.index)
+        frame = pd.DataFrame(index=df.index)
+        for col in self.SUMMARY_CUBE_KEYS:
+            if col != 'lancamento':
+                frame[col] = df[col] if col in df.columns else pd.NA
+        is_irrf = self.is_irrf_record(df) if 'complemento' in df.columns else pd.Series(False, index=df.index)
+        frame['lancamento'] = np.where(is_irrf, 'irrf', 'original')
+        frame['valor'] = valores.round().astype('int64')
+        if 'IRRF' in df.columns:
+            irrf = self.normalize_cents_series(df['IRRF']).where(~is_irrf, 0)
+        else:
+            irrf = pd.Series(0, index=df.index, dtype='int64')
+        frame['irrf_original'] = irrf.where(irrf > 0, 0)
+        frame['registros_com_irrf'] = (irrf > 0).astype('int64')
+        
+        cube = frame.groupby(self.SUMMARY_CUBE_KEYS, dropna=False, observed=True, sort=False).agg(
+            registros=('valor', 'size'),
+            valor=('valor', 'sum'),
+            irrf_original=('irrf_original', 'sum'),
+            registros_com_irrf=('registros_com_irrf', 'sum'),
+        ).reset_index()
+        return cube
+    
+    def cube_sum(self, cube, measure, **filters):
+        """Soma (int) de uma medida do cubo nas células que atendem aos filtros (valor ou lista de valores)."""
+        mask = pd.Series(True, index=cube.index)
+        for col, value in filters.items():
+            if isinstance(value, (list, tuple, set)):
+                mask &= cube[col].isin(list(value)).fillna(False).astype(bool)
+            else:
+                mask &= (cube[col] == value).fillna(False).astype(bool)
+        return int(cube.loc[mask, measure].sum())
+    
+    def calculate_irrf_by_complemento(self, df, cube=None):
+        """
+        Calcula IRRF (em centavos) baseado nos registros que contêm 'IRRF' no complemento.
+        cube: summary_cube(df) já calculado, se houver.
+        """
+        # Filtrar registros que têm IRRF no complemento usando a função helper
+        mask_irrf = self.is_irrf_record(df)
+        df_irrf = df[mask_irrf].copy()
+        
+        if df_irrf.empty:
+            return {
+                'total_irrf': 0,
+                'irrf_a_pagar': 0,
+                'irrf_a_receber': 0,
+                'registros_irrf': 0,
+                'df_irrf': pd.DataFrame()
+            }
+        
+        # Separar por tipo
+        cube = self.summary_cube(df) if cube is None else cube
+        irrf_a_pagar = self.cube_sum(cube, 'valor', lancamento='irrf', Tipo='A pagar')
+        irrf_a_receber = self.cube_sum(cube, 'valor', lancamento='irrf', Tipo='A receber')
+        
+        return {
+            'total_irrf': irrf_a_pagar + irrf_a_receber,
+            'irrf_a_pagar': irrf_a_pagar,
+            'irrf_a_receber': irrf_a_receber,
+            'registros_irrf': len(df_irrf),
+            'df_irrf': df_irrf
+        }
+    
+    def calculate_irrf_from_original_data(self, df, cube=None):
+        """
+        Calcula IRRF baseado nos dados originais (coluna IRRF dos dados originais).
+        Esta função deve ser usada quando temos acesso aos dados originais com a coluna IRRF.
+        Todos os valores retornados estão em centavos (int).
+        cube: summary_cube(df) já calculado, se houver.
+        """
+        # Totais dos registros originais (não lançamentos de IRRF), lidos do cubo de resumo
+        cube = self.summary_cube(df) if cube is None else cube
+        valor_bruto_a_pagar = self.cube_sum(cube, 'valor', lancamento='original', Tipo='A pagar')
+        valor_bruto_a_receber = self.cube_sum(cube, 'valor', lancamento='original', Tipo='A receber')
+        
+        # IRRF baseado na coluna IRRF original (somente valores > 0)
+        irrf_a_pagar = self.cube_sum(cube, 'irrf_original', lancamento='original', Tipo='A pagar')
+        irrf_a_receber = self.cube_sum(cube, 'irrf_original', lancamento='original', Tipo='A receber')
+        registros_com_irrf = self.cube_sum(cube, 'registros_com_irrf', lancamento='original')
+        
+        # Calcular valores líquidos
+        valor_liquido_a_pagar = valor_bruto_a_pagar - irrf_a_pagar
+        valor_liquido_a_receber = valor_bruto_a_receber - irrf_a_receber
+        
+        return {
+            'total_irrf': irrf_a_pagar + irrf_a_receber,
+            'irrf_a_pagar': irrf_a_pagar,
+            'irrf_a_receber': irrf_a_receber,
+            'registros_com_irrf': registros_com_irrf,
+            'valor_bruto_a_pagar': valor_bruto_a_pagar,
+            'valor_bruto_a_receber': valor_bruto_a_receber,
+            'valor_liquido_a_pagar': valor_liquido_a_pagar,
+            'valor_liquido_a_receber': valor_liquido_a_receber
+        }
+
+    def calculate_netting(self, df):
+        """
+        Compensação por singular: a receber, a pagar, IRRF e saldo de cada contraparte.
+        
+        Segue a semântica de calculate_irrf_from_original_data: só registros originais
+        (não lançamentos de IRRF) entram no bruto, o IRRF vem da coluna IRRF original
+        (valores > 0) e o líquido é bruto - IRRF. Agrupa por CodigoSingular (ou pelo
+        nome, quando o código não existe). Valores em centavos (int).
+        """
+        columns = ['CodigoSingular', 'NomeSingular', 'registros',
+                   'a_receber_bruto', 'irrf_a_receber', 'a_receber_liquido',
+                   'a_pagar_bruto', 'irrf_a_pagar', 'a_pagar_liquido',
+                   'saldo_bruto', 'saldo_liquido']
+        originals = df[~self.is_irrf_record(df)]
+        if originals.empty:
+            return pd.DataFrame(columns=columns)
+        
+        codigo = pd.to_numeric(originals['CodigoSingular'], errors='coerce').astype('Int64') \
+            if 'CodigoSingular' in originals.columns else pd.Series(pd.NA, index=originals.index, dtype='Int64')
+        nome = originals['NomeSingular'].astype(object).where(originals['NomeSingular'].notna(), '').astype(str).str.strip()
+        a_receber = (originals['Tipo'] == 'A receber').fillna(False).to_numpy(dtype=bool)
+        a_pagar = (originals['Tipo'] == 'A pagar').fillna(False).to_numpy(dtype=bool)
+        valor = originals['valor'].fillna(0).astype('int64').to_numpy()
+        if 'IRRF' in originals.columns:
+            irrf = self.normalize_cents_series(originals['IRRF']).to_numpy()
+            irrf = np.where(irrf > 0, irrf, 0)
+        else:
+            irrf = np.zeros(len(originals), dtype='int64')
+        
+        frame = pd.DataFrame({
+            'chave': codigo.astype('string').fillna('nome:' + nome.str.upper()).to_numpy(),
+            'CodigoSingular': codigo.to_numpy(),
+            'NomeSingular': nome.to_numpy(),
+            'registros': 1,
+            'a_receber_bruto': np.where(a_receber, valor, 0),
+            'irrf_a_receber': np.where(a_receber, irrf, 0),
+            'a_pagar_bruto': np.where(a_pagar, valor, 0),
+            'irrf_a_pagar': np.where(a_pagar, irrf, 0),
+        })
+        netting = frame.groupby('chave', sort=False).agg(
+            CodigoSingular=('CodigoSingular', 'first'),
+            NomeSingular=('NomeSingular', 'first'),
+            registros=('registros', 'sum'),
+            a_receber_bruto=('a_receber_bruto', 'sum'),
+            irrf_a_receber=('irrf_a_receber', 'sum'),
+            a_pagar_bruto=('a_pagar_bruto', 'sum'),
+            irrf_a_pagar=('irrf_a_pagar', 'sum'),
+        ).reset_index(drop=True)
+        
+        netting['a_receber_liquido'] = netting['a_receber_bruto'] - netting['irrf_a_receber']
+        netting['a_pagar_liquido'] = netting['a_pagar_bruto'] - netting['irrf_a_pagar']
+        netting['saldo_bruto'] = netting['a_receber_bruto'] - netting['a_pagar_bruto']
+        netting['saldo_liquido'] = netting['a_receber_liquido'] - netting['a_pagar_liquido']
+        netting = netting[columns].sort_values('NomeSingular', kind='stable').reset_index(drop=True)
+        return netting
+    
+    def netting_to_csv_string(self, netting):
+        """CSV brasileiro (;) da compensação por singular, valores com vírgula decimal."""
+        headers = {
+            'CodigoSingular': 'Codigo', 'NomeSingular': 'Nome', 'registros': 'Registros',
+            'a_receber_bruto': 'Valor a Receber (Bruto)', 'irrf_a_receber': 'IRRF a Receber',
+            'a_receber_liquido': 'Valor a Receber (Liquido)', 'a_pagar_bruto': 'Valor a Pagar (Bruto)',
+            'irrf_a_pagar': 'IRRF a Pagar', 'a_pagar_liquido': 'Valor a Pagar (Liquido)',
+            'saldo_bruto': 'Saldo (Bruto)', 'saldo_liquido': 'Saldo (Liquido)',
+        }
+        lines = [';'.join(headers.values())]
+        if len(netting):
+            formatted = []
+            for col in headers:
+                if col == 'CodigoSingular':
+                    formatted.append(netting[col].astype('string').fillna('').astype(str))
+                elif col in ('NomeSingular', 'registros'):
+                    formatted.append(netting[col].astype(str))
+                else:
+                    formatted.append(format_cents_series(netting[col]))
+            rows = formatted[0]
+            for column_values in formatted[1:]:
+                rows = rows + ';' + column_values
+            lines.extend(rows.tolist())
+        return '\n'.join(lines) + '\n'
+    
+    def normalize_name_series(self, series):
+        """Nome para comparação: sem acentos, maiúsculo e com espaços simples."""
+        return (series.astype(object).where(series.notna(), '').astype(str)
+                .str.normalize('NFKD').str.encode('ascii', errors='ignore').str.decode('ascii')
+                .str.upper().str.replace(r'\s+', ' ', regex=True).str.strip())
+    
+    def simplified_summary(self, df):
+        """
+        Valores por singular do layout simplificado da federação
+        ("Código";"Nome";"Valor a Receber";"Valor a Pagar"), em centavos.
+        Aceita o arquivo bruto ou o já mapeado por detect_simplified_format.
+        """
+        if 'LinhaArquivo' in df.columns:
+            # Arquivo já convertido: cada linha original gera até dois lançamentos
+            df = df.drop_duplicates('LinhaArquivo')
+        codigo_col = 'Código' if 'Código' in df.columns else 'CodigoSingular'
+        nome_col = 'Nome' if 'Nome' in df.columns else 'NomeSingular'
+        a_receber = self.normalize_cents_series(df['Valor a Receber'])
+        a_pagar = self.normalize_cents_series(df['Valor a Pagar'])
+        # normalize_cents descarta o sinal; o saldo do arquivo é sempre receber - pagar
+        saldo = a_receber - a_pagar
+        summary = pd.DataFrame({
+            'CodigoSingular': pd.to_numeric(df[codigo_col], errors='coerce').astype('Int64'),
+            'NomeSingular': df[nome_col].astype(object).where(df[nome_col].notna(), '').astype(str).str.strip(),
+            'a_receber': a_receber,
+            'a_pagar': a_pagar,
+            'saldo': saldo,
+        })
+        # Um singular pode aparecer em mais de uma linha (ex.: vários meses)
+        summary['chave'] = summary['CodigoSingular'].astype('string').fillna('nome:' + self.normalize_name_series(summary['NomeSingular']))
+        return summary.groupby('chave', sort=False).agg(
+            CodigoSingular=('CodigoSingular', 'first'),
+            NomeSingular=('NomeSingular', 'first'),
+            a_receber=('a_receber', 'sum'),
+            a_pagar=('a_pagar', 'sum'),
+            saldo=('saldo', 'sum'),
+        ).reset_index(drop=True)
+    
+    def reconcile_federation(self, detailed_df, simplified_df, tolerance_cents=1, basis='bruto'):
+        """
+        Concilia o arquivo detalhado (processado) com o simplificado da federação.
+        
+        O detalhado é agregado por singular (calculate_netting) e ligado ao
+        simplificado pelo código; o que sobra dos dois lados é ligado pelo nome
+        normalizado. basis escolhe os valores do detalhado comparados ('bruto' ou
+        'liquido'). Retorna uma linha por singular com os valores dos dois lados, as
+        diferenças (detalhado - simplificado, em centavos), a forma de ligação
+        ('codigo', 'nome', 'so_detalhado', 'so_simplificado') e o indicador divergente
+        (alguma diferença acima da tolerância ou singular presente em um lado só).
+        """
+        netting = self.calculate_netting(detailed_df)
+        suffix = 'liquido' if basis == 'liquido' else 'bruto'
+        detailed = pd.DataFrame({
+            'CodigoSingular': netting['CodigoSingular'].astype('Int64'),
+            'NomeSingular': netting['NomeSingular'],
+            'a_receber': netting[f'a_receber_{suffix}'].astype('int64'),
+            'a_pagar': netting[f'a_pagar_{suffix}'].astype('int64'),
+            'saldo': netting[f'saldo_{suffix}'].astype('int64'),
+        })
+        simplified = self.simplified_summary(simplified_df)
+        detailed['nome_norm'] = self.normalize_name_series(detailed['NomeSingular'])
+        simplified['nome_norm'] = self.normalize_name_series(simplified['NomeSingular'])
+        detailed['id_det'] = np.arange(len(detailed))
+        simplified['id_simp'] = np.arange(len(simplified))
+        
+        # 1) Ligação pelo código (hash join)
+        by_code = detailed.dropna(subset=['CodigoSingular']).merge(
+            simplified.dropna(subset=['CodigoSingular']), on='CodigoSingular', suffixes=('_det', '_simp'))
+        by_code['ligacao'] = 'codigo'
+        
+        # 2) O que sobrou, pelo nome normalizado
+        rest_det = detailed[~detailed['id_det'].isin(by_code['id_det'])]
+        rest_simp = simplified[~simplified['id_simp'].isin(by_code['id_simp'])]
+        by_name = rest_det[rest_det['nome_norm'] != ''].merge(
+            rest_simp[rest_simp['nome_norm'] != ''], on='nome_norm', suffixes=('_det', '_simp'))
+        by_name = by_name.drop_duplicates('id_det').drop_duplicates('id_simp')
+        by_name['ligacao'] = 'nome'
+        
+        # 3) Sem par em um dos lados
+        only_det = rest_det[~rest_det['id_det'].isin(by_name['id_det'])].add_suffix('_det')
+        only_det['ligacao'] = 'so_detalhado'
+        only_simp = rest_simp[~rest_simp['id_simp'].isin(by_name['id_simp'])].add_suffix('_simp')
+        only_simp['ligacao'] = 'so_simplificado'
+        
+        joined = pd.concat([by_code, by_name, only_det, only_simp], ignore_index=True)
+        codigo = joined['CodigoSingular'] if 'CodigoSingular' in joined.columns else pd.Series(pd.NA, index=joined.index, dtype='Int64')
+        for side in ('det', 'simp'):
+            if f'CodigoSingular_{side}' in joined.columns:
+                codigo = codigo.fillna(joined[f'CodigoSingular_{side}'])
+        nome = joined['NomeSingular_det'].where(joined['NomeSingular_det'].notna(), joined['NomeSingular_simp'])
+        
+        result = pd.DataFrame({
+            'CodigoSingular': codigo.astype('Int64'),
+            'NomeSingular': nome,
+            'ligacao': joined['ligacao'],
+        })
+        divergente = joined['ligacao'].isin(['so_detalhado', 'so_simplificado']).to_numpy().copy()
+        for measure in ('a_receber', 'a_pagar', 'saldo'):
+            det = joined[f'{measure}_det'].fillna(0).astype('int64')
+            simp = joined[f'{measure}_simp'].fillna(0).astype('int64')
+            result[f'{measure}_detalhado'] = det
+            result[f'{measure}_simplificado'] = simp
+            result[f'dif_{measure}'] = det - simp
+            divergente |= (result[f'dif_{measure}'].abs() > tolerance_cents).to_numpy()
+        result['divergente'] = divergente
+        return result.sort_values(['divergente', 'NomeSingular'], ascending=[False, True], kind='stable').reset_index(drop=True)
+    
+    def reconciliation_to_csv_string(self, reconciliation):
+        """CSV brasileiro (;) da conciliação detalhado × simplificado."""
+        headers = {
+            'CodigoSingular': 'Codigo', 'NomeSingular': 'Nome', 'ligacao': 'Ligacao',
+            'a_receber_detalhado': 'A Receber (Detalhado)', 'a_receber_simplificado': 'A Receber (Simplificado)',
+            'dif_a_receber': 'Diferenca A Receber', 'a_pagar_detalhado': 'A Pagar (Detalhado)',
+            'a_pagar_simplificado': 'A Pagar (Simplificado)', 'dif_a_pagar': 'Diferenca A Pagar',
+            'saldo_detalhado': 'Saldo (Detalhado)', 'saldo_simplificado': 'Saldo (Simplificado)',
+            'dif_saldo': 'Diferenca Saldo', 'divergente': 'Divergente',
+        }
+        lines = [';'.join(headers.values())]
+        if len(reconciliation):
+            formatted = []
+            for col in headers:
+                if col == 'CodigoSingular':
+                    formatted.append(reconciliation[col].astype('string').fillna('').astype(str))
+                elif col in ('NomeSingular', 'ligacao'):
+                    formatted.append(reconciliation[col].astype(str))
+                elif col == 'divergente':
+                    formatted.append(reconciliation[col].map({True: 'Sim', False: 'Nao'}))
+                else:
+                    formatted.append(format_cents_series(reconciliation[col]))
+            rows = formatted[0]
+            for column_values in formatted[1:]:
+                rows = rows + ';' + column_values
+            lines.extend(rows.tolist())
+        return '\n'.join(lines) + '\n'
+    
+    # Tipos de violação verificados por validate_entries
+    VIOLATION_TYPES = {
+        'debito_ausente': "Lançamento sem conta de débito",
+        'credito_ausente': "Lançamento sem conta de crédito",
+        'historico_ausente': "Lançamento sem histórico",
+        'conta_desconhecida': "Conta fora das regras e do plano de contas",
+        'debito_igual_credito': "Débito e crédito na mesma conta",
+        'valor_negativo': "Valor negativo",
+        'irrf_sem_origem': "Linha de IRRF sem o lançamento que a gerou",
+        'irrf_divergente': "Linha de IRRF não corresponde ao lançamento de origem",
+    }
+    
+    def validate_entries(self, df):
+        """
+        Valida as partidas dobradas de um DataFrame processado, de forma vetorizada.
+        
+        Verifica contas de débito e crédito e histórico preenchidos, contas
+        conhecidas (CONTAS_REGRAS e NOMES_CONTAS_CONTABEIS), débito diferente do
+        crédito, valor não negativo e, nas linhas de IRRF, a contrapartida com o
+        lançamento de origem (contas, histórico e valor do IRRF). Retorna uma linha por
+        violação: linha (índice no DataFrame), tipo (categoria de VIOLATION_TYPES),
+        descricao, complemento e valor (centavos).
+        """
+        debito = pd.to_numeric(df['Debito'], errors='coerce').astype('Int64')
+        credito = pd.to_numeric(df['Credito'], errors='coerce').astype('Int64')
+        historico = pd.to_numeric(df['Historico'], errors='coerce').astype('Int64')
+        valor = pd.to_numeric(df['valor'], errors='coerce').fillna(0).astype('int64')
+        known = list(CONTAS_REGRAS | set(NOMES_CONTAS_CONTABEIS))
+        
+        checks = {
+            'debito_ausente': debito.isna(),
+            'credito_ausente': credito.isna(),
+            'historico_ausente': historico.isna(),
+            'conta_desconhecida': (debito.notna() & ~debito.isin(known)) | (credito.notna() & ~credito.isin(known)),
+            'debito_igual_credito': debito.notna() & (debito == credito).fillna(False),
+            'valor_negativo': valor < 0,
+        }
+        
+        # IRRF: A pagar -> débito = crédito da origem, crédito 23476, histórico 2341;
+        # A receber -> débito 15456, crédito = débito da origem, histórico 22
+        is_irrf = self.is_irrf_record(df)
+        owners = self.irrf_owner_rows(df)
+        irrf_sem_origem = pd.Series(False, index=df.index)
+        irrf_divergente = pd.Series(False, index=df.index)
+        if is_irrf.any() and not len(owners):
+            irrf_sem_origem = is_irrf
+        elif len(owners):
+            origem = owners.to_numpy()
+            tipo = df['Tipo'].astype(object).to_numpy()[df.index.get_indexer(origem)]
+            irrf_valor = self.normalize_cents_series(df.loc[origem, 'IRRF']).to_numpy()
+            a_pagar = tipo == 'A pagar'
+            esperado_debito = np.where(a_pagar, credito.loc[origem].to_numpy(dtype='float', na_value=np.nan), 15456)
+            esperado_credito = np.where(a_pagar, 23476, debito.loc[origem].to_numpy(dtype='float', na_value=np.nan))
+            esperado_historico = np.where(a_pagar, 2341, 22)
+            linhas = owners.index
+            divergente = ~(
+                (debito.loc[linhas].to_numpy(dtype='float', na_value=np.nan) == esperado_debito)
+                & (credito.loc[linhas].to_numpy(dtype='float', na_value=np.nan) == esperado_credito)
+                & (historico.loc[linhas].to_numpy(dtype='float', na_value=np.nan) == esperado_historico)
+                & (valor.loc[linhas].to_numpy() == irrf_valor)
+            )
+            irrf_divergente.loc[linhas[divergente]] = True
+        checks['irrf_sem_origem'] = irrf_sem_origem
+        checks['irrf_divergente'] = irrf_divergente
+        
+        parts = []
+        for tipo, mask in checks.items():
+            mask = mask.fillna(False).to_numpy(dtype=bool)
+            if mask.any():
+                parts.append(pd.DataFrame({'linha': df.index[mask], 'tipo': tipo}))
+        columns = ['linha', 'tipo', 'descricao', 'complemento', 'valor']
+        if not parts:
+            violations = pd.DataFrame({'linha': pd.Series(dtype='Int64'), 'tipo': pd.Series(dtype='object'),
+                                       'descricao': pd.Series(dtype='object'), 'complemento': pd.Series(dtype='object'),
+                                       'valor': pd.Series(dtype='int64')})
+        else:
+            violations = pd.concat(parts, ignore_index=True)
+            violations['descricao'] = violations['tipo'].map(self.VIOLATION_TYPES)
+            violations['complemento'] = df.loc[violations['linha'], 'complemento'].astype(str).to_numpy()
+            violations['valor'] = valor.loc[violations['linha']].to_numpy()
+            violations['linha'] = violations['linha'].astype('Int64')
+            violations = violations.sort_values(['linha', 'tipo'], kind='stable').reset_index(drop=True)
+        violations['tipo'] = pd.Categorical(violations['tipo'], categories=list(self.VIOLATION_TYPES))
+        return violations[columns]
+    
+    def value_baselines(self, history):
+        """
+        Linha de base por (CodigoSingular, CodigoTipoRecebimento): quantidade de
+        lançamentos, mediana, MAD (desvio absoluto mediano), mínimo e máximo dos
+        valores em centavos.
+        history: DataFrame com codigo_singular, codigo_tipo_recebimento e valor.
+        """
+        keys = ['CodigoSingular', 'CodigoTipoRecebimento']
+        frame = pd.DataFrame({
+            'CodigoSingular': pd.to_numeric(history['codigo_singular'], errors='coerce').astype('Int64'),
+            'CodigoTipoRecebimento': pd.to_numeric(history['codigo_tipo_recebimento'], errors='coerce').astype('Int64'),
+            'valor': pd.to_numeric(history['valor'], errors='coerce').astype('float'),
+        }).dropna()
+        if frame.empty:
+            return pd.DataFrame(columns=keys + ['historico', 'mediana', 'mad', 'minimo', 'maximo'])
+        groups = frame.groupby(keys)['valor']
+        frame['desvio'] = (frame['valor'] - groups.transform('median')).abs()
+        baselines = frame.groupby(keys).agg(
+            historico=('valor', 'size'), mediana=('valor', 'median'), mad=('desvio', 'median'),
+            minimo=('valor', 'min'), maximo=('valor', 'max')
+        )
+        return baselines.reset_index()
+    
+    def detect_value_anomalies(self, df, baselines, threshold=None, min_history=None):
+        """
+        Lançamentos originais com valor atípico para o histórico do singular e do tipo
+        de recebimento, para revisão (nada é alterado).
+        
+        Usa o escore robusto 0,6745 * (valor - mediana) / MAD, com o MAD limitado a
+        no mínimo 5% da mediana para que históricos curtos e quase constantes não
+        acusem variações pequenas; com histórico constante em zero, é atípico o valor
+        que difere da mediana por um fator de 10 ou mais. Valores dentro da faixa já
+        vista (mínimo e máximo do histórico, com 10% de folga) nunca são atípicos, o
+        que evita acusar transferências grandes recorrentes. A coluna motivo aponta
+        possíveis erros de escala (x100, /100).
+        """
+        threshold = ANOMALY_THRESHOLD if threshold is None else threshold
+        min_history = ANOMALY_MIN_HISTORY if min_history is None else min_history
+        columns = ['linha', 'CodigoSingular', 'NomeSingular', 'CodigoTipoRecebimento', 'Tipo',
+                   'valor', 'mediana', 'historico', 'escore', 'razao', 'motivo']
+        originals = df[~self.is_irrf_record(df)]
+        baselines = baselines[baselines['historico'] >= min_history] if len(baselines) else baselines
+        if originals.empty or baselines.empty:
+            return pd.DataFrame(columns=columns)
+        
+        current = pd.DataFrame({
+            'linha': originals.index,
+            'CodigoSingular': pd.to_numeric(originals['CodigoSingular'], errors='coerce').astype('Int64').to_numpy(),
+            'NomeSingular': originals['NomeSingular'].astype(str).to_numpy(),
+            'CodigoTipoRecebimento': pd.to_numeric(originals['CodigoTipoRecebimento'], errors='coerce').astype('Int64').to_numpy(),
+            'Tipo': originals['Tipo'].astype(str).to_numpy(),
+            'valor': originals['valor'].astype('int64').to_numpy(),
+        })
+        merged = current.merge(baselines, on=['CodigoSingular', 'CodigoTipoRecebimento'], how='inner')
+        valor = merged['valor'].astype('float').to_numpy()
+        mediana = merged['mediana'].astype('float').to_numpy()
+        mad = np.maximum(merged['mad'].astype('float').to_numpy(), 0.05 * np.abs(mediana))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            escore = np.where(mad > 0, 0.6745 * (valor - mediana) / mad, np.nan)
+            razao = np.where(mediana > 0, valor / mediana, np.nan)
+        fora_de_escala = (razao >= 10) | (razao <= 0.1)
+        fora_da_faixa = (valor > merged['maximo'].astype('float').to_numpy() * 1.1) | \
+                        (valor < merged['minimo'].astype('float').to_numpy() * 0.9)
+        atipico = fora_da_faixa & np.where(mad > 0, np.abs(escore) > threshold, fora_de_escala)
+        
+        merged['escore'] = np.round(escore, 1)
+        merged['razao'] = np.round(razao, 2)
+        merged['motivo'] = np.select(
+            [(razao >= 80) & (razao <= 120), (razao >= 1 / 120) & (razao <= 1 / 80), valor > mediana],
+            ["possível erro de escala (x100)", "possível erro de escala (/100)", "acima do histórico"],
+            default="abaixo do histórico"
+        )
+        review = merged[atipico].sort_values('linha', kind='stable')
+        review = review.assign(mediana=review['mediana'].round().astype('int64'))
+        return review[columns].reset_index(drop=True)
+    
+    def review_value_anomalies(self, df, source=None):
+        """Valores atípicos de um arquivo frente ao histórico (history_source), ou None sem histórico."""
+        if self.history_source is None:
+            return None
+        singulares = pd.to_numeric(df['CodigoSingular'], errors='coerce').dropna().unique()
+        history = self.history_source(singulares=singulares, exclude_arquivo=source)
+        return self.detect_value_anomalies(df, self.value_baselines(history))
+    
+    def enforce_error_budget(self, violations, budget=None, source=None):
+        """Levanta EntryValidationError se houver mais violações que o orçamento (None = sem limite)."""
+        budget = self.error_budget if budget is None else budget
+        if budget is not None and len(violations) > budget:
+            raise EntryValidationError(violations, budget, source)
+    
+    def ledger_frame(self, df):
+        """
+        Lançamentos de um DataFrame processado no formato do livro (JournalLedger).
+        
+        As linhas de IRRF herdam singular e tipo do lançamento que as gerou.
+        """
+        is_irrf = self.is_irrf_record(df)
+        frame = pd.DataFrame({
+            'debito': pd.to_numeric(df['Debito'], errors='coerce').astype('Int64'),
+            'credito': pd.to_numeric(df['Credito'], errors='coerce').astype('Int64'),
+            'historico': pd.to_numeric(df['Historico'], errors='coerce').astype('Int64'),
+            'data': pd.to_datetime(df['DATA'], dayfirst=True).dt.strftime('%Y-%m-%d'),
+            'valor': pd.to_numeric(df['valor'], errors='coerce').fillna(0).astype('int64'),
+            'complemento': df['complemento'].astype(str),
+            'codigo_singular': pd.to_numeric(df['CodigoSingular'], errors='coerce').astype('Int64') if 'CodigoSingular' in df.columns else pd.NA,
+            'nome_singular': df['NomeSingular'].astype(object) if 'NomeSingular' in df.columns else None,
+            'tipo': df['Tipo'].astype(object) if 'Tipo' in df.columns else None,
+            'codigo_tipo_recebimento': pd.to_numeric(df['CodigoTipoRecebimento'], errors='coerce').astype('Int64') if 'CodigoTipoRecebimento' in df.columns else pd.NA,
+            'lancamento': np.where(is_irrf, 'irrf', 'original'),
+        }, index=df.index)
+        owners = self.irrf_owner_rows(df)
+        if len(owners):
+            for col in ('codigo_singular', 'nome_singular', 'tipo', 'codigo_tipo_recebimento'):
+                frame.loc[owners.index, col] = frame.loc[owners.to_numpy(), col].to_numpy()
+        return frame.reset_index(drop=True)
+    
+    DUPLICATE_KEY = ['CodigoSingular', 'NumeroDocumento', 'CodigoTipoRecebimento', 'ValorBruto', 'Tipo']
+    
+    def duplicate_keys(self, df):
+        """
+        Chave de duplicidade (DUPLICATE_KEY) normalizada dos lançamentos originais de
+        um DataFrame processado; as linhas de IRRF ficam de fora. ValorBruto vai em
+        centavos para que "121,22" e 121.22 coincidam.
+        """
+        originals = df[~self.is_irrf_record(df)]
+        documento = originals['NumeroDocumento'] if 'NumeroDocumento' in originals.columns else pd.Series(pd.NA, index=originals.index)
+        return pd.DataFrame({
+            'CodigoSingular': pd.to_numeric(originals['CodigoSingular'], errors='coerce').astype('Int64'),
+            'NumeroDocumento': documento.astype('string').str.strip().replace('', pd.NA),
+            'CodigoTipoRecebimento': pd.to_numeric(originals['CodigoTipoRecebimento'], errors='coerce').astype('Int64'),
+            'ValorBruto': self.normalize_cents_series(originals['ValorBruto']),
+            'Tipo': originals['Tipo'].astype('string').str.strip(),
+        }, index=originals.index)
+    
+    def irrf_owner_rows(self, df):
+        """
+        Para cada linha de IRRF, a linha do lançamento original que a gerou.
+        
+        process_dataframe acrescenta as linhas de IRRF ao final, na ordem dos
+        lançamentos com IRRF > 0. Retorna Series (índice da linha de IRRF ->
+        índice do original), vazia quando a estrutura não bate (ex.: edições).
+        """
+        is_irrf = self.is_irrf_record(df)
+        irrf_index = df.index[is_irrf.to_numpy()]
+        originals = df[~is_irrf]
+        with_irrf = originals.index[(self.normalize_cents_series(originals['IRRF']) > 0).to_numpy()] if 'IRRF' in df.columns else []
+        if len(irrf_index) != len(with_irrf):
+            return pd.Series(dtype='int64')
+        return pd.Series(np.asarray(with_irrf), index=irrf_index)
+    
+    def find_cross_file_duplicates(self, frames):
+        """
+        Localiza lançamentos repetidos entre arquivos diferentes.
+        
+        frames: dict nome do arquivo -> DataFrame processado, na ordem de seleção.
+        Monta um índice hash sobre DUPLICATE_KEY (groupby) em O(n): a primeira
+        ocorrência de cada chave é mantida e as repetições em arquivos seguintes são
+        marcadas; NumeroDocumento vazio conta como valor da chave. Repetições dentro
+        do mesmo arquivo não são tocadas. Retorna um DataFrame com uma linha por
+        lançamento duplicado (arquivo, linha, chave, NomeSingular, arquivo_original e
+        confirmado). Sem NumeroDocumento (layouts que não o trazem), lançamentos
+        diferentes podem coincidir na chave: esses saem com confirmado=False, como
+        possíveis duplicados.
+        """
+        columns = ['arquivo', 'linha'] + self.DUPLICATE_KEY + ['NomeSingular', 'arquivo_original', 'confirmado']
+        parts = []
+        for position, (filename, df) in enumerate(frames.items()):
+            keys = self.duplicate_keys(df)
+            keys['NomeSingular'] = df.loc[keys.index, 'NomeSingular'].astype(str)
+            keys['arquivo'] = filename
+            keys['ordem'] = position
+            keys['linha'] = keys.index
+            parts.append(keys)
+        if not parts:
+            return pd.DataFrame(columns=columns)
+        
+        keys = pd.concat(parts, ignore_index=True)
+        first = keys.groupby(self.DUPLICATE_KEY, sort=False, dropna=False)['ordem'].transform('min')
+        duplicates = keys[keys['ordem'] != first].copy()
+        first_files = pd.Series(list(frames), dtype=object)
+        duplicates['arquivo_original'] = first_files.iloc[first[duplicates.index]].to_numpy()
+        duplicates['confirmado'] = duplicates['NumeroDocumento'].notna().to_numpy(dtype=bool)
+        return duplicates[columns].reset_index(drop=True)
+    
+    def deduplicate_frames(self, frames, drop=True):
+        """
+        Consolida os DataFrames processados de vários arquivos verificando duplicidades.
+        
+        Com drop=True, os lançamentos duplicados confirmados (find_cross_file_duplicates,
+        com NumeroDocumento) e as linhas de IRRF geradas por eles são removidos antes da
+        consolidação; os possíveis duplicados (sem NumeroDocumento) e, com drop=False,
+        todos os duplicados apenas são informados. Retorna (DataFrame consolidado,
+        relatório de duplicados).
+        """
+        duplicates = self.find_cross_file_duplicates(frames)
+        removable = duplicates[duplicates['confirmado']]
+        kept = []
+        for filename, df in frames.items():
+            if drop and len(removable):
+                rows = removable.loc[removable['arquivo'] == filename, 'linha']
+                if len(rows):
+                    owners = self.irrf_owner_rows(df)
+                    rows = rows.tolist() + owners.index[owners.isin(rows)].tolist()
+                    df = df.drop(index=rows)
+            kept.append(df)
+        return apply_processed_schema(pd.concat(kept, ignore_index=True)), duplicates
+    
+    def is_irrf_record(self, df):
+        """Identifica registros de IRRF baseado no complemento."""
+        return (
+            df['complemento'].str.contains(r'\|\s*IRRF\s*$', case=False, na=False, regex=True) |
+            df['complemento'].str.endswith('IRRF', na=False) |
+            df['complemento'].str.contains(r'IRRF\s*$', case=False, na=False, regex=True)
+        )
@@ -0,0 +1,1021 @@
+"""
+Relatórios em PDF/CSV (ReportLab) a partir dos lançamentos processados.
+
+As funções recebem o NeodontoCsvProcessor que fornece as regras e a formatação;
+o processador as expõe como métodos generate_*, importando este módulo sob demanda.
+"""
+import os
+from contextlib import suppress
+from datetime import datetime
+
+import pandas as pd
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import cm, inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .config import ACCOUNTING_REPORTS, NOMES_CONTAS_CONTABEIS
+from .processor import format_cents_series
+from .storage import StreamingZipWriter
+
+
+def generate_accounting_reports(processor, df, output_dir, display_result=False, debug=False, zip_compresslevel=None,
+                                report_names=None, formats=('csv', 'pdf'), include_summary=None, build_zip=None,
+                                progress_callback=None):
+    """
+    Gera relatórios específicos solicitados pelo contador.
+
+    Relatórios gerados:
+    1. Taxas de Manutenção (3) - Para todas (operadoras e prestadoras)
+    2. Taxas de Marketing (4) - Para todas
+    3. Multas e Juros (5) - Para todas
+    4. Outras (6) - Para todas
+    5. Pré-pagamento (1) - Somente operadoras
+    6. Custo Operacional (2) - Somente operadoras
+    7. Pré-pagamento (1) - Somente prestadoras
+    8. Custo Operacional (2) - Somente prestadoras
+
+    Os arquivos são gravados em output_dir, que é obrigatório: quem chama é dono
+    do diretório (ex.: a entrada do ArtifactCache) e cuida de removê-lo.
+
+    Apenas os relatórios em report_names (padrão: todos) são materializados, nos
+    formatos pedidos em formats ('csv' e/ou 'pdf'). O resumo geral e o ZIP só são
+    gerados quando há mais de um artefato (ou quando include_summary/build_zip
+    são informados); ausentes, "summary_file" e "zip_file" retornam None.
+    progress_callback(fração, mensagem), se informado, é chamado antes de cada
+    relatório; exceções levantadas por ele interrompem a geração.
+
+    Os totais ("sum") de cada relatório são retornados em centavos. Cada PDF/CSV é
+    adicionado ao relatorios_contabeis.zip assim que é gerado.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Selecionar apenas os relatórios solicitados
+    if report_names is None:
+        reports_config = list(ACCOUNTING_REPORTS)
+    else:
+        known = {config["name"] for config in ACCOUNTING_REPORTS}
+        unknown = [name for name in report_names if name not in known]
+        if unknown:
+            raise ValueError(f"Relatórios desconhecidos: {', '.join(unknown)}")
+        reports_config = [config for config in ACCOUNTING_REPORTS if config["name"] in report_names]
+
+    formats = tuple(formats)
+    if not formats or any(fmt not in ('csv', 'pdf') for fmt in formats):
+        raise ValueError("formats deve conter 'csv' e/ou 'pdf'")
+
+    # Resumo geral e ZIP só quando há mais de um artefato
+    if include_summary is None:
+        include_summary = 'pdf' in formats and len(reports_config) > 1
+    if build_zip is None:
+        build_zip = len(reports_config) * len(formats) + int(include_summary) > 1
+
+    # Dicionário para armazenar resultados
+    results = {}
+    pdf_files = []
+    csv_files = []
+
+    # Configurar estilos para o PDF
+    styles = getSampleStyleSheet()
+
+    # Criar estilo personalizado para células da tabela
+    cell_style = styles['Normal'].clone('CellStyle')
+    cell_style.fontSize = 7
+    cell_style.leading = 9
+    cell_style.alignment = 0  # Alinhamento à esquerda
+    cell_style.wordWrap = 'CJK'
+
+    # Verificar se temos as colunas necessárias
+    required_columns = ['CodigoTipoRecebimento', 'TipoSingular', 'Tipo', 'DATA', 'valor', 'complemento', 'Debito', 'Credito', 'Historico']
+    missing_columns = [col for col in required_columns if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Colunas ausentes no DataFrame: {', '.join(missing_columns)}")
+
+    # ZIP com todos os relatórios, preenchido à medida que os arquivos são gerados
+    zip_file = None
+    zip_writer = None
+    if build_zip:
+        zip_file = os.path.join(output_dir, "relatorios_contabeis.zip")
+        zip_writer = StreamingZipWriter(zip_file, zip_compresslevel)
+
+    try:
+        # Cubo de resumo do conjunto (calculado uma vez e compartilhado com os demais resumos)
+        cube = processor.summary_cube(df)
+
+        # Iterar sobre cada configuração de relatório
+        total_steps = len(reports_config) + int(include_summary)
+        for step, report_config in enumerate(reports_config):
+            if progress_callback is not None:
+                progress_callback(step / total_steps, report_config["title"])
+
+            # Debug se solicitado
+            if debug:
+                processor.debug_report_data(df, f"Antes do filtro - {report_config['title']}")
+
+            # Filtrar os dados conforme os critérios
+            report_filters = {}
+            for key, value in report_config["filters"].items():
+                if key in df.columns:
+                    report_filters[key] = value
+                elif display_result:
+                    processor._notify('warning', f"Coluna {key} não encontrada para o relatório {report_config['title']}")
+
+            mask = pd.Series(True, index=df.index)
+            for key, value in report_filters.items():
+                mask &= (df[key] == value).fillna(False).astype(bool)
+            filtered_df = df[mask].copy()
+
+            # Debug após filtros se solicitado
+            if debug:
+                processor.debug_report_data(filtered_df, f"Após filtros - {report_config['title']}")
+
+            # Se não há dados para este relatório, continuar para o próximo
+            if filtered_df.empty:
+                if display_result:
+                    processor._notify('warning', f"Nenhum dado encontrado para {report_config['title']}")
+                results[report_config["name"]] = {"count": 0, "sum": 0, "file": None, "csv_file": None, "pdf_file": None}
+                continue
+
+            # Totalizações (do cubo de resumo, mesmos filtros do relatório)
+            record_count = processor.cube_sum(cube, 'registros', **report_filters)
+            total_value = processor.cube_sum(cube, 'valor', **report_filters)
+
+            # Nome do arquivo
+            csv_file = os.path.join(output_dir, f"{report_config['name']}.csv") if 'csv' in formats else None
+            pdf_file = os.path.join(output_dir, f"{report_config['name']}.pdf") if 'pdf' in formats else None
+
+            # Exportar para CSV
+            if csv_file:
+                processor.export_to_csv(filtered_df, csv_file)
+
+            if 'pdf' in formats:
+                # Adicionar descrições das contas contábeis
+                filtered_df['Debito_Desc'] = filtered_df['Debito'].apply(
+                    lambda x: f"{x} - {NOMES_CONTAS_CONTABEIS.get(int(x), 'Descrição não encontrada')}" if pd.notnull(x) and str(x).isdigit() else "")
+
+                filtered_df['Credito_Desc'] = filtered_df['Credito'].apply(
+                    lambda x: f"{x} - {NOMES_CONTAS_CONTABEIS.get(int(x), 'Descrição não encontrada')}" if pd.notnull(x) and str(x).isdigit() else "")
+
+                filtered_df['Historico_Desc'] = filtered_df['Historico'].apply(
+                    lambda x: f"{x} - {NOMES_CONTAS_CONTABEIS.get(int(x), 'Descrição não encontrada')}" if pd.notnull(x) and str(x).isdigit() else "")
+
+                # Gerar PDF com totalizações
+                doc = SimpleDocTemplate(pdf_file, pagesize=letter, leftMargin=1.2*cm, rightMargin=1.2*cm, topMargin=1.2*cm, bottomMargin=1.2*cm)
+                elements = []
+
+                # Título
+                elements.append(Paragraph(report_config["title"], styles['Title']))
+                elements.append(Spacer(1, 0.25 * inch))
+
+                # Dados do relatório
+                date_str = processor.format_date(filtered_df['DATA'].iloc[0]) if not filtered_df.empty else ""
+                elements.append(Paragraph(f"Data de referência: {date_str}", styles['Normal']))
+                elements.append(Spacer(1, 0.15 * inch))
+
+                # Totalizações
+
+                # Tabela de resumo
+                summary_data = [
+                    ["Total de registros", str(record_count)],
+                    ["Valor total", f"R$ {processor.format_currency(total_value)}"]
+                ]
+
+                summary_table = Table(summary_data, colWidths=[1.5*inch, 1.5*inch])
+                summary_table.setStyle(TableStyle([
+                    ('BACKGROUND', (0, 0), (-1, -1), colors.white),
+                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+                    ('ALIGN', (1, 0), (1, -1), 'RIGHT')
+                ]))
+
+                elements.append(summary_table)
+                elements.append(Spacer(1, 0.25 * inch))
+
+                # Tabela com os registros
+                # Selecionar e reordenar colunas para o relatório
+                display_df = filtered_df[['DATA', 'complemento', 'valor', 'Debito_Desc', 'Credito_Desc', 'Historico_Desc']].copy()
+                display_df.columns = ['Data', 'Complemento', 'Valor', 'Débito', 'Crédito', 'Histórico']
+                display_df['Data'] = display_df['Data'].map(processor.format_date)
+                display_df['Valor'] = "R$ " + format_cents_series(display_df['Valor'], thousands=True)
+
+                # Converter para lista para o relatório PDF
+                data = [display_df.columns.tolist()]
+                for _, row in display_df.iterrows():
+                    row_data = []
+                    for i, (col, val) in enumerate(row.items()):
+                        if col == 'Complemento':
+                            # Usar função auxiliar para quebra inteligente de linhas
+                            val_str = str(val)
+                            complemento_formatado = processor.truncate_lines(val_str, max_chars_per_line=40, max_lines=3)
+                            val = Paragraph(complemento_formatado, cell_style)
+                        elif col in ['Débito', 'Crédito']:
+                            # Quebrar descrições de contas em linhas
+                            val_str = str(val)
+                            if len(val_str) > 50:
+                                # Quebrar na primeira quebra natural (hífen ou espaço)
+                                if ' - ' in val_str:
+                                    parts = val_str.split(' - ', 1)
+                                    if len(parts) == 2:
+                                        text_content = f"{parts[0]}<br/>{parts[1][:30]}{'...' if len(parts[1]) > 30 else ''}"
+                                    else:
+                                        text_content = val_str[:50] + '...'
+                                else:
+                                    # Quebrar por palavras
+                                    words = val_str.split()
+                                    line1 = ""
+                                    line2 = ""
+                                    for word in words:
+                                        if len(line1 + " " + word) <= 25:
+                                            line1 += " " + word if line1 else word
+                                        elif len(line2 + " " + word) <= 25:
+                                            line2 += " " + word if line2 else word
+                                        else:
+                                            break
+                                    text_content = f"{line1}<br/>{line2}{'...' if len(' '.join(words)) > len(line1 + line2) else ''}"
+                                val = Paragraph(text_content, cell_style)
+                            else:
+                                val = Paragraph(val_str, cell_style)
+                        elif col == 'Histórico':
+                            # Histórico pode ser mais compacto
+                            val_str = str(val)
+                            if len(val_str) > 25:
+                                val = Paragraph(val_str[:22] + '...', cell_style)
+                            else:
+                                val = Paragraph(val_str, cell_style)
+                        else:
+                            val = str(val)
+
+                        row_data.append(val)
+                    data.append(row_data)
+
+                # Adicionar linha de total no final
+                total_row = ['', 'TOTAL', f"R$ {processor.format_currency(total_value)}", '', '', '']
+                data.append(total_row)
+
+                # Criar tabela com larguras de coluna otimizadas para retrato A4
+                col_widths = [0.6*inch, 1.8*inch, 0.7*inch, 1.4*inch, 1.4*inch, 0.8*inch]
+
+                # Estilo da tabela melhorado
+                table_style = TableStyle([
+                    # Cabeçalho
+                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                    ('FONTSIZE', (0, 0), (-1, 0), 9),
+                    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+                    ('TOPPADDING', (0, 0), (-1, 0), 8),
+
+                    # Dados
+                    ('BACKGROUND', (0, 1), (-1, -2), colors.white),
+                    ('ALIGN', (0, 1), (0, -1), 'CENTER'),  # Data centralizada
+                    ('ALIGN', (2, 1), (2, -1), 'RIGHT'),   # Valor à direita
+
+                    # Linha de total
+                    ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+                    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+                    ('FONTSIZE', (0, -1), (-1, -1), 8),
+                    ('ALIGN', (2, -1), (2, -1), 'RIGHT'),  # Total à direita
+
+                    # Borda
+                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+
+                    # Alinhamento vertical
+                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+
+                    # Padding interno das células
+                    ('LEFTPADDING', (0, 0), (-1, -1), 4),
+                    ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+                    ('TOPPADDING', (0, 1), (-1, -1), 6),
+                    ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+
+                    # Altura mínima das linhas para acomodar texto quebrado
+                    ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.lightgrey]),
+                ])
+
+                # Criar tabela com configurações melhoradas
+                table = Table(data, colWidths=col_widths, repeatRows=1, splitByRow=True, rowHeights=None)
+
+                # Aplicar o estilo à tabela
+                table.setStyle(table_style)
+                elements.append(table)
+
+                # Adicionar informações adicionais
+                elements.append(Spacer(1, 0.5 * inch))
+                elements.append(Paragraph(f"Relatório gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
+
+                # Gerar o PDF
+                doc.build(elements)
+
+            # Armazenar os resultados
+            results[report_config["name"]] = {
+                "count": record_count,
+                "sum": total_value,
+                "file": pdf_file or csv_file,
+                "csv_file": csv_file,
+                "pdf_file": pdf_file
+            }
+
+            for artifact, artifact_list in ((pdf_file, pdf_files), (csv_file, csv_files)):
+                if artifact:
+                    artifact_list.append(artifact)
+                    if zip_writer is not None:
+                        zip_writer.write_file(artifact)
+
+            if display_result:
+                processor._notify('success', f"✅ Relatório gerado: {report_config['title']} - {record_count} registros, Total: R$ {processor.format_currency(total_value)}")
+
+        # Criar um relatório de resumo geral (apenas quando há vários relatórios)
+        summary_file = None
+        if include_summary:
+            if progress_callback is not None:
+                progress_callback(len(reports_config) / total_steps, "Resumo dos Relatórios Contábeis")
+            summary_file = os.path.join(output_dir, "resumo_relatorios.pdf")
+            doc = SimpleDocTemplate(summary_file, pagesize=letter)
+            elements = []
+
+            # Título
+            elements.append(Paragraph("Resumo dos Relatórios Contábeis", styles['Title']))
+            elements.append(Spacer(1, 0.5 * inch))
+
+            # Tabela de resumo
+            summary_data = [["Relatório", "Registros", "Valor Total"]]
+            total_overall = 0
+
+            for report_config in reports_config:
+                report_name = report_config["name"]
+                if report_name in results:
+                    report_result = results[report_name]
+                    summary_data.append([
+                        report_config["title"],
+                        str(report_result["count"]),
+                        f"R$ {processor.format_currency(report_result['sum'])}"
+                    ])
+                    total_overall += report_result["sum"]
+
+            # Adicionar linha de total geral
+            summary_data.append(["TOTAL GERAL", "", f"R$ {processor.format_currency(total_overall)}"])
+
+            # Criar tabela (ajustada para formato retrato A4)
+            summary_table = Table(summary_data, colWidths=[3*inch, 0.8*inch, 1.2*inch])
+
+            # Estilo da tabela
+            summary_style = TableStyle([
+                # Cabeçalho
+                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+
+                # Dados
+                ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
+                ('ALIGN', (1, 1), (2, -1), 'RIGHT'),
+
+                # Total geral
+                ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+
+                # Borda
+                ('GRID', (0, 0), (-1, -1), 1, colors.black)
+            ])
+
+            summary_table.setStyle(summary_style)
+            elements.append(summary_table)
+
+            # Adicionar informações adicionais
+            elements.append(Spacer(1, 0.5 * inch))
+            elements.append(Paragraph(f"Resumo gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
+
+            # Gerar o PDF de resumo
+            doc.build(elements)
+            pdf_files.append(summary_file)
+
+            if display_result:
+                processor._notify('success', f"✅ Resumo geral gerado: {summary_file}")
+
+        # Concluir o ZIP com o resumo geral
+        if zip_writer is not None:
+            if summary_file:
+                zip_writer.write_file(summary_file)
+            zip_writer.close()
+    except BaseException:
+        # Cancelamento (JobCancelled) ou erro: fecha o ZIP e remove o arquivo incompleto
+        if zip_writer is not None:
+            with suppress(Exception):
+                zip_writer.close()
+            with suppress(OSError):
+                os.remove(zip_file)
+        raise
+
+    # Retornar informações sobre os relatórios e o arquivo ZIP
+    return {
+        "reports": results,
+        "summary_file": summary_file,
+        "zip_file": zip_file
+    }
+
+
+def generate_unified_report(processor, df, output_dir, display_result=False):
+    """
+    Gera um relatório simples: CSV convertido em PDF + página de resumo.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Verificar se temos as colunas necessárias
+    required_columns = ['Tipo', 'DATA', 'valor', 'complemento', 'Debito', 'Credito', 'Historico']
+    missing_columns = [col for col in required_columns if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Colunas ausentes no DataFrame: {', '.join(missing_columns)}")
+
+    # Cubo de resumo do conjunto, calculado uma vez para os totais e as contagens
+    cube = processor.summary_cube(df)
+
+    # Calcular IRRF usando a nova função que pega dos dados originais
+    irrf_info = processor.calculate_irrf_from_original_data(df, cube)
+
+    # Usar valores calculados da função
+    valor_bruto_a_pagar = irrf_info['valor_bruto_a_pagar']
+    valor_bruto_a_receber = irrf_info['valor_bruto_a_receber']
+    valor_liquido_a_pagar = irrf_info['valor_liquido_a_pagar']
+    valor_liquido_a_receber = irrf_info['valor_liquido_a_receber']
+    saldo_liquido = valor_liquido_a_receber - valor_liquido_a_pagar
+    saldo_bruto = valor_bruto_a_receber - valor_bruto_a_pagar
+
+    # Contar registros originais (não lançamentos de IRRF) pelo cubo de resumo
+    count_a_pagar = processor.cube_sum(cube, 'registros', lancamento='original', Tipo='A pagar')
+    count_a_receber = processor.cube_sum(cube, 'registros', lancamento='original', Tipo='A receber')
+
+    # Configurar estilos para o PDF
+    styles = getSampleStyleSheet()
+
+    # Criar estilo personalizado para células da tabela
+    cell_style = styles['Normal'].clone('CellStyle')
+    cell_style.fontSize = 7
+    cell_style.leading = 9
+    cell_style.alignment = 0
+    cell_style.wordWrap = 'CJK'
+
+    # Nome do arquivo
+    pdf_file = os.path.join(output_dir, "relatorio_camara_compensacao.pdf")
+
+    # Gerar PDF
+    doc = SimpleDocTemplate(pdf_file, pagesize=letter, 
+                          leftMargin=1.2*cm, rightMargin=1.2*cm, 
+                          topMargin=1.2*cm, bottomMargin=1.2*cm)
+    elements = []
+
+    # Função para criar tabela simples do CSV
+    def create_csv_table(data_df, section_title):
+        section_elements = []
+
+        if data_df.empty:
+            section_elements.append(Paragraph(f"{section_title} - Nenhum registro encontrado", styles['Heading2']))
+            return section_elements, 0, 0
+
+        # Título da seção
+        section_elements.append(Paragraph(section_title, styles['Heading2']))
+        section_elements.append(Spacer(1, 0.1 * inch))
+
+        # Preparar dados para a tabela (formato CSV simples)
+        table_data = [['Data', 'Complemento', 'Valor Bruto', 'IRRF', 'Valor Líquido', 'Débito', 'Crédito', 'Histórico']]
+
+        # Linhas e totais já calculados e formatados em bloco
+        rows, totals = processor.unified_report_rows(data_df)
+        for row in rows.itertuples(index=False):
+            table_data.append([
+                row.data,
+                Paragraph(row.complemento, cell_style),
+                row.valor_bruto,
+                row.irrf,
+                row.valor_liquido,
+                row.debito,
+                row.credito,
+                row.historico
+            ])
+        total_irrf = totals['irrf']
+        total_liquido = totals['valor_liquido']
+
+        # Totais removidos - já estão no resumo da primeira página
+
+        # Configurar larguras das colunas (ajustadas para formato retrato A4)
+        col_widths = [0.6*inch, 3.2*inch, 0.7*inch, 0.5*inch, 0.7*inch, 0.7*inch, 0.7*inch, 0.6*inch]
+
+        # Criar tabela com suporte a quebra de linha
+        table = Table(table_data, colWidths=col_widths, repeatRows=1, splitByRow=True)
+
+        # Estilo da tabela com suporte a quebra de linha
+        table_style = TableStyle([
+            # Cabeçalho
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+            ('TOPPADDING', (0, 0), (-1, 0), 6),
+
+            # Dados
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('ALIGN', (0, 1), (0, -1), 'CENTER'),  # Data centralizada
+            ('ALIGN', (2, 1), (4, -1), 'RIGHT'),   # Valores à direita
+            ('ALIGN', (5, 1), (-1, -1), 'CENTER'), # Códigos centralizados
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),   # Alinhamento vertical superior
+            ('FONTSIZE', (0, 1), (-1, -1), 7),
+
+            # Bordas simples
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+
+            # Padding ajustado para texto com quebra
+            ('LEFTPADDING', (0, 0), (-1, -1), 4),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+            ('TOPPADDING', (0, 1), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+
+            # Alternância de cores nas linhas para melhor legibilidade
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+        ])
+
+        table.setStyle(table_style)
+        section_elements.append(table)
+        section_elements.append(Spacer(1, 0.2 * inch))
+
+        return section_elements, total_liquido, total_irrf
+
+# Removido método truncate_lines conforme solicitado
+
+    # PÁGINA 1: RESUMO EXECUTIVO
+    elements.append(Paragraph("RELATÓRIO DA CÂMARA DE COMPENSAÇÃO", styles['Title']))
+    elements.append(Spacer(1, 0.3 * inch))
+
+    # Calcular totais para o resumo
+    total_a_pagar_liquido = valor_liquido_a_pagar
+    total_a_receber_liquido = valor_liquido_a_receber
+    total_irrf_a_pagar = irrf_info['irrf_a_pagar']
+    total_irrf_a_receber = irrf_info['irrf_a_receber']
+
+    # Separar dados por tipo para exibição
+    df_a_pagar = df[df['Tipo'] == 'A pagar'].copy()
+    df_a_receber = df[df['Tipo'] == 'A receber'].copy()
+
+    # Data de referência
+    date_str = processor.format_date(df['DATA'].iloc[0]) if not df.empty else ""
+    elements.append(Paragraph(f"Data de referência: {date_str}", styles['Normal']))
+    elements.append(Spacer(1, 0.3 * inch))
+
+    # Tabela de resumo executivo atualizada
+    resumo_data = [
+        ['RESUMO EXECUTIVO', '', '', '', ''],
+        ['Categoria', 'Registros', 'Valor Bruto', 'IRRF', 'Valor Líquido'],
+        ['A Pagar', str(count_a_pagar), 
+         processor.format_currency(valor_bruto_a_pagar), 
+         processor.format_currency(irrf_info['irrf_a_pagar']),
+         processor.format_currency(valor_liquido_a_pagar)],
+        ['A Receber', str(count_a_receber), 
+         processor.format_currency(valor_bruto_a_receber), 
+         processor.format_currency(irrf_info['irrf_a_receber']),
+         processor.format_currency(valor_liquido_a_receber)],
+        ['', '', '', '', ''],
+        ['SALDO BRUTO', '', processor.format_currency(saldo_bruto), '', ''],
+        ['SALDO LÍQUIDO', '', '', '', processor.format_currency(saldo_liquido)]
+    ]
+
+    resumo_table = Table(resumo_data, colWidths=[1.5*inch, 0.8*inch, 1*inch, 0.8*inch, 1*inch])
+
+    resumo_style = TableStyle([
+        # Título
+        ('SPAN', (0, 0), (-1, 0)),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.darkgrey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+
+        # Cabeçalho
+        ('BACKGROUND', (0, 1), (-1, 1), colors.grey),
+        ('TEXTCOLOR', (0, 1), (-1, 1), colors.whitesmoke),
+        ('ALIGN', (0, 1), (-1, 1), 'CENTER'),
+        ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 1), (-1, 1), 9),
+
+        # Dados
+        ('BACKGROUND', (0, 2), (-1, 4), colors.white),
+        ('ALIGN', (1, 2), (-1, -1), 'RIGHT'),
+        ('FONTSIZE', (0, 2), (-1, 4), 9),
+
+        # Saldo
+        ('BACKGROUND', (0, 5), (-1, -1), colors.lightgrey),
+        ('FONTNAME', (0, 5), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 5), (-1, -1), 10),
+        ('ALIGN', (4, 5), (4, -1), 'RIGHT'),
+
+        # Bordas
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+
+        # Padding
+        ('LEFTPADDING', (0, 0), (-1, -1), 8),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ])
+
+    resumo_table.setStyle(resumo_style)
+    elements.append(resumo_table)
+
+    # PÁGINA 2: DETALHAMENTO A PAGAR
+    from reportlab.platypus import PageBreak
+    elements.append(PageBreak())
+
+    a_pagar_elements, _, _ = create_csv_table(df[df['Tipo'] == 'A pagar'], "DETALHAMENTO - A PAGAR")
+    elements.extend(a_pagar_elements)
+
+    # PÁGINA 3: DETALHAMENTO A RECEBER
+    elements.append(PageBreak())
+
+    a_receber_elements, _, _ = create_csv_table(df[df['Tipo'] == 'A receber'], "DETALHAMENTO - A RECEBER")
+    elements.extend(a_receber_elements)
+
+    # Informações finais
+    elements.append(Spacer(1, 0.3 * inch))
+    elements.append(Paragraph(f"Relatório gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
+
+    # Gerar o PDF
+    doc.build(elements)
+
+    if display_result:
+        processor._notify('success', f"✅ Relatório unificado gerado com sucesso!")
+        processor._notify('info', f"📊 A Pagar: {count_a_pagar} registros - {processor.format_currency(valor_liquido_a_pagar)}")
+        processor._notify('info', f"📈 A Receber: {count_a_receber} registros - {processor.format_currency(valor_liquido_a_receber)}")
+        processor._notify('info', f"🧾 IRRF Total: {processor.format_currency(irrf_info['total_irrf'])} (A Pagar: {processor.format_currency(irrf_info['irrf_a_pagar'])}, A Receber: {processor.format_currency(irrf_info['irrf_a_receber'])})")
+        processor._notify('info', f"💰 Saldo Bruto: {processor.format_currency(saldo_bruto)}")
+        processor._notify('info', f"💰 Saldo Líquido: {processor.format_currency(saldo_liquido)}")
+
+    return {
+        "pdf_file": pdf_file,
+        "total_a_pagar": valor_liquido_a_pagar,
+        "total_a_receber": valor_liquido_a_receber,
+        "count_a_pagar": count_a_pagar,
+        "count_a_receber": count_a_receber,
+        "saldo": saldo_liquido,
+        "irrf_info": irrf_info,
+        "valor_bruto_a_pagar": valor_bruto_a_pagar,
+        "valor_bruto_a_receber": valor_bruto_a_receber,
+        "saldo_bruto": saldo_bruto
+    }
+
+
+def generate_irrf_report(processor, df, output_dir, display_result=False):
+    """
+    Gera relatório específico de IRRF (Imposto de Renda Retido na Fonte).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Calcular IRRF usando a nova função de dados originais
+    irrf_info = processor.calculate_irrf_from_original_data(df)
+
+    if irrf_info['total_irrf'] == 0:
+        if display_result:
+            processor._notify('warning', "Nenhum registro com IRRF encontrado nos dados originais.")
+        return None
+
+    # Filtrar apenas registros que têm IRRF > 0 nos dados originais
+    mask_nao_irrf = ~processor.is_irrf_record(df)
+    df_original = df[mask_nao_irrf].copy()
+
+    if 'IRRF' in df_original.columns:
+        df_original['IRRF_normalizado'] = processor.normalize_cents_series(df_original['IRRF'])
+        df_irrf = df_original[df_original['IRRF_normalizado'] > 0].copy()
+    else:
+        df_irrf = pd.DataFrame()
+
+    # Configurar estilos para o PDF
+    styles = getSampleStyleSheet()
+
+    # Criar estilo personalizado para células da tabela
+    cell_style = styles['Normal'].clone('CellStyle')
+    cell_style.fontSize = 8
+    cell_style.leading = 10
+    cell_style.alignment = 0
+    cell_style.wordWrap = 'CJK'
+
+    # Nome do arquivo
+    pdf_file = os.path.join(output_dir, "relatorio_irrf.pdf")
+
+    # Gerar PDF
+    doc = SimpleDocTemplate(pdf_file, pagesize=letter, 
+                          leftMargin=1.2*cm, rightMargin=1.2*cm, 
+                          topMargin=1.2*cm, bottomMargin=1.2*cm)
+    elements = []
+
+    # Título principal
+    elements.append(Paragraph("RELATÓRIO DE IRRF - IMPOSTO DE RENDA RETIDO NA FONTE", styles['Title']))
+    elements.append(Spacer(1, 0.3 * inch))
+
+    # Data de referência
+    date_str = processor.format_date(df_irrf['DATA'].iloc[0]) if not df_irrf.empty else ""
+    elements.append(Paragraph(f"Data de referência: {date_str}", styles['Normal']))
+    elements.append(Spacer(1, 0.2 * inch))
+
+    # Preparar dados para a tabela
+    table_data = [['Tipo', 'Entidade', 'Valor IRRF', 'Observação']]
+
+    for _, row in df_irrf.iterrows():
+        # Valor do IRRF vem da coluna IRRF_normalizado
+        valor_irrf = row.get('IRRF_normalizado', 0)
+
+        # Formatar entidade (nome mais curto)
+        entidade = str(row.get('NomeSingular', 'N/A'))
+        if len(entidade) > 30:
+            entidade = entidade[:27] + '...'
+
+        table_data.append([
+            row['Tipo'],
+            Paragraph(entidade, cell_style),
+            processor.format_currency(valor_irrf),
+            "IRRF dos dados originais"
+        ])
+
+    # Adicionar linha de total
+    table_data.append([
+        '',
+        Paragraph('<b>TOTAL</b>', cell_style),
+        f'<b>{processor.format_currency(irrf_info["total_irrf"])}</b>',
+        ''
+    ])
+
+    # Configurar larguras das colunas (ajustadas para formato retrato A4)
+    col_widths = [0.8*inch, 1.8*inch, 1*inch, 1.8*inch]
+
+    # Criar tabela
+    table = Table(table_data, colWidths=col_widths, repeatRows=1, splitByRow=True)
+
+    # Estilo da tabela
+    table_style = TableStyle([
+        # Cabeçalho
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+        ('TOPPADDING', (0, 0), (-1, 0), 6),
+
+        # Dados
+        ('BACKGROUND', (0, 1), (-1, -2), colors.white),
+        ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),   # Valores à direita
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('FONTSIZE', (0, 1), (-1, -2), 7),
+
+        # Linha de total
+        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, -1), (-1, -1), 8),
+        ('ALIGN', (2, -1), (-1, -1), 'RIGHT'),
+
+        # Bordas
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+
+        # Padding
+        ('LEFTPADDING', (0, 0), (-1, -1), 3),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 3),
+        ('TOPPADDING', (0, 1), (-1, -1), 4),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 4),
+
+        # Alternância de cores nas linhas
+        ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.lightgrey]),
+    ])
+
+    table.setStyle(table_style)
+    elements.append(table)
+
+    # Resumo estatístico
+    elements.append(Spacer(1, 0.3 * inch))
+    elements.append(Paragraph("RESUMO ESTATÍSTICO", styles['Heading2']))
+    elements.append(Spacer(1, 0.1 * inch))
+
+    resumo_data = [
+        ['Categoria', 'Registros', 'Total IRRF'],
+        ['A Pagar', str(len(df_irrf[df_irrf['Tipo'] == 'A pagar'])), processor.format_currency(irrf_info['irrf_a_pagar'])],
+        ['A Receber', str(len(df_irrf[df_irrf['Tipo'] == 'A receber'])), processor.format_currency(irrf_info['irrf_a_receber'])],
+        ['TOTAL GERAL', str(irrf_info['registros_com_irrf']), processor.format_currency(irrf_info['total_irrf'])]
+    ]
+
+    resumo_table = Table(resumo_data, colWidths=[1.5*inch, 1.2*inch, 1.3*inch])
+    resumo_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, 1), (-1, -2), colors.white),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('LEFTPADDING', (0, 0), (-1, -1), 6),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+        ('TOPPADDING', (0, 0), (-1, -1), 5),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+    ]))
+
+    elements.append(resumo_table)
+
+    # Informações finais
+    elements.append(Spacer(1, 0.3 * inch))
+    elements.append(Paragraph("OBSERVAÇÕES:", styles['Heading3']))
+    elements.append(Paragraph("• Registros de IRRF identificados através da palavra 'IRRF' no complemento", styles['Normal']))
+    elements.append(Paragraph("• Valores apresentados são os valores dos registros contábeis de IRRF", styles['Normal']))
+    elements.append(Paragraph("• IRRF A Pagar: valores deduzidos dos pagamentos", styles['Normal']))
+    elements.append(Paragraph("• IRRF A Receber: valores deduzidos dos recebimentos", styles['Normal']))
+    elements.append(Spacer(1, 0.2 * inch))
+    elements.append(Paragraph(f"Relatório gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
+
+    # Gerar o PDF
+    doc.build(elements)
+
+    if display_result:
+        processor._notify('success', f"✅ Relatório de IRRF gerado com sucesso!")
+        processor._notify('info', f"📊 Total de registros com IRRF: {irrf_info['registros_com_irrf']}")
+        processor._notify('info', f"💰 Total IRRF: {processor.format_currency(irrf_info['total_irrf'])}")
+        processor._notify('info', f"🔸 IRRF A Pagar: {processor.format_currency(irrf_info['irrf_a_pagar'])}")
+        processor._notify('info', f"🔹 IRRF A Receber: {processor.format_currency(irrf_info['irrf_a_receber'])}")
+
+    return {
+        "pdf_file": pdf_file,
+        "total_irrf": irrf_info['total_irrf'],
+        "total_registros": irrf_info['registros_com_irrf'],
+        "irrf_a_pagar": irrf_info['irrf_a_pagar'],
+        "irrf_a_receber": irrf_info['irrf_a_receber']
+    }
+
+
+def generate_netting_report(processor, df, output_dir, display_result=False, max_pdf_rows=40):
+    """
+    Gera a compensação por singular: CSV completo + PDF de uma página.
+
+    O PDF lista as max_pdf_rows contrapartes de maior saldo líquido (em módulo),
+    agrupa as demais em uma linha e traz o total geral; o CSV traz todas.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    netting = processor.calculate_netting(df)
+
+    # CSV completo
+    csv_file = os.path.join(output_dir, "compensacao_por_singular.csv")
+    with open(csv_file, 'w', encoding='utf-8') as f:
+        f.write(processor.netting_to_csv_string(netting))
+
+    value_columns = ['a_receber_bruto', 'irrf_a_receber', 'a_pagar_bruto', 'irrf_a_pagar', 'saldo_bruto', 'saldo_liquido']
+    totals = {col: int(netting[col].sum()) for col in value_columns}
+
+    # Linhas do PDF: maiores saldos + demais agrupados
+    ordered = netting.iloc[netting['saldo_liquido'].abs().sort_values(ascending=False, kind='stable').index]
+    shown = ordered.head(max_pdf_rows)
+    rest = ordered.iloc[max_pdf_rows:]
+
+    styles = getSampleStyleSheet()
+    cell_style = styles['Normal'].clone('CellStyle')
+    cell_style.fontSize = 6.5
+    cell_style.leading = 7.5
+
+    def money(series):
+        return format_cents_series(series.reset_index(drop=True), thousands=True).tolist()
+
+    table_data = [['Código', 'Singular', 'A Receber', 'IRRF Rec.', 'A Pagar', 'IRRF Pag.', 'Saldo Bruto', 'Saldo Líquido']]
+    formatted = [money(shown[col]) for col in value_columns]
+    codigos = shown['CodigoSingular'].astype('string').fillna('').astype(str).tolist()
+    nomes = shown['NomeSingular'].astype(str).tolist()
+    for i in range(len(shown)):
+        nome = nomes[i] if len(nomes[i]) <= 38 else nomes[i][:35] + '...'
+        table_data.append([codigos[i], Paragraph(nome, cell_style)] + [values[i] for values in formatted])
+    if not rest.empty:
+        table_data.append(['', f"Demais ({len(rest)} singulares)"] +
+                          [processor.format_currency(int(rest[col].sum())) for col in value_columns])
+    table_data.append(['', 'TOTAL'] + [processor.format_currency(totals[col]) for col in value_columns])
+
+    pdf_file = os.path.join(output_dir, "compensacao_por_singular.pdf")
+    doc = SimpleDocTemplate(pdf_file, pagesize=letter,
+                            leftMargin=1*cm, rightMargin=1*cm,
+                            topMargin=1*cm, bottomMargin=1*cm)
+    elements = []
+    elements.append(Paragraph("COMPENSAÇÃO POR SINGULAR", styles['Title']))
+    date_str = processor.format_date(df['DATA'].dropna().iloc[0]) if df['DATA'].notna().any() else ""
+    elements.append(Paragraph(f"Data de referência: {date_str} · {len(netting)} singulares · "
+                              f"saldo positivo = valor líquido a receber da singular", styles['Normal']))
+    elements.append(Spacer(1, 0.15 * inch))
+
+    table = Table(table_data, colWidths=[0.5*inch, 2.3*inch, 0.75*inch, 0.6*inch, 0.75*inch, 0.6*inch, 0.75*inch, 0.8*inch])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTSIZE', (0, 0), (-1, -1), 6.5),
+        ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.whitesmoke]),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('TOPPADDING', (0, 0), (-1, -1), 1.5),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 1.5),
+        ('LEFTPADDING', (0, 0), (-1, -1), 2),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 2),
+    ]))
+    elements.append(table)
+    elements.append(Spacer(1, 0.1 * inch))
+    elements.append(Paragraph(f"Relatório gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')} · "
+                              f"detalhamento completo em compensacao_por_singular.csv", styles['Normal']))
+    doc.build(elements)
+
+    if display_result:
+        processor._notify('success', f"✅ Compensação por singular gerada: {len(netting)} singulares")
+        processor._notify('info', f"💰 Saldo Líquido: {processor.format_currency(totals['saldo_liquido'])}")
+
+    return {
+        "pdf_file": pdf_file,
+        "csv_file": csv_file,
+        "singulares": len(netting),
+        **totals
+    }
+
+
+def generate_trial_balance_report(processor, df, output_dir, display_result=False, by_month=False):
+    """Gera o balancete (CSV + PDF) a partir do DataFrame processado ou do livro."""
+    os.makedirs(output_dir, exist_ok=True)
+
+    balance = processor.calculate_trial_balance(df, by_month=by_month)
+    check = processor.trial_balance_check(balance)
+
+    csv_file = os.path.join(output_dir, "balancete.csv")
+    with open(csv_file, 'w', encoding='utf-8') as f:
+        f.write(processor.trial_balance_to_csv_string(balance))
+
+    styles = getSampleStyleSheet()
+    cell_style = styles['Normal'].clone('CellStyle')
+    cell_style.fontSize = 7
+    cell_style.leading = 8
+
+    def money(series):
+        return format_cents_series(series.reset_index(drop=True), thousands=True).tolist()
+
+    month_column = ['Mês'] if by_month else []
+    table_data = [month_column + ['Conta', 'Descrição', 'Débitos', 'Créditos', 'Saldo', 'D/C']]
+    debitos, creditos, saldos = money(balance['debitos']), money(balance['creditos']), money(balance['saldo'].abs())
+    contas = balance['conta'].astype('string').fillna('—').astype(str).tolist()
+    descricoes = balance['descricao'].tolist()
+    naturezas = balance['natureza'].tolist()
+    meses = balance['mes'].tolist() if by_month else None
+    for i in range(len(balance)):
+        row = [meses[i]] if by_month else []
+        table_data.append(row + [contas[i], Paragraph(descricoes[i], cell_style), debitos[i], creditos[i], saldos[i], naturezas[i]])
+    table_data.append(([''] if by_month else []) + ['', 'TOTAL', processor.format_currency(check['total_debitos']),
+                                                    processor.format_currency(check['total_creditos']),
+                                                    processor.format_currency(abs(check['diferenca'])), ''])
+
+    pdf_file = os.path.join(output_dir, "balancete.pdf")
+    doc = SimpleDocTemplate(pdf_file, pagesize=letter,
+                            leftMargin=1.5*cm, rightMargin=1.5*cm,
+                            topMargin=1.5*cm, bottomMargin=1.5*cm)
+    elements = []
+    elements.append(Paragraph("BALANCETE DE VERIFICAÇÃO", styles['Title']))
+    datas = pd.to_datetime(df['DATA' if 'DATA' in df.columns else 'data'], dayfirst=True).dropna()
+    periodo = f"{processor.format_date(datas.min())} a {processor.format_date(datas.max())}" if len(datas) else ""
+    situacao = "débitos = créditos" if check['equilibrado'] else f"DIFERENÇA de {processor.format_currency(check['diferenca'])}"
+    if check['sem_conta']:
+        situacao += f" · {check['sem_conta']} linha(s) SEM CONTA"
+    elements.append(Paragraph(f"Período: {periodo} · {check['contas']} contas · {situacao}", styles['Normal']))
+    elements.append(Spacer(1, 0.15 * inch))
+
+    widths = [3.8*inch, 0.95*inch, 0.95*inch, 0.95*inch, 0.35*inch]
+    col_widths = ([0.6*inch] if by_month else []) + [0.6*inch] + [widths[0] - (0.6*inch if by_month else 0)] + widths[1:]
+    table = Table(table_data, colWidths=col_widths, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTSIZE', (0, 0), (-1, -1), 7),
+        ('ALIGN', (-4, 1), (-1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.whitesmoke]),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ]))
+    elements.append(table)
+    elements.append(Spacer(1, 0.1 * inch))
+    elements.append(Paragraph(f"Relatório gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
+    doc.build(elements)
+
+    if display_result:
+        if check['equilibrado']:
+            processor._notify('success', f"✅ Balancete gerado: {check['contas']} contas, débitos = créditos")
+        else:
+            processor._notify('error', f"❌ Balancete desequilibrado: diferença de {processor.format_currency(check['diferenca'])}")
+
+    return {
+        "pdf_file": pdf_file,
+        "csv_file": csv_file,
+        **check
+    }
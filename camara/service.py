@@ -0,0 +1,414 @@
+"""
+Serviço HTTP local para outros sistemas (ex.: importação no ERP).
+
+    python -m camara servico [--host 127.0.0.1] [--porta 8503]
+
+    POST   /tarefas?arquivo=<nome.csv>[&relatorios=unificado,irrf,...][&data=AAAA-MM-DD][&limite_violacoes=N]
+           corpo = conteúdo do CSV                  -> 202 {"id": ..., "status": ...}
+    GET    /tarefas                                 tarefas conhecidas
+    GET    /tarefas/<id>                            situação, mensagens e arquivos gerados
+    GET    /tarefas/<id>/arquivos/<nome>            download de um arquivo gerado
+    DELETE /tarefas/<id>                            cancela a tarefa (ou a remove, se encerrada)
+    GET    /saude                                   situação do pool de processos e do cache
+
+A recepção é assíncrona (asyncio, biblioteca padrão) e o processamento e a
+renderização rodam em um WorkerPool próprio do serviço. O corpo da requisição é
+gravado em disco em blocos enquanto o hash é calculado; um arquivo já processado
+com a mesma configuração é servido do cache de artefatos, assim como relatórios
+já gerados (inclusive pela interface, quando CAMARA_CACHE_DIR é compartilhado).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from .config import (CACHE_DIR, SERVICE_HOST, SERVICE_MAX_PENDING, SERVICE_MAX_UPLOAD_MB, SERVICE_PORT,
+                     VALIDATION_ERROR_BUDGET)
+from .jobs import (REPORT_KINDS, JobCancelled, ProcessingFailed, WorkerPool, artifact_files, default_report_options,
+                   process_file_cached)
+from .processor import RunConfig
+from .storage import ArtifactCache
+
+logger = logging.getLogger(__name__)
+
+READ_BLOCK = 64 * 1024
+HTTP_STATUS = {
+    200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    410: "Gone", 411: "Length Required", 413: "Payload Too Large", 415: "Unsupported Media Type",
+    431: "Request Header Fields Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HttpError(Exception):
+    """Erro devolvido ao cliente como {"erro": mensagem} com o status informado."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ServiceTask:
+    """Arquivo enviado ao serviço: processamento, relatórios pedidos e arquivos gerados."""
+
+    FINISHED = ("concluído", "erro", "cancelado")
+
+    def __init__(self, client, arquivo, config, reports):
+        self.task_id = uuid.uuid4().hex[:12]
+        self.client = client
+        self.arquivo = arquivo
+        self.config = config
+        self.reports = reports
+        self.status = "recebendo"
+        self.progress = (0.0, "")
+        self.created_at = datetime.now()
+        self.finished_at = None
+        self.sha256 = None
+        self.size = 0
+        self.summary = None
+        self.cached = {}     # etapa -> veio do cache
+        self.artifacts = {}  # nome do arquivo -> caminho (no cache de artefatos)
+        self.error = None
+        self._cancel = threading.Event()
+
+    @property
+    def active(self):
+        return self.status not in self.FINISHED
+
+    def report_progress(self, fraction, message=""):
+        self.progress = (fraction, message)
+
+    def _finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self.finished_at = datetime.now()
+
+    def to_dict(self):
+        fraction, message = self.progress
+        return {
+            "id": self.task_id,
+            "arquivo": self.arquivo,
+            "status": self.status,
+            "progresso": round(fraction, 3),
+            "etapa": message,
+            "erro": self.error,
+            "sha256": self.sha256,
+            "bytes": self.size,
+            "data": self.config.reference_date.strftime("%Y-%m-%d"),
+            "relatorios": list(self.reports),
+            "cache": self.cached,
+            "resumo": self.summary,
+            "arquivos": {name: f"/tarefas/{self.task_id}/arquivos/{name}" for name in self.artifacts},
+            "criada_em": self.created_at.isoformat(timespec="seconds"),
+            "encerrada_em": self.finished_at.isoformat(timespec="seconds") if self.finished_at else None,
+        }
+
+
+class ProcessingService:
+    """
+    Servidor HTTP (asyncio) com as tarefas em memória. Cada cliente (cabeçalho
+    X-Cliente ou endereço de origem) tem sua fila no WorkerPool, atendida em
+    rodízio com as dos demais.
+    """
+
+    def __init__(self, host=None, port=None, pool=None, cache=None, max_upload_mb=None,
+                 max_pending=None, spool_dir=None, keep_finished=200):
+        self.host = host or SERVICE_HOST
+        self.port = SERVICE_PORT if port is None else port
+        # Sem sessões do Streamlit neste processo: as tarefas nunca são dadas como abandonadas
+        self.pool = pool or WorkerPool(is_session_alive=lambda client: True)
+        self.cache = cache or ArtifactCache()
+        self.max_upload_bytes = (max_upload_mb or SERVICE_MAX_UPLOAD_MB) * 1024 * 1024
+        self.max_pending = max_pending or SERVICE_MAX_PENDING
+        self.spool_dir = spool_dir or os.path.join(CACHE_DIR, "servico")
+        self.keep_finished = keep_finished
+        self.tasks = {}
+        self._executor = ThreadPoolExecutor(max_workers=self.max_pending, thread_name_prefix="servico")
+        self._server = None
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Serviço em http://%s:%s", self.host, self.port)
+        return self._server
+
+    async def serve_forever(self):
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        for task in self.tasks.values():
+            task._cancel.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- HTTP -----------------------------------------------------------------
+
+    async def _handle(self, reader, writer):
+        try:
+            try:
+                method, path, query, headers = await self._read_head(reader)
+                await self._route(method, path, query, headers, reader, writer)
+            except HttpError as e:
+                await self._send_json(writer, e.status, {"erro": str(e)})
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            except Exception as e:
+                logger.exception("Erro ao atender a requisição")
+                await self._send_json(writer, 500, {"erro": f"{type(e).__name__}: {e}"})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_head(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise HttpError(431, "Cabeçalho muito grande")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Requisição inválida")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        return method.upper(), unquote(url.path).rstrip("/") or "/", query, headers
+
+    async def _route(self, method, path, query, headers, reader, writer):
+        parts = path.strip("/").split("/")
+        if parts == ["saude"] and method == "GET":
+            return await self._send_json(writer, 200, self.health())
+        if parts[0] != "tarefas":
+            raise HttpError(404, "Caminho não encontrado")
+        if len(parts) == 1:
+            if method == "GET":
+                return await self._send_json(writer, 200, {"tarefas": [task.to_dict() for task in self.tasks.values()]})
+            if method == "POST":
+                peer = writer.get_extra_info("peername")
+                client = headers.get("x-cliente") or (peer[0] if peer else "local")
+                task = await self._receive(client, query, headers, reader, writer)
+                return await self._send_json(writer, 202, task.to_dict())
+            raise HttpError(405, "Use GET ou POST em /tarefas")
+
+        task = self.tasks.get(parts[1])
+        if task is None:
+            raise HttpError(404, "Tarefa não encontrada")
+        if len(parts) == 2:
+            if method == "GET":
+                return await self._send_json(writer, 200, task.to_dict())
+            if method == "DELETE":
+                if task.active:
+                    task._cancel.set()
+                else:
+                    del self.tasks[task.task_id]
+                return await self._send_json(writer, 200, task.to_dict())
+            raise HttpError(405, "Use GET ou DELETE em /tarefas/<id>")
+        if len(parts) == 4 and parts[2] == "arquivos" and method == "GET":
+            file_path = task.artifacts.get(parts[3])
+            if file_path is None:
+                raise HttpError(404, "Arquivo não encontrado na tarefa")
+            if not os.path.isfile(file_path):
+                raise HttpError(410, "Arquivo removido do cache de artefatos; envie o arquivo novamente")
+            return await self._send_file(writer, file_path)
+        raise HttpError(404, "Caminho não encontrado")
+
+    async def _send(self, writer, status, headers, body=b""):
+        lines = [f"HTTP/1.1 {status} {HTTP_STATUS.get(status, '')}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        lines += ["Connection: close", "", ""]
+        writer.write("\r\n".join(lines).encode("latin-1") + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        await self._send(writer, status, {"Content-Type": "application/json; charset=utf-8",
+                                          "Content-Length": len(body)}, body)
+
+    async def _send_file(self, writer, file_path):
+        name = os.path.basename(file_path)
+        await self._send(writer, 200, {
+            "Content-Type": mimetypes.guess_type(name)[0] or "application/octet-stream",
+            "Content-Length": os.path.getsize(file_path),
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(name)}",
+        })
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(READ_BLOCK), b""):
+                writer.write(block)
+                await writer.drain()
+
+    # --- Tarefas --------------------------------------------------------------
+
+    def _parse_request(self, query):
+        arquivo = os.path.basename(query.get("arquivo", "").strip())
+        if not arquivo:
+            raise HttpError(400, "Informe o nome do arquivo em ?arquivo=<nome.csv>")
+        reports = [kind for kind in query.get("relatorios", "").split(",") if kind]
+        unknown = [kind for kind in reports if kind not in REPORT_KINDS]
+        if unknown:
+            raise HttpError(400, f"Relatórios desconhecidos: {', '.join(unknown)} "
+                                 f"(disponíveis: {', '.join(REPORT_KINDS)})")
+        try:
+            error_budget = int(query["limite_violacoes"]) if "limite_violacoes" in query else VALIDATION_ERROR_BUDGET
+            if "data" in query:
+                config = RunConfig(reference_date=datetime.strptime(query["data"], "%Y-%m-%d"),
+                                   error_budget=error_budget)
+            else:
+                config = RunConfig.default(error_budget=error_budget)
+        except ValueError:
+            raise HttpError(400, "Parâmetros inválidos: data=AAAA-MM-DD, limite_violacoes=N")
+        return arquivo, config, list(dict.fromkeys(reports))
+
+    async def _receive(self, client, query, headers, reader, writer):
+        """Valida o pedido, grava o corpo em disco calculando o hash e agenda o processamento."""
+        arquivo, config, reports = self._parse_request(query)
+        if headers.get("content-type", "").startswith("multipart/"):
+            raise HttpError(415, "Envie o CSV como corpo da requisição (ex.: curl --data-binary @arquivo.csv)")
+        chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+        if not chunked and "content-length" not in headers:
+            raise HttpError(411, "Informe Content-Length ou use Transfer-Encoding: chunked")
+        if sum(task.active for task in self.tasks.values()) >= self.max_pending:
+            raise HttpError(503, f"Limite de {self.max_pending} tarefas pendentes atingido; tente novamente")
+
+        task = ServiceTask(client, arquivo, config, reports)
+        self.tasks[task.task_id] = task
+        upload_path = os.path.join(self.spool_dir, f"{task.task_id}.csv")
+        try:
+            if headers.get("expect", "").lower() == "100-continue":
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                await writer.drain()
+            digest = hashlib.sha256()
+            with open(upload_path, "wb") as spool:
+                async for block in self._body_blocks(reader, headers, chunked):
+                    task.size += len(block)
+                    if task.size > self.max_upload_bytes:
+                        raise HttpError(413, f"Arquivo acima do limite de {self.max_upload_bytes // (1024 * 1024)} MB")
+                    digest.update(block)
+                    spool.write(block)
+        except BaseException as e:
+            if os.path.exists(upload_path):
+                os.remove(upload_path)
+            task._finish("erro", error=str(e) or type(e).__name__)
+            raise
+        task.sha256 = digest.hexdigest()
+        task.status = "na fila"
+        self._prune()
+
+        asyncio.get_running_loop().run_in_executor(self._executor, self._execute, task, upload_path)
+        return task
+
+    async def _body_blocks(self, reader, headers, chunked):
+        if not chunked:
+            remaining = int(headers["content-length"])
+            while remaining > 0:
+                block = await reader.read(min(READ_BLOCK, remaining))
+                if not block:
+                    raise HttpError(400, "Corpo da requisição incompleto")
+                remaining -= len(block)
+                yield block
+            return
+        while True:
+            size_line = await reader.readline()
+            try:
+                size = int(size_line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise HttpError(400, "Codificação chunked inválida")
+            if size == 0:
+                # Trailers opcionais até a linha vazia
+                while (await reader.readline()).strip():
+                    pass
+                return
+            while size > 0:
+                block = await reader.read(min(READ_BLOCK, size))
+                if not block:
+                    raise HttpError(400, "Corpo da requisição incompleto")
+                size -= len(block)
+                yield block
+            await reader.readexactly(2)
+
+    def _prune(self):
+        """Esquece as tarefas encerradas mais antigas além de keep_finished."""
+        finished = [task for task in self.tasks.values() if not task.active]
+        for task in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.tasks[task.task_id]
+
+    def _execute(self, task, upload_path):
+        """Processamento e relatórios de uma tarefa (em thread; o trabalho pesado vai ao pool)."""
+        task.status = "executando"
+        try:
+            try:
+                summary = self._process(task, upload_path)
+            finally:
+                os.remove(upload_path)
+            if task.reports:
+                self._render_reports(task, summary)
+            task.report_progress(1.0, "Concluído")
+            task._finish("concluído")
+        except ProcessingFailed as e:
+            task.summary = e.summary
+            task._finish("erro", error=str(e))
+        except JobCancelled:
+            task._finish("cancelado")
+        except Exception as e:
+            logger.warning("Tarefa %s (%s) falhou: %s", task.task_id, task.arquivo, e)
+            task._finish("erro", error=f"{type(e).__name__}: {e}")
+
+    def _process(self, task, upload_path):
+        task.report_progress(0.0, "Processando o arquivo")
+        summary, cached = process_file_cached(self.pool, self.cache, task.client, upload_path, task.arquivo,
+                                              task.config, sha256=task.sha256, cancel_event=task._cancel)
+        task.cached["contabil"] = cached
+        task.summary = {name: value for name, value in summary.items() if not name.endswith("_file")}
+        task.artifacts[os.path.basename(summary["contabil_file"])] = summary["contabil_file"]
+        return summary
+
+    def _render_reports(self, task, summary):
+        import pandas as pd
+
+        df = pd.read_pickle(summary["dados_file"])
+        for i, kind in enumerate(task.reports):
+            if task._cancel.is_set():
+                raise JobCancelled()
+            task.report_progress((i + 1) / (len(task.reports) + 1), f"Relatório: {kind}")
+            options = default_report_options(kind)
+
+            def build(output_dir, kind=kind, options=options):
+                return self.pool.run(task.client, "relatorios", kind, df, options, output_dir,
+                                     cancel_event=task._cancel)
+
+            result, cached = self.cache.get_or_build(df, kind, options, build)
+            task.cached[kind] = cached
+            for file_path in artifact_files(result):
+                name = os.path.basename(file_path)
+                task.artifacts[name if name not in task.artifacts else f"{kind}_{name}"] = file_path
+
+    def health(self):
+        statuses = {}
+        for task in self.tasks.values():
+            statuses[task.status] = statuses.get(task.status, 0) + 1
+        return {"status": "ok", "tarefas": statuses, "pool": self.pool.stats(), "cache": self.cache.stats()}
+
+
+def serve(host=None, port=None):
+    """Executa o serviço até ser interrompido (Ctrl+C / SIGTERM do systemd)."""
+    service = ProcessingService(host=host, port=port)
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
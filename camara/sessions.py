@@ -0,0 +1,225 @@
+"""DataFrames mantidos por sessão, com orçamento de memória e descarga em disco."""
+import os
+import shutil
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+from datetime import datetime
+
+import pandas as pd
+
+from .config import CACHE_DIR, SESSION_MEMORY_BUDGET_MB
+
+
+class SessionDataManager:
+    """
+    Guarda os DataFrames de uma sessão do Streamlit uma única vez por arquivo.
+
+    Para cada arquivo são mantidos o DataFrame original (mapeado) e o processado.
+    Edições feitas na aba "Edição de Dados" são guardadas como sobreposição
+    (coluna -> {linha: valor}) sobre o original, sem cópias completas. Quando o
+    total em memória ultrapassa o orçamento da sessão, os DataFrames menos
+    usados recentemente são gravados no cache em disco e recarregados sob demanda.
+    """
+
+    # Registro de todas as sessões ativas no processo (para a página de diagnóstico)
+    _registry = weakref.WeakValueDictionary()
+
+    def __init__(self, session_id=None, budget_mb=None, cache_dir=None):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.budget_bytes = int((budget_mb if budget_mb is not None else SESSION_MEMORY_BUDGET_MB) * 1024 * 1024)
+        self.cache_dir = os.path.join(cache_dir or CACHE_DIR, "sessoes", self.session_id)
+        self.created_at = datetime.now()
+
+        self._frames = OrderedDict()  # (arquivo, tipo) -> DataFrame em memória, em ordem LRU
+        self._spilled = {}            # (arquivo, tipo) -> caminho do pickle em disco
+        self._sizes = {}              # (arquivo, tipo) -> bytes ocupados
+        self._fingerprints = {}       # arquivo -> impressão digital do original
+        self._overlays = {}           # arquivo -> {coluna: {linha: valor}}
+        self._lock = threading.RLock()
+
+        SessionDataManager._registry[self.session_id] = self
+        # Remove os arquivos em disco quando a sessão é descartada
+        weakref.finalize(self, shutil.rmtree, self.cache_dir, True)
+
+    @classmethod
+    def all_sessions(cls):
+        """Retorna as sessões ativas no processo."""
+        return list(cls._registry.values())
+
+    @staticmethod
+    def _fingerprint(df):
+        """Impressão digital barata do conteúdo de um DataFrame."""
+        if df is None:
+            return None
+        return (df.shape, int(pd.util.hash_pandas_object(df, index=False).sum()))
+
+    def _store(self, filename, kind, df):
+        key = (filename, kind)
+        self._drop(key)
+        if df is None:
+            return
+        self._frames[key] = df
+        self._sizes[key] = int(df.memory_usage(deep=True).sum())
+        self._enforce_budget(keep=key)
+
+    def _drop(self, key):
+        self._frames.pop(key, None)
+        self._sizes.pop(key, None)
+        path = self._spilled.pop(key, None)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def _load(self, filename, kind):
+        key = (filename, kind)
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                return self._frames[key]
+            path = self._spilled.pop(key, None)
+            if path is None:
+                return None
+            df = pd.read_pickle(path)
+            os.remove(path)
+            self._frames[key] = df
+            self._enforce_budget(keep=key)
+            return df
+
+    def _enforce_budget(self, keep=None):
+        """Grava em disco os DataFrames menos usados até caber no orçamento."""
+        while self.memory_bytes() > self.budget_bytes:
+            victim = next((k for k in self._frames if k != keep), None)
+            if victim is None:
+                break
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = os.path.join(self.cache_dir, f"{uuid.uuid4().hex}.pkl")
+            self._frames.pop(victim).to_pickle(path)
+            self._spilled[victim] = path
+
+    def put_file(self, filename, processed_df, original_df):
+        """
+        Registra um arquivo processado. Se o mesmo conteúdo já estiver na sessão,
+        mantém o que existe (inclusive edições e reprocessamentos).
+        """
+        fingerprint = self._fingerprint(original_df)
+        with self._lock:
+            if filename in self._fingerprints and self._fingerprints[filename] == fingerprint:
+                return
+            self._fingerprints[filename] = fingerprint
+            self._overlays.pop(filename, None)
+            self._store(filename, "original", original_df)
+            self._store(filename, "processed", processed_df)
+
+    def retain_files(self, filenames):
+        """Remove da sessão os arquivos que não estão em `filenames`."""
+        with self._lock:
+            for filename in [f for f in self.files() if f not in filenames]:
+                self.remove_file(filename)
+
+    def remove_file(self, filename):
+        with self._lock:
+            self._fingerprints.pop(filename, None)
+            self._overlays.pop(filename, None)
+            for kind in ("original", "processed"):
+                self._drop((filename, kind))
+
+    def files(self):
+        return list(self._fingerprints.keys())
+
+    def has_files(self):
+        return bool(self._fingerprints)
+
+    def processed(self, filename):
+        """DataFrame processado mais recente (reprocessado, se houve edição)."""
+        return self._load(filename, "processed")
+
+    def original(self, filename):
+        """DataFrame original mapeado, sem edições."""
+        return self._load(filename, "original")
+
+    def set_processed(self, filename, processed_df):
+        """Substitui o DataFrame processado (ex.: após reprocessar edições)."""
+        with self._lock:
+            self._store(filename, "processed", processed_df)
+
+    def is_edited(self, filename):
+        return bool(self._overlays.get(filename))
+
+    def apply_edits(self, filename, changes):
+        """
+        Registra edições na sobreposição do arquivo.
+
+        Args:
+            filename: Nome do arquivo
+            changes: Dicionário {posição da linha: {coluna: novo valor}}
+        """
+        with self._lock:
+            overlay = self._overlays.setdefault(filename, {})
+            for position, values in changes.items():
+                for column, value in values.items():
+                    overlay.setdefault(column, {})[int(position)] = value
+
+    def edited(self, filename):
+        """Retorna uma cópia do original com as edições aplicadas."""
+        original = self.original(filename)
+        if original is None:
+            return None
+        df = original.copy()
+        for column, updates in self._overlays.get(filename, {}).items():
+            positions = list(updates.keys())
+            if column not in df.columns:
+                df[column] = None
+            col_idx = df.columns.get_loc(column)
+            try:
+                df.iloc[positions, col_idx] = list(updates.values())
+            except (TypeError, ValueError):
+                df[column] = df[column].astype(object)
+                df.iloc[positions, col_idx] = list(updates.values())
+        return df
+
+    def memory_bytes(self):
+        return sum(self._sizes[k] for k in self._frames)
+
+    def disk_bytes(self):
+        return sum(os.path.getsize(p) for p in self._spilled.values() if os.path.exists(p))
+
+    def footprint(self):
+        """Resumo do consumo da sessão, por arquivo."""
+        rows = []
+        with self._lock:
+            for filename in self.files():
+                for kind in ("original", "processed"):
+                    key = (filename, kind)
+                    if key in self._frames:
+                        local = "memória"
+                    elif key in self._spilled:
+                        local = "disco"
+                    else:
+                        continue
+                    rows.append({
+                        "arquivo": filename,
+                        "tipo": kind,
+                        "local": local,
+                        "MB": round(self._sizes.get(key, 0) / (1024 * 1024), 2),
+                        "células editadas": sum(len(v) for v in self._overlays.get(filename, {}).values()) if kind == "original" else 0,
+                    })
+            return {
+                "session_id": self.session_id,
+                "criada_em": self.created_at,
+                "arquivos": len(self._fingerprints),
+                "memoria_mb": round(self.memory_bytes() / (1024 * 1024), 2),
+                "disco_mb": round(self.disk_bytes() / (1024 * 1024), 2),
+                "orcamento_mb": round(self.budget_bytes / (1024 * 1024), 2),
+                "detalhes": pd.DataFrame(rows),
+            }
+
+
+def process_rss_mb():
+    """Memória residente atual do processo (MB), quando disponível."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, IndexError):
+        return None
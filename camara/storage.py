@@ -0,0 +1,462 @@
+"""Armazenamento em disco: ZIP em streaming, cache de artefatos e livro de lançamentos (SQLite)."""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+import zipfile
+from contextlib import closing, contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from .config import (ARTIFACT_CACHE_MB, ARTIFACT_MAX_AGE_HOURS, CACHE_DIR, LEDGER_PATH,
+                     REPORT_LAYOUT_VERSION, RULES_VERSION, ZIP_COMPRESSLEVEL, ZIP_STORED_EXTENSIONS)
+
+
+class StreamingZipWriter:
+    """
+    Escreve um ZIP incrementalmente em um arquivo ou stream (inclusive não posicionável).
+    Cada artefato é comprimido assim que é adicionado; PDFs e outros formatos já
+    comprimidos entram com ZIP_STORED.
+    """
+    
+    def __init__(self, target, compresslevel=None):
+        self.compresslevel = ZIP_COMPRESSLEVEL if compresslevel is None else int(compresslevel)
+        self._zip = zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED, compresslevel=self.compresslevel)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def _compression(self, arcname):
+        if self.compresslevel == 0 or arcname.lower().endswith(ZIP_STORED_EXTENSIONS):
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+    
+    def _entry(self, arcname):
+        # Com o nome, o ZipFile aplica o próprio nível de compressão; ZIP_STORED exige um ZipInfo
+        if self._compression(arcname) == zipfile.ZIP_DEFLATED:
+            return arcname
+        info = zipfile.ZipInfo(arcname, date_time=datetime.now().timetuple()[:6])
+        info.compress_type = zipfile.ZIP_STORED
+        info.external_attr = 0o644 << 16
+        return info
+    
+    def write_file(self, path, arcname=None):
+        """Adiciona um arquivo do disco (lido em blocos)."""
+        arcname = arcname or os.path.basename(path)
+        self._zip.write(path, arcname, compress_type=self._compression(arcname),
+                        compresslevel=self.compresslevel)
+    
+    def write_chunks(self, arcname, chunks):
+        """Adiciona um artefato a partir de um iterável de blocos (str ou bytes)."""
+        with self._zip.open(self._entry(arcname), 'w', force_zip64=True) as entry:
+            for chunk in chunks:
+                entry.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+    
+    def write_bytes(self, arcname, data):
+        """Adiciona um artefato a partir de um buffer em memória."""
+        self.write_chunks(arcname, [data])
+    
+    def close(self):
+        self._zip.close()
+
+
+class ArtifactCache:
+    """
+    Cache em disco dos artefatos de relatórios, endereçado pelo conteúdo.
+
+    A chave é o hash do DataFrame de entrada, do tipo de relatório, da configuração
+    pedida e das versões de regras (RULES_VERSION) e de layout
+    (REPORT_LAYOUT_VERSION). Cada entrada é um diretório com os arquivos gerados e
+    um resultado.json com o dicionário retornado pelo gerador. Entradas mais
+    antigas que o limite de idade ou além do limite de tamanho são removidas
+    (as menos usadas primeiro).
+    """
+
+    RESULT_FILE = "resultado.json"
+    PATH_MARKER = "@artefato@"
+    MISSING = object()  # entrada ausente (o resultado em cache pode ser None)
+
+    def __init__(self, cache_dir=None, max_mb=None, max_age_hours=None):
+        self.cache_dir = os.path.join(cache_dir or CACHE_DIR, "artefatos")
+        self.max_bytes = int((max_mb if max_mb is not None else ARTIFACT_CACHE_MB) * 1024 * 1024)
+        self.max_age_seconds = (max_age_hours if max_age_hours is not None else ARTIFACT_MAX_AGE_HOURS) * 3600
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def frame_digest(df):
+        """Hash do conteúdo de um DataFrame (colunas, tipos e valores)."""
+        digest = hashlib.sha256()
+        digest.update(json.dumps([[str(col), str(dtype)] for col, dtype in df.dtypes.items()]).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    def key(self, df, report_type, config=None):
+        """Chave do artefato para (entrada, tipo de relatório, configuração, versões)."""
+        return self.digest_key(self.frame_digest(df), report_type, config)
+
+    @staticmethod
+    def file_digest(source):
+        """Hash (sha256) do conteúdo de um arquivo (caminho ou objeto de arquivo), lido em blocos."""
+        digest = hashlib.sha256()
+        if hasattr(source, 'read'):
+            source.seek(0)
+            for block in iter(lambda: source.read(1024 * 1024), b''):
+                digest.update(block.encode('utf-8') if isinstance(block, str) else block)
+            source.seek(0)
+            return digest.hexdigest()
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def digest_key(self, digest, report_type, config=None):
+        """Chave do artefato a partir do hash já calculado da entrada (DataFrame ou arquivo)."""
+        payload = json.dumps({
+            "frame": digest,
+            "report_type": report_type,
+            "config": config or {},
+            "rules": RULES_VERSION,
+            "layout": REPORT_LAYOUT_VERSION,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+    @classmethod
+    def _rebase(cls, value, old, new):
+        """Troca o prefixo dos caminhos contidos no resultado."""
+        if isinstance(value, dict):
+            return {k: cls._rebase(v, old, new) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [cls._rebase(v, old, new) for v in value]
+        if isinstance(value, str) and value.startswith(old):
+            return new + value[len(old):]
+        return value
+
+    def get(self, key):
+        """Resultado em cache para a chave, ou None."""
+        result = self._load(key)
+        return None if result is self.MISSING else result
+
+    def _load(self, key):
+        """Resultado em cache para a chave (pode ser None, ex.: relatório sem dados), ou MISSING."""
+        entry_dir = os.path.join(self.cache_dir, key)
+        result_path = os.path.join(entry_dir, self.RESULT_FILE)
+        try:
+            with open(result_path, encoding='utf-8') as f:
+                stored = json.load(f)
+            os.utime(result_path)  # marca como usada recentemente
+        except (OSError, ValueError):
+            return self.MISSING
+        return self._rebase(stored, self.PATH_MARKER, entry_dir)
+
+    def put(self, key, build):
+        """Executa build(diretorio) e guarda os arquivos gerados e o resultado sob a chave."""
+        result = self._put(key, build)
+        if result is self.MISSING:
+            # Entrada removida por outra tarefa antes de ser lida: uma nova tentativa
+            result = self._put(key, build)
+        if result is self.MISSING:
+            raise OSError(f"Artefato {key} removido do cache antes de ser lido")
+        return result
+
+    def _put(self, key, build):
+        staging_dir = os.path.join(self.cache_dir, f"_tmp_{key}_{uuid.uuid4().hex[:8]}")
+        os.makedirs(staging_dir)
+        try:
+            result = build(staging_dir)
+            with open(os.path.join(staging_dir, self.RESULT_FILE), 'w', encoding='utf-8') as f:
+                json.dump(self._rebase(result, staging_dir, self.PATH_MARKER), f)
+            try:
+                os.rename(staging_dir, os.path.join(self.cache_dir, key))
+            except OSError:
+                # Outra tarefa gravou a mesma chave primeiro
+                shutil.rmtree(staging_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        # A entrada recém-gravada fica fora desta remoção, mesmo maior que o limite: quem
+        # pediu recebe os arquivos, e a próxima remoção a descarta se for preciso
+        self.evict(keep=key)
+        return self._load(key)
+
+    def get_or_build(self, df, report_type, config, build):
+        """Retorna (resultado, veio_do_cache), gerando os artefatos só quando necessário."""
+        return self.get_or_put(self.key(df, report_type, config), build)
+
+    def get_or_put(self, key, build):
+        """Como get_or_build, para uma chave já calculada (ver digest_key)."""
+        result = self._load(key)
+        with self._lock:
+            if result is not self.MISSING:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if result is not self.MISSING:
+            return result, True
+        return self.put(key, build), False
+
+    def entries(self):
+        """Lista (chave, bytes, último uso) das entradas completas."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            result_path = os.path.join(entry_dir, self.RESULT_FILE)
+            if name.startswith("_tmp_") or not os.path.exists(result_path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+            entries.append((name, size, os.path.getmtime(result_path)))
+        return entries
+
+    def evict(self, keep=None):
+        """
+        Remove entradas vencidas e, se preciso, as menos usadas até caber no limite.
+        keep: chave que não deve ser removida (ex.: a entrada que acabou de ser gravada).
+        """
+        now = datetime.now().timestamp()
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for name, size, used_at in entries:
+            if now - used_at <= self.max_age_seconds and total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+            total -= size
+            removed += 1
+        # Diretórios temporários abandonados (ex.: processo interrompido)
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith("_tmp_") and now - os.path.getmtime(path) > self.max_age_seconds:
+                shutil.rmtree(path, ignore_errors=True)
+        return removed
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            "entradas": len(entries),
+            "tamanho_mb": round(sum(size for _, size, _ in entries) / (1024 * 1024), 2),
+            "limite_mb": round(self.max_bytes / (1024 * 1024), 1),
+            "acertos": self.hits,
+            "faltas": self.misses,
+        }
+
+
+class JournalLedger:
+    """
+    Livro de lançamentos em SQLite.
+    
+    Cada arquivo processado é gravado em uma transação (tabela cargas + lançamentos);
+    as cargas são identificadas pelo nome do arquivo: regravar um nome substitui a
+    carga anterior (ver load_info para avisar antes), e o mesmo conteúdo não é
+    regravado. Índices por conta (débito e crédito), data e singular permitem
+    consultar o histórico sem reenviar os CSVs.
+    """
+    
+    COLUMNS = ['debito', 'credito', 'historico', 'data', 'valor', 'complemento',
+               'codigo_singular', 'nome_singular', 'tipo', 'codigo_tipo_recebimento', 'lancamento']
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cargas (
+            id INTEGER PRIMARY KEY,
+            arquivo TEXT NOT NULL UNIQUE,
+            conteudo TEXT,
+            registros INTEGER NOT NULL DEFAULT 0,
+            gravado_em TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS lancamentos (
+            id INTEGER PRIMARY KEY,
+            carga_id INTEGER NOT NULL REFERENCES cargas(id) ON DELETE CASCADE,
+            debito INTEGER,
+            credito INTEGER,
+            historico INTEGER,
+            data TEXT,
+            valor INTEGER NOT NULL,
+            complemento TEXT,
+            codigo_singular INTEGER,
+            nome_singular TEXT,
+            tipo TEXT,
+            codigo_tipo_recebimento INTEGER,
+            lancamento TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_lancamentos_debito ON lancamentos(debito, data);
+        CREATE INDEX IF NOT EXISTS idx_lancamentos_credito ON lancamentos(credito, data);
+        CREATE INDEX IF NOT EXISTS idx_lancamentos_data ON lancamentos(data);
+        CREATE INDEX IF NOT EXISTS idx_lancamentos_singular ON lancamentos(codigo_singular, codigo_tipo_recebimento);
+        CREATE INDEX IF NOT EXISTS idx_lancamentos_nome ON lancamentos(nome_singular COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS idx_lancamentos_carga ON lancamentos(carga_id);
+    """
+    
+    def __init__(self, path=None):
+        self.path = path or LEDGER_PATH
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Livros criados antes da coluna codigo_tipo_recebimento
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(lancamentos)")}
+            if existing and 'codigo_tipo_recebimento' not in existing:
+                conn.execute("ALTER TABLE lancamentos ADD COLUMN codigo_tipo_recebimento INTEGER")
+                conn.execute("DROP INDEX IF EXISTS idx_lancamentos_singular")
+            conn.executescript(self.SCHEMA)
+    
+    def _connect(self):
+        # Uma conexão por operação: as chamadas vêm de sessões e threads diferentes
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+    
+    @contextmanager
+    def loader(self, arquivo, conteudo=None):
+        """
+        Transação de gravação de um arquivo; devolve uma função add(ledger_frame)
+        que pode ser chamada várias vezes (ex.: um bloco por vez no modo streaming).
+        
+        A carga anterior do arquivo só é substituída se o bloco terminar sem erro:
+        uma exceção ou add.abort() (ex.: processamento rejeitado) desfaz a
+        transação inteira e mantém a carga anterior.
+        """
+        aborted = False
+        
+        def abort():
+            nonlocal aborted
+            aborted = True
+        
+        with closing(self._connect()) as conn:
+            try:
+                conn.execute("DELETE FROM cargas WHERE arquivo = ?", (arquivo,))
+                carga_id = conn.execute(
+                    "INSERT INTO cargas (arquivo, conteudo, gravado_em) VALUES (?, ?, ?)",
+                    (arquivo, conteudo, datetime.now().isoformat(timespec='seconds'))
+                ).lastrowid
+                
+                def add(frame):
+                    values = frame[self.COLUMNS].astype(object).where(frame[self.COLUMNS].notna(), None)
+                    conn.executemany(
+                        f"INSERT INTO lancamentos (carga_id, {', '.join(self.COLUMNS)}) "
+                        f"VALUES ({carga_id}, {', '.join('?' * len(self.COLUMNS))})",
+                        values.itertuples(index=False, name=None)
+                    )
+                    conn.execute("UPDATE cargas SET registros = registros + ? WHERE id = ?", (len(frame), carga_id))
+                
+                add.abort = abort
+                yield add
+            except BaseException:
+                conn.rollback()
+                raise
+            if aborted:
+                conn.rollback()
+            else:
+                conn.commit()
+    
+    def load_info(self, arquivo):
+        """Carga gravada para o arquivo (conteudo, registros, gravado_em), ou None."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT conteudo, registros, gravado_em FROM cargas WHERE arquivo = ?", (arquivo,)
+            ).fetchone()
+        return None if row is None else dict(zip(('conteudo', 'registros', 'gravado_em'), row))
+    
+    def record(self, arquivo, frame):
+        """Grava os lançamentos de um arquivo. Retorna False se o conteúdo já estava gravado."""
+        conteudo = ArtifactCache.frame_digest(frame)
+        existing = self.load_info(arquivo)
+        if existing is not None and existing['conteudo'] == conteudo:
+            return False
+        with self.loader(arquivo, conteudo) as add:
+            add(frame)
+        return True
+    
+    def remove(self, arquivo):
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute("DELETE FROM cargas WHERE arquivo = ?", (arquivo,))
+    
+    def query(self, conta=None, inicio=None, fim=None, singular=None, nome=None, arquivo=None, limite=None):
+        """
+        Lançamentos filtrados, em um DataFrame (valor em centavos).
+        
+        conta: código contábil no débito ou no crédito; inicio/fim: datas (inclusive);
+        singular: código do singular; nome: parte do nome do singular (sem distinção
+        de caixa); arquivo: nome do arquivo de origem.
+        """
+        where, params = [], []
+        if inicio is not None:
+            where.append("l.data >= ?")
+            params.append(pd.Timestamp(inicio).strftime('%Y-%m-%d'))
+        if fim is not None:
+            where.append("l.data <= ?")
+            params.append(pd.Timestamp(fim).strftime('%Y-%m-%d'))
+        if singular is not None:
+            where.append("l.codigo_singular = ?")
+            params.append(int(singular))
+        if nome:
+            where.append("l.nome_singular LIKE ?")
+            params.append(f"%{nome}%")
+        if arquivo:
+            where.append("c.arquivo = ?")
+            params.append(arquivo)
+        
+        select = (f"SELECT c.arquivo, {', '.join('l.' + col for col in self.COLUMNS)} "
+                  "FROM lancamentos l JOIN cargas c ON c.id = l.carga_id")
+        if conta is not None:
+            # Duas consultas indexadas (débito e crédito) em vez de um OR sem índice; UNION ALL
+            # mantém lançamentos idênticos, e o lado do crédito exclui os que já entraram pelo débito
+            parts = [
+                f"{select} WHERE {' AND '.join(where + ['l.debito = ?'])}",
+                f"{select} WHERE {' AND '.join(where + ['l.credito = ?', 'l.debito IS NOT ?'])}",
+            ]
+            sql = f"{parts[0]} UNION ALL {parts[1]}"
+            params = params + [int(conta)] + params + [int(conta), int(conta)]
+        else:
+            sql = select + (f" WHERE {' AND '.join(where)}" if where else "")
+        sql = f"SELECT * FROM ({sql}) ORDER BY data, arquivo"
+        if limite:
+            sql += f" LIMIT {int(limite)}"
+        
+        with closing(self._connect()) as conn:
+            result = pd.read_sql_query(sql, conn, params=params)
+        for col in ('debito', 'credito', 'historico', 'codigo_singular', 'codigo_tipo_recebimento'):
+            result[col] = result[col].astype('Int64')
+        return result
+    
+    def history(self, singulares=None, exclude_arquivo=None):
+        """
+        Valores (centavos) dos lançamentos originais já gravados, por singular e
+        CodigoTipoRecebimento, para as linhas de base de detect_value_anomalies.
+        """
+        where = ["l.lancamento = 'original'", "l.codigo_singular IS NOT NULL", "l.codigo_tipo_recebimento IS NOT NULL"]
+        params = []
+        if singulares is not None:
+            singulares = [int(code) for code in singulares]
+            if not singulares:
+                return pd.DataFrame(columns=['codigo_singular', 'codigo_tipo_recebimento', 'valor'])
+            where.append(f"l.codigo_singular IN ({', '.join('?' * len(singulares))})")
+            params.extend(singulares)
+        if exclude_arquivo:
+            where.append("c.arquivo != ?")
+            params.append(exclude_arquivo)
+        sql = ("SELECT l.codigo_singular, l.codigo_tipo_recebimento, l.valor "
+               "FROM lancamentos l JOIN cargas c ON c.id = l.carga_id WHERE " + " AND ".join(where))
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+    
+    def loads(self):
+        """Arquivos gravados no livro."""
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                "SELECT arquivo, registros, gravado_em FROM cargas ORDER BY gravado_em DESC", conn
+            )
+    
+    def stats(self):
+        with closing(self._connect()) as conn:
+            arquivos, registros = conn.execute("SELECT COUNT(*), COALESCE(SUM(registros), 0) FROM cargas").fetchone()
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return {"arquivos": arquivos, "lancamentos": registros, "tamanho_mb": round(size / (1024 * 1024), 2)}
@@ -0,0 +1,299 @@
+"""
+Observação de uma pasta: processa automaticamente os CSVs novos ou alterados.
+
+    python -m camara observar camaras/ -o saida/ [--intervalo 30] [--uma-vez]
+
+A cada varredura os CSVs da pasta (sem subpastas, ignorando contabil_*) são
+identificados pelo hash do conteúdo. Os ainda não processados formam um lote,
+processado no WorkerPool; o lote grava em <saida>/<lote>/ os contabil_*.csv,
+o pacote de relatórios (relatorios.zip) sobre os dados consolidados e o
+manifesto.json. O estado (<saida>/.observador.json) é gravado após cada
+arquivo: hashes já processados não são repetidos e um lote interrompido é
+retomado do ponto em que parou.
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from .config import REPORT_LAYOUT_VERSION, RULES_VERSION, VALIDATION_ERROR_BUDGET
+from .jobs import REPORT_KINDS, WorkerPool, artifact_files, default_report_options
+from .processor import EntryValidationError, NeodontoCsvProcessor, RunConfig
+from .storage import ArtifactCache, StreamingZipWriter
+
+logger = logging.getLogger(__name__)
+
+# Relatórios do pacote de cada lote (o balancete e a compensação podem ser pedidos em --relatorios)
+WATCH_REPORTS = ("unificado", "irrf", "contabeis")
+
+
+class FolderWatcher:
+    """
+    Processa os CSVs de uma pasta em lotes idempotentes e retomáveis.
+
+    O estado guarda os hashes processados (ou rejeitados, para não insistir em um
+    arquivo inválido até que ele mude) e o lote em andamento. Só é rejeitado o
+    arquivo cujo processamento termina com erro; falhas da execução (tempo
+    esgotado, processo de trabalho encerrado, disco) são repetidas na próxima
+    varredura. Arquivos
+    modificados há menos de settle_seconds são deixados para a próxima varredura,
+    pois ainda podem estar sendo copiados.
+    """
+
+    STATE_FILE = ".observador.json"
+    CLIENT_ID = "observador"
+
+    def __init__(self, watch_dir, output_dir, reports=WATCH_REPORTS, error_budget=VALIDATION_ERROR_BUDGET,
+                 reference_date=None, pool=None, cache=None, settle_seconds=5.0):
+        unknown = [kind for kind in reports if kind not in REPORT_KINDS]
+        if unknown:
+            raise ValueError(f"Relatórios desconhecidos: {', '.join(unknown)}")
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.reports = tuple(reports)
+        self.error_budget = error_budget
+        self.reference_date = reference_date
+        self.pool = pool or WorkerPool(is_session_alive=lambda client: True)
+        self.cache = cache or ArtifactCache()
+        self.settle_seconds = settle_seconds
+        self.state_path = os.path.join(self.output_dir, self.STATE_FILE)
+        self._digests = {}  # caminho -> ((tamanho, mtime), sha256), evita recalcular o hash
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.state = self._load_state()
+
+    # --- Estado ---------------------------------------------------------------
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        state.setdefault("processados", {})
+        state.setdefault("rejeitados", {})
+        state.setdefault("lote", None)
+        return state
+
+    def _save_state(self):
+        """Grava o estado de forma atômica (arquivo temporário + os.replace)."""
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.state_path)
+
+    # --- Varredura ------------------------------------------------------------
+
+    def scan(self):
+        """CSVs prontos da pasta, como lista de (caminho, sha256), em ordem de nome."""
+        found = []
+        now = time.time()
+        for entry in sorted(os.scandir(self.watch_dir), key=lambda entry: entry.name):
+            name = entry.name
+            if (not entry.is_file() or not name.lower().endswith(".csv")
+                    or name.startswith((".", "contabil_"))):
+                continue
+            stat = entry.stat()
+            if now - stat.st_mtime < self.settle_seconds:
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            cached = self._digests.get(entry.path)
+            if cached is None or cached[0] != signature:
+                cached = (signature, ArtifactCache.file_digest(entry.path))
+                self._digests[entry.path] = cached
+            found.append((entry.path, cached[1]))
+        return found
+
+    def pending(self):
+        """Arquivos da pasta cujo hash ainda não foi processado nem rejeitado."""
+        seen = set()
+        pending = []
+        for path, sha256 in self.scan():
+            if sha256 in self.state["processados"] or sha256 in self.state["rejeitados"] or sha256 in seen:
+                continue
+            seen.add(sha256)
+            pending.append((path, sha256))
+        return pending
+
+    # --- Lotes ----------------------------------------------------------------
+
+    def run_once(self):
+        """Retoma o lote interrompido, se houver, ou processa um lote novo. Retorna o manifesto ou None."""
+        batch = self.state["lote"]
+        if batch is None:
+            pending = self.pending()
+            if not pending:
+                return None
+            config = RunConfig.default(error_budget=self.error_budget)
+            if self.reference_date is not None:
+                config = RunConfig(reference_date=self.reference_date, error_budget=self.error_budget)
+            batch_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+            batch = {
+                "id": batch_id,
+                "diretorio": os.path.join(self.output_dir, batch_id),
+                "iniciado_em": datetime.now().isoformat(timespec="seconds"),
+                "data": config.reference_date.strftime("%Y-%m-%d"),
+                "limite_violacoes": config.error_budget,
+                "arquivos": [{"arquivo": os.path.basename(path), "caminho": path, "sha256": sha256}
+                             for path, sha256 in pending],
+                "resultados": {},
+            }
+            self.state["lote"] = batch
+            self._save_state()
+            logger.info("Lote %s: %d arquivo(s) novo(s)", batch_id, len(pending))
+        else:
+            logger.info("Retomando o lote %s", batch["id"])
+        os.makedirs(batch["diretorio"], exist_ok=True)
+
+        self._process_files(batch)
+        manifest = self._finish_batch(batch)
+        self.state["lote"] = None
+        self._save_state()
+        # Os lançamentos intermediários só são removidos com o lote encerrado no estado
+        for summary in batch["resultados"].values():
+            if summary.get("dados_file") and os.path.exists(summary["dados_file"]):
+                os.remove(summary["dados_file"])
+        return manifest
+
+    def _batch_config(self, batch):
+        return RunConfig(reference_date=datetime.strptime(batch["data"], "%Y-%m-%d"),
+                         error_budget=batch["limite_violacoes"])
+
+    def _process_files(self, batch):
+        """Processa no pool os arquivos do lote ainda sem resultado, gravando o estado após cada um."""
+        config = self._batch_config(batch)
+        todo = [item for item in batch["arquivos"] if item["sha256"] not in batch["resultados"]]
+        if not todo:
+            return
+
+        def process(item):
+            # Arquivo alterado ou removido desde o início do lote: fica para a próxima varredura
+            if not os.path.isfile(item["caminho"]) or ArtifactCache.file_digest(item["caminho"]) != item["sha256"]:
+                return {"arquivo": item["arquivo"], "ok": False, "ignorado": True,
+                        "erro": "Arquivo alterado ou removido durante o lote"}
+            return self.pool.run(self.CLIENT_ID, "arquivo", item["caminho"], item["arquivo"],
+                                 config, batch["diretorio"])
+
+        with ThreadPoolExecutor(max_workers=max(1, self.pool.processes)) as executor:
+            futures = {executor.submit(process, item): item for item in todo}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    # Falha do processamento, não do arquivo (ex.: tempo esgotado, processo de trabalho
+                    # encerrado, disco): fica sem resultado e volta na próxima varredura
+                    batch.setdefault("falhas", {})[item["sha256"]] = f"{type(e).__name__}: {e}"
+                    logger.warning("%s: %s; nova tentativa na próxima varredura", item["arquivo"], e)
+                    self._save_state()
+                    continue
+                batch.get("falhas", {}).pop(item["sha256"], None)
+                batch["resultados"][item["sha256"]] = summary
+                if summary["ok"]:
+                    self.state["processados"][item["sha256"]] = {
+                        "arquivo": item["arquivo"], "lote": batch["id"],
+                        "contabil_file": summary["contabil_file"], "lancamentos": summary["lancamentos"],
+                    }
+                    logger.info("%s: %d lançamentos", item["arquivo"], summary["lancamentos"])
+                elif not summary.get("ignorado"):
+                    self.state["rejeitados"][item["sha256"]] = {
+                        "arquivo": item["arquivo"], "lote": batch["id"], "erro": summary["erro"],
+                    }
+                    logger.warning("%s: %s", item["arquivo"], (summary["erro"] or "").strip())
+                self._save_state()
+
+    def _finish_batch(self, batch):
+        """Gera o pacote de relatórios sobre os arquivos processados e grava o manifesto."""
+        import pandas as pd
+
+        failures = batch.get("falhas", {})
+        results = [batch["resultados"].get(item["sha256"]) or
+                   {"arquivo": item["arquivo"], "ok": False, "repetir": True,
+                    "erro": failures.get(item["sha256"], "Arquivo não processado")}
+                   for item in batch["arquivos"]]
+        frames = {summary["arquivo"]: pd.read_pickle(summary["dados_file"])
+                  for summary in results if summary["ok"]}
+        reports = {}
+        bundle_path = None
+        duplicates = possible_duplicates = 0
+        error = None
+        if frames and self.reports:
+            processor = NeodontoCsvProcessor(self._batch_config(batch))
+            processor.quiet = True
+            consolidated_df, duplicate_rows = processor.deduplicate_frames(frames)
+            duplicates = int(duplicate_rows['confirmado'].sum())
+            possible_duplicates = len(duplicate_rows) - duplicates
+            try:
+                # Como na aba de relatórios e na pré-geração: sem pacote para dados acima do orçamento
+                processor.enforce_error_budget(processor.validate_entries(consolidated_df), source="dados consolidados")
+            except EntryValidationError as e:
+                error = str(e)
+                logger.warning("Lote %s sem relatórios: %s", batch["id"], error)
+            else:
+                bundle_path = os.path.join(batch["diretorio"], "relatorios.zip")
+                with StreamingZipWriter(bundle_path) as bundle:
+                    for kind in self.reports:
+                        reports[kind] = self._render(kind, consolidated_df, bundle)
+
+        manifest = {
+            "lote": batch["id"],
+            "pasta": self.watch_dir,
+            "iniciado_em": batch["iniciado_em"],
+            "concluido_em": datetime.now().isoformat(timespec="seconds"),
+            "data": batch["data"],
+            "limite_violacoes": batch["limite_violacoes"],
+            "versoes": {"regras": RULES_VERSION, "layout": REPORT_LAYOUT_VERSION},
+            "arquivos": [
+                dict(item, **{name: value for name, value in summary.items() if name != "dados_file"})
+                for item, summary in zip(batch["arquivos"], results)
+            ],
+            "duplicados_removidos": duplicates,
+            "possiveis_duplicados": possible_duplicates,
+            "relatorios": reports,
+            "pacote": bundle_path,
+            "erro": error,
+        }
+        with open(os.path.join(batch["diretorio"], "manifesto.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+        logger.info("Lote %s concluído em %s", batch["id"], batch["diretorio"])
+        return manifest
+
+    def _render(self, kind, df, bundle):
+        """Gera (ou reaproveita do cache de artefatos) um tipo de relatório e o adiciona ao pacote."""
+        options = default_report_options(kind)
+
+        def build(output_dir):
+            return self.pool.run(self.CLIENT_ID, "relatorios", kind, df, options, output_dir)
+
+        result, cached = self.cache.get_or_build(df, kind, options, build)
+        names = []
+        for file_path in artifact_files(result):
+            # O ZIP dos relatórios contábeis repete os arquivos já incluídos no pacote
+            if os.path.basename(file_path) == "relatorios_contabeis.zip":
+                continue
+            name = f"{kind}/{os.path.basename(file_path)}"
+            bundle.write_file(file_path, name)
+            names.append(name)
+        return {"arquivos": names, "cache": cached}
+
+    def retry_rejected(self):
+        """Volta a considerar os arquivos rejeitados (ex.: após registrar o layout deles)."""
+        count = len(self.state["rejeitados"])
+        self.state["rejeitados"] = {}
+        self._save_state()
+        return count
+
+    def watch(self, interval=30.0):
+        """Varre a pasta a cada `interval` segundos até ser interrompido."""
+        logger.info("Observando %s (a cada %g s), saída em %s", self.watch_dir, interval, self.output_dir)
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                # Falha inesperada (ex.: disco): o lote continua no estado e é retomado
+                logger.exception("Falha no lote; nova tentativa na próxima varredura")
+            time.sleep(interval)
+
@@ -0,0 +1,52 @@
+"""Duplicidades entre arquivos (find_cross_file_duplicates / deduplicate_frames)."""
+import pandas as pd
+import pytest
+
+from camara.processor import NeodontoCsvProcessor
+
+
+@pytest.fixture(scope="module")
+def processor():
+    processor = NeodontoCsvProcessor()
+    processor.quiet = True
+    return processor
+
+
+def entries(documentos):
+    """DataFrame processado mínimo: um lançamento original por documento, mesmo singular e valor."""
+    count = len(documentos)
+    return pd.DataFrame({
+        'CodigoSingular': [26] * count,
+        'NomeSingular': ['Uniodonto Teste'] * count,
+        'NumeroDocumento': documentos,
+        'CodigoTipoRecebimento': [3] * count,
+        'ValorBruto': ['121,22'] * count,
+        'Tipo': ['A receber'] * count,
+        'complemento': ['Uniodonto Teste | Taxa de Manutenção | TAXA | A receber'] * count,
+        'valor': [12122] * count,
+    })
+
+
+def test_same_document_is_dropped(processor):
+    frames = {"a.csv": entries(["10617"]), "b.csv": entries(["10617"])}
+    consolidated, duplicates = processor.deduplicate_frames(frames)
+    assert duplicates['confirmado'].tolist() == [True]
+    assert len(consolidated) == 1
+
+
+def test_missing_document_is_only_flagged(processor):
+    frames = {"a.csv": entries([None]), "b.csv": entries([""])}
+    consolidated, duplicates = processor.deduplicate_frames(frames)
+    assert len(duplicates) == 1
+    assert duplicates['confirmado'].tolist() == [False]
+    assert duplicates['arquivo'].tolist() == ["b.csv"]
+    # Possíveis duplicados não mudam os totais
+    assert len(consolidated) == 2
+    assert int(consolidated['valor'].sum()) == 2 * 12122
+
+
+def test_no_duplicates(processor):
+    frames = {"a.csv": entries(["1"]), "b.csv": entries(["2"])}
+    consolidated, duplicates = processor.deduplicate_frames(frames)
+    assert duplicates.empty
+    assert len(consolidated) == 2
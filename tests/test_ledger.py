@@ -0,0 +1,51 @@
+"""Livro de lançamentos (JournalLedger): consultas contra o DataFrame processado."""
+import os
+
+import pandas as pd
+import pytest
+
+from camara.processor import NeodontoCsvProcessor
+from camara.storage import JournalLedger
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "camaras",
+                      "camara compensacao federacao 20.06.2025.csv")
+
+
+@pytest.fixture(scope="module")
+def processor():
+    processor = NeodontoCsvProcessor()
+    processor.quiet = True
+    return processor
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return JournalLedger(str(tmp_path / "livro.db"))
+
+
+@pytest.mark.parametrize("conta", [19265, 84679])
+def test_query_by_account_keeps_identical_entries(processor, ledger, conta):
+    df = processor.process_file(SAMPLE).processed
+    ledger.record("federacao.csv", processor.ledger_frame(df))
+
+    expected = df[(df['Debito'] == conta) | (df['Credito'] == conta)]
+    # A conta tem lançamentos idênticos (mesma data, contas, histórico e valor)
+    keys = ['Debito', 'Credito', 'Historico', 'DATA', 'valor']
+    assert expected.duplicated(keys).any()
+
+    entries = ledger.query(conta=conta)
+    assert len(entries) == len(expected)
+    assert int(entries['valor'].sum()) == int(expected['valor'].sum())
+
+
+def test_query_counts_same_account_entry_once(ledger):
+    frame = pd.DataFrame({col: [None, None] for col in JournalLedger.COLUMNS})
+    frame['debito'] = [10, 10]
+    frame['credito'] = [10, 20]
+    frame['data'] = '2025-06-30'
+    frame['valor'] = [100, 250]
+    ledger.record("mesma_conta.csv", frame)
+
+    entries = ledger.query(conta=10)
+    assert len(entries) == 2
+    assert int(entries['valor'].sum()) == 350
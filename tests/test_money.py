@@ -0,0 +1,149 @@
+"""Valores monetários em centavos: conversão, formatação e totais contra o balancete."""
+import io
+import os
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from camara.processor import NeodontoCsvProcessor, format_cents_series
+from camara.storage import JournalLedger
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "camaras")
+# Arquivos da Câmara de exemplo (dicionario.csv e exported_data.csv têm outro formato)
+SAMPLE_FILES = sorted(name for name in os.listdir(SAMPLES_DIR)
+                      if name.endswith(".csv") and name not in ("dicionario.csv", "exported_data.csv"))
+
+
+@pytest.fixture(scope="module")
+def processor():
+    processor = NeodontoCsvProcessor()
+    processor.quiet = True
+    return processor
+
+
+@pytest.mark.parametrize("value, cents", [
+    # Formato brasileiro
+    ("121,22", 12122),
+    ("1.234,56", 123456),
+    ("1.234.567,89", 123456789),
+    ("1234,5", 123450),
+    (",5", 50),
+    ("R$ 1.234,56", 123456),
+    (" 102 ", 10200),
+    # Formato americano
+    ("1,234.56", 123456),
+    ("1234.56", 123456),
+    ("0.07", 7),
+    # Meio centavo arredonda para cima
+    ("0,005", 1),
+    ("2.675", 268),
+    # Números
+    (10, 1000),
+    (np.int64(5), 500),
+    (121.22, 12122),
+    (0.1 + 0.2, 30),
+    (1.005, 101),
+    (2.675, 268),
+    (-3.5, -350),
+    (np.float64(1234.56), 123456),
+    # Vazios e inválidos
+    (None, 0),
+    ("", 0),
+    ("   ", 0),
+    ("nan", 0),
+    ("abc", 0),
+    (float("nan"), 0),
+    (np.nan, 0),
+    (pd.NA, 0),
+])
+def test_normalize_cents(processor, value, cents):
+    assert processor.normalize_cents(value) == cents
+
+
+def test_decimal_to_cents_rounds_half_up():
+    assert NeodontoCsvProcessor._decimal_to_cents(Decimal("0.005")) == 1
+    assert NeodontoCsvProcessor._decimal_to_cents(Decimal("0.0049")) == 0
+    assert NeodontoCsvProcessor._decimal_to_cents(Decimal("-0.005")) == -1
+    assert NeodontoCsvProcessor._decimal_to_cents(Decimal("12345678901234.56")) == 1234567890123456
+
+
+def test_normalize_cents_series_matches_scalar(processor):
+    values = pd.Series(["1.234,56", "1,234.56", 10, 121.22, None, np.nan, "", "121,22", "121,22"], dtype=object)
+    result = processor.normalize_cents_series(values)
+    assert result.dtype == "int64"
+    assert result.tolist() == [123456, 123456, 1000, 12122, 0, 0, 0, 12122, 12122]
+
+
+@pytest.mark.parametrize("cents, plain, thousands", [
+    (12122, "121,22", "121,22"),
+    (5, "0,05", "0,05"),
+    (0, "0,00", "0,00"),
+    (-5, "-0,05", "-0,05"),
+    (-100000, "-1000,00", "-1.000,00"),
+    (123456789, "1234567,89", "1.234.567,89"),
+])
+def test_format_cents_series(cents, plain, thousands):
+    series = pd.Series([cents], dtype="int64")
+    assert format_cents_series(series).tolist() == [plain]
+    assert format_cents_series(series, thousands=True).tolist() == [thousands]
+
+
+def test_format_cents_series_missing_is_zero():
+    series = pd.Series([150, None], dtype="Int64")
+    assert format_cents_series(series).tolist() == ["1,50", "0,00"]
+
+
+@pytest.mark.parametrize("cents", [0, 1, 99, 100, 12122, 123456789])
+def test_format_then_parse_round_trip(processor, cents):
+    text = format_cents_series(pd.Series([cents]), thousands=True).iloc[0]
+    assert processor.normalize_cents(text) == cents
+    assert processor.format_currency(cents) == text
+
+
+@pytest.mark.parametrize("filename", SAMPLE_FILES)
+def test_totals_match_trial_balance(processor, filename, tmp_path):
+    result = processor.process_file(os.path.join(SAMPLES_DIR, filename))
+    assert result.ok, result.error
+    df = result.processed
+
+    balance = processor.calculate_trial_balance(df)
+    check = processor.trial_balance_check(balance)
+    assert check["equilibrado"]
+
+    # Cubo de resumo: total geral e débitos por conta iguais aos do balancete
+    cube = processor.summary_cube(df)
+    assert processor.cube_sum(cube, "valor") == check["total_debitos"]
+    assert (processor.cube_sum(cube, "valor", lancamento="original")
+            + processor.cube_sum(cube, "valor", lancamento="irrf")) == check["total_debitos"]
+    cube_debits = cube.groupby("Debito")["valor"].sum()
+    balance_debits = balance[balance["debitos"] > 0].set_index("conta")["debitos"]
+    assert {int(k): int(v) for k, v in cube_debits.items()} == {int(k): int(v) for k, v in balance_debits.items()}
+
+    # O arquivo contábil exportado soma o mesmo total
+    exported = pd.read_csv(io.StringIO(processor.df_to_csv_string(df)), sep=";", dtype=str)
+    assert int(processor.normalize_cents_series(exported["valor"]).sum()) == check["total_debitos"]
+
+    # E o balancete lido do livro de lançamentos é o mesmo
+    ledger = JournalLedger(str(tmp_path / "livro.db"))
+    ledger.record(filename, processor.ledger_frame(df))
+    from_ledger = processor.calculate_trial_balance(ledger.query())
+    pd.testing.assert_frame_equal(from_ledger, balance)
+
+
+def test_trial_balance_keeps_entries_without_account(processor):
+    df = pd.DataFrame({
+        'Debito': pd.array([10, None, 20], dtype='Int64'),
+        'Credito': pd.array([20, 10, 10], dtype='Int64'),
+        'DATA': ['30/06/2025'] * 3,
+        'valor': [100, 50, 30],
+    })
+    balance = processor.calculate_trial_balance(df)
+    check = processor.trial_balance_check(balance)
+    assert check["sem_conta"] > 0
+    assert check["total_debitos"] == 180
+    assert check["total_creditos"] == 180
+    sem_conta = balance[balance['conta'].isna()]
+    assert sem_conta['debitos'].tolist() == [50]
+    assert sem_conta['descricao'].tolist() == ['Sem conta']